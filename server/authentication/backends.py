@@ -0,0 +1,73 @@
+import hashlib
+
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from server.utils import has_shared_cache
+
+# The token of a request is resolved to its user, profile, measures and fitness with one query and
+# kept in the cache for a few minutes. The objects come out of the cache with their relations loaded,
+# so `request.user.profile.measures` and the like cost no queries for the rest of the request.
+# The entry is dropped by the signals once the deletion of the token or the save of the user, profile,
+# measures or fitness is committed. That only reaches every process through a shared cache (CACHE_URL),
+# so with the per process locmem cache the tokens are read from the database (with one query) on every request.
+AUTH_TOKEN_KEY = 'auth:token:{key}'
+# the entries of the user's token, one token per user
+AUTH_USER_KEY = 'auth:user:{user_id}'
+AUTH_PROFILE_KEY = 'auth:profile:{profile_id}'
+AUTH_TOKEN_TIMEOUT = 60 * 5
+
+
+def get_token_cache_key(key):
+    # the raw tokens are not kept in the cache keys
+    return AUTH_TOKEN_KEY.format(key=hashlib.sha256(key.encode()).hexdigest())
+
+
+def invalidate_cached_token(owner_key):
+    token_cache_key = cache.get(owner_key)
+    if token_cache_key is not None:
+        cache.delete_many([token_cache_key, owner_key])
+
+
+def invalidate_user_token(user_id):
+    invalidate_cached_token(AUTH_USER_KEY.format(user_id=user_id))
+
+
+def invalidate_profile_token(profile_id):
+    """Drops the token of the profile's user, without reading the profile."""
+    invalidate_cached_token(AUTH_PROFILE_KEY.format(profile_id=profile_id))
+
+
+def load_token(key):
+    token = Token.objects.select_related(
+        'user__profile__measures', 'user__profile__fitness'
+    ).filter(key=key).first()
+    if token is None:
+        raise exceptions.AuthenticationFailed(_('Invalid token.'))
+    return token
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        token = self.get_cached_token(key) if has_shared_cache() else load_token(key)
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        return token.user, token
+
+    def get_cached_token(self, key):
+        token_cache_key = get_token_cache_key(key)
+        token = cache.get(token_cache_key)
+        if token is None:
+            token = load_token(key)
+            entries = {
+                token_cache_key: token,
+                AUTH_USER_KEY.format(user_id=token.user_id): token_cache_key,
+            }
+            profile = getattr(token.user, 'profile', None)
+            if profile is not None:
+                entries[AUTH_PROFILE_KEY.format(profile_id=profile.pk)] = token_cache_key
+            cache.set_many(entries, AUTH_TOKEN_TIMEOUT)
+        return token
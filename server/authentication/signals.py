@@ -1,8 +1,15 @@
+from functools import partial
+
 from django.contrib.auth import get_user_model
-from django.db.models.signals import post_save, pre_save
+from django.db import transaction
+from django.db.models.signals import post_save, pre_save, post_delete
 from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
 
+from server.authentication.backends import invalidate_user_token, invalidate_profile_token
 from server.authentication.models import Username
+from server.health.models import Measures, Fitness
+from server.profiles.models import Profile
 
 UserModel = get_user_model()
 
@@ -26,4 +33,27 @@ def update_username_instance(sender, instance, **kwargs):
             pass  # Handle the case where the user doesn't exist (unlikely)
         except Username.DoesNotExist:
             # Handle the case where the Username record doesn't exist
-            Username.objects.create(username=instance.username, user=instance)
\ No newline at end of file
+            Username.objects.create(username=instance.username, user=instance)
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+@receiver(post_save, sender=UserModel)
+@receiver(post_delete, sender=UserModel)
+def invalidate_cached_token_of_user(sender, instance, **kwargs):
+    # dropped after the commit, a request running before it would cache the old rows again
+    transaction.on_commit(partial(invalidate_user_token, instance.user_id if sender is Token else instance.pk))
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def invalidate_cached_token_of_profile(sender, instance, **kwargs):
+    transaction.on_commit(partial(invalidate_user_token, instance.user_id))
+
+
+@receiver(post_save, sender=Measures)
+@receiver(post_save, sender=Fitness)
+@receiver(post_delete, sender=Measures)
+@receiver(post_delete, sender=Fitness)
+def invalidate_cached_token_of_measures(sender, instance, **kwargs):
+    transaction.on_commit(partial(invalidate_profile_token, instance.profile_id))
@@ -1,11 +1,16 @@
+from unittest import mock
+
 from allauth.account.models import EmailAddress
 from django.contrib.auth import get_user_model, authenticate, login
 from django.contrib.auth.models import Group
+from django.core.cache import cache
 from rest_framework import status
 from rest_framework.authtoken.models import Token
 from rest_framework.test import APITestCase
 
+from server.authentication.backends import get_token_cache_key
 from server.authentication.models import ConfirmationCode
+from server.health.models import Measures
 from server.profiles.models import Profile
 
 UserModel = get_user_model()
@@ -143,8 +148,9 @@ class LoginViewApiTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
 
     def test_login_with_inactive_user(self):
-        self.user.is_active = False
-        self.user.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
 
         url = "/authentication/login/"
         data = {
@@ -430,3 +436,90 @@ class VerifyAuthTokenAndGetUserDataViewTests(APITestCase):
     def test_verify_auth_token_and_get_user_data_unauthenticated(self):
         response = self.client.get(self.url, format='json')
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@mock.patch('server.authentication.backends.has_shared_cache', return_value=True)
+class CachedTokenAuthenticationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = UserModel.objects.create_user(email='test@example.com', username='test_user',
+                                                  password='test_password')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.profile = Profile.objects.create_profile(user=self.user)
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def get_height(self):
+        response = self.client.get('/health/measures/height/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['height']
+
+    def test_cached_token_resolves_the_profile_without_queries(self, has_shared_cache):
+        self.get_height()
+
+        with self.assertNumQueries(0):
+            self.get_height()
+
+    def test_saving_the_measures_drops_the_cached_profile(self, has_shared_cache):
+        self.get_height()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put('/health/measures/height/', {'height': 180})
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        self.assertEqual(self.get_height(), 180)
+
+    def test_measures_are_saved_without_reading_the_profile(self, has_shared_cache):
+        self.get_height()
+        measures = Measures.objects.get(profile=self.profile)
+
+        # the update and its historical row
+        with self.captureOnCommitCallbacks(execute=True), self.assertNumQueries(2):
+            measures.height = 180
+            measures.save()
+
+        self.assertEqual(self.get_height(), 180)
+
+    def test_deleted_token_is_rejected(self, has_shared_cache):
+        self.get_height()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.token.delete()
+
+        response = self.client.get('/health/measures/height/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_inactive_user_is_rejected(self, has_shared_cache):
+        self.get_height()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+
+        response = self.client.get('/health/measures/height/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_tokens_are_not_cached_without_a_shared_cache(self, has_shared_cache):
+        has_shared_cache.return_value = False
+
+        self.get_height()
+
+        self.assertIsNone(cache.get(get_token_cache_key(self.token.key)))
+
+    def test_uncached_token_resolves_the_profile_with_one_query(self, has_shared_cache):
+        has_shared_cache.return_value = False
+
+        with self.assertNumQueries(1):
+            self.get_height()
+
+    def test_cached_token_is_dropped_once_the_change_is_committed(self, has_shared_cache):
+        self.get_height()
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            Measures.objects.filter(profile=self.profile).update(height=180)
+            Measures.objects.get(profile=self.profile).save()
+        self.assertIsNone(self.get_height())
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.get_height(), 180)
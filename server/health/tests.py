@@ -1,3 +1,89 @@
-from django.test import TestCase
+from datetime import datetime, timedelta
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from server.health.weight import sample_lttb
+from server.profiles.models import Profile
+
+UserModel = get_user_model()
+
+
+class WeightSeriesTests(APITestCase):
+    def setUp(self):
+        self.user = UserModel.objects.create_user(email='test@example.com', username='test_user',
+                                                  password='test_password')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.profile = Profile.objects.create_profile(user=self.user)
+        self.client.force_authenticate(user=self.user)
+        self.measures = self.profile.measures
+
+    def log_weights(self, weigh_ins):
+        """Saves the measures once per (datetime, weight) and dates their historical rows."""
+        for logged_at, weight in weigh_ins:
+            self.measures.weight = weight
+            self.measures.save()
+            history_id = self.measures.history.order_by('-history_id').values_list('history_id', flat=True).first()
+            self.measures.history.filter(history_id=history_id).update(history_date=logged_at)
+
+    def get_series(self, **params):
+        response = self.client.get('/health/measures/weight/series/', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        return response.data
+
+    def at(self, day, hour=12):
+        return timezone.make_aware(datetime.combine(day, datetime.min.time()) + timedelta(hours=hour))
+
+    def test_daily_series_keeps_the_last_weigh_in_of_the_day_across_months(self):
+        self.log_weights([
+            (self.at(datetime(2024, 1, 31), 8), 80),
+            (self.at(datetime(2024, 1, 31), 20), 81),
+            (self.at(datetime(2024, 2, 1)), 79.5),
+        ])
+
+        series = self.get_series()
+
+        self.assertEqual(series['points'], [
+            {'date': datetime(2024, 1, 31).date(), 'weight': 81},
+            {'date': datetime(2024, 2, 1).date(), 'weight': 79.5},
+        ])
+        self.assertEqual(series['last_weigh_in'], datetime(2024, 2, 1).date())
+
+    def test_weekly_average_between_dates_with_moving_average(self):
+        monday = datetime(2024, 3, 4)
+        self.log_weights([(self.at(monday + timedelta(days=day)), 80 + day) for day in range(21)])
+
+        series = self.get_series(sampling='week', start='2024-03-04', end='2024-03-17', moving_average=2)
+
+        self.assertEqual(series['points'], [
+            {'date': monday.date(), 'weight': 83, 'moving_average': 83},
+            {'date': (monday + timedelta(days=7)).date(), 'weight': 90, 'moving_average': 86.5},
+        ])
+
+    def test_lttb_keeps_the_ends_and_the_peak(self):
+        start = self.at(datetime(2024, 1, 1))
+        points = [(start + timedelta(days=day), 80 if day != 50 else 95) for day in range(100)]
+
+        sampled = sample_lttb(points, 10)
+
+        self.assertEqual(len(sampled), 10)
+        self.assertEqual(sampled[0], points[0])
+        self.assertEqual(sampled[-1], points[-1])
+        self.assertIn(points[50], sampled)
+
+    def test_invalid_params_are_rejected(self):
+        for params in ({'sampling': 'hour'}, {'start': '31-01-2024'}, {'sampling': 'lttb', 'points': 1},
+                       {'moving_average': 'x'}):
+            response = self.client.get('/health/measures/weight/series/', params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+    def test_profile_weight_reports_the_last_weigh_in(self):
+        self.log_weights([(timezone.now() - timedelta(days=40), 82), (timezone.now() - timedelta(days=1), 80)])
+
+        response = self.client.get('/health/measures/weight/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['weight'], 80)
+        self.assertEqual(response.data['last_weigh_in'], "Yesterday")
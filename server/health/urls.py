@@ -1,12 +1,13 @@
 from django.urls import path, include
 
 from server.health.views import EditMeasures, FitnessActivityLevel, ProfileWeightView, \
-    ProfileHeightView, FitnessGoalView
+    ProfileHeightView, FitnessGoalView, WeightSeriesView
 
 urlpatterns = [
     path('measures/', include([
         path('edit/', EditMeasures.as_view(), name='edit measures'),
         path('weight/', ProfileWeightView.as_view(), name='profile weight'),
+        path('weight/series/', WeightSeriesView.as_view(), name='profile weight series'),
         path('height/', ProfileHeightView.as_view(), name='profile height'),
     ])),
     path('fitness/', include([
@@ -1,11 +1,12 @@
-from datetime import datetime
-
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from rest_framework import generics as rest_generic_views, status, views
 from rest_framework.response import Response
 
 from server.health.models import Measures, ActivityChoicesMixin, FitnessGoalChoices
 from server.health.serializers import EditMeasuresSerializer, EditFitnessSerializer
-from server.utils import transform_timestamp, transform_timestamp_without_hour
+from server.health.weight import WEIGHT_SAMPLINGS, DEFAULT_LTTB_POINTS, MAX_LTTB_POINTS, MAX_MOVING_AVERAGE_WINDOW, \
+    get_weight_series, get_last_weigh_in
 
 
 class EditMeasures(rest_generic_views.UpdateAPIView):
@@ -96,37 +97,27 @@ class FitnessGoalView(views.APIView):
 
 class ProfileWeightView(views.APIView):
     def get(self, request):
-        profile = self.request.user.profile
-        measures = profile.measures
-        weight = measures.weight
-        weight_logs = [{'weight': log.weight, 'date': transform_timestamp_without_hour(str(log.history_date))} for log
-                       in measures.history.all()]
-
-        sorted_logs = sorted(weight_logs, key=lambda x: x['date'], reverse=True)
-
-        # Get the date of the last entry
-        last_entry_date = sorted_logs[0]['date'] if sorted_logs else None
+        measures = self.request.user.profile.measures
+        weight_logs = [
+            {'weight': weight, 'date': history_date.strftime('%d %b %Y')}
+            for history_date, weight in measures.history.values_list('history_date', 'weight')
+        ]
 
+        last_entry_date = get_last_weigh_in(measures)
         if last_entry_date:
-            # Convert last entry date to datetime object
-            last_entry_date = datetime.strptime(last_entry_date, '%d %b %Y')
-
-            # Calculate time elapsed since last entry
-            time_elapsed = datetime.now() - last_entry_date
-
-            # Format time elapsed in a human-readable format
-            if time_elapsed.days == 0:
+            days_elapsed = (timezone.localdate() - last_entry_date).days
+            if days_elapsed == 0:
                 last_weigh_in = "Today"
-            elif time_elapsed.days == 1:
+            elif days_elapsed == 1:
                 last_weigh_in = "Yesterday"
             else:
-                last_weigh_in = f"{time_elapsed.days} days ago"
+                last_weigh_in = f"{days_elapsed} days ago"
         else:
             last_weigh_in = None
 
         return_dict = {
             'last_weigh_in': last_weigh_in,
-            'weight': weight,
+            'weight': measures.weight,
             'logs': weight_logs
         }
         return Response(return_dict, status=status.HTTP_200_OK)
@@ -142,6 +133,46 @@ class ProfileWeightView(views.APIView):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+class WeightSeriesView(views.APIView):
+    """
+    The weight log of the user between the optional `start` and `end` dates, sampled per day, week,
+    with LTTB (at most `points` weigh-ins) or raw (`sampling`), optionally with a `moving_average` of N points.
+    """
+
+    def get(self, request):
+        params = request.query_params
+        sampling = params.get('sampling', 'day')
+        if sampling not in WEIGHT_SAMPLINGS:
+            return Response(f"The sampling must be one of: {', '.join(WEIGHT_SAMPLINGS)}",
+                            status=status.HTTP_400_BAD_REQUEST)
+        dates = {}
+        for param in ('start', 'end'):
+            value = params.get(param)
+            try:
+                dates[param] = parse_date(value) if value else None
+            except ValueError:
+                dates[param] = None
+            if value and dates[param] is None:
+                return Response("The start and end must be YYYY-MM-DD dates", status=status.HTTP_400_BAD_REQUEST)
+        try:
+            points = int(params.get('points', DEFAULT_LTTB_POINTS))
+            moving_average = int(params['moving_average']) if params.get('moving_average') else None
+        except ValueError:
+            return Response("The points and moving average must be numbers", status=status.HTTP_400_BAD_REQUEST)
+        if not 3 <= points <= MAX_LTTB_POINTS:
+            return Response(f"The points must be between 3 and {MAX_LTTB_POINTS}", status=status.HTTP_400_BAD_REQUEST)
+        if moving_average is not None and not 1 <= moving_average <= MAX_MOVING_AVERAGE_WINDOW:
+            return Response(f"The moving average must be between 1 and {MAX_MOVING_AVERAGE_WINDOW}",
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        measures = request.user.profile.measures
+        return Response({
+            'weight': measures.weight,
+            'last_weigh_in': get_last_weigh_in(measures),
+            'points': get_weight_series(measures, sampling, dates['start'], dates['end'], points, moving_average),
+        }, status=status.HTTP_200_OK)
+
+
 class ProfileHeightView(views.APIView):
     def get(self, request):
         profile = request.user.profile
@@ -0,0 +1,107 @@
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+# The weight log is the history of the profile's measures. The series is read with a range query
+# over history_date and reduced in one pass, so a chart of years of weigh-ins is a few hundred points:
+# day - the last weigh-in of every day
+# week - the average of every week, dated by its monday
+# lttb - at most `points` weigh-ins picked with Largest-Triangle-Three-Buckets, keeps the shape of the curve
+# raw - every weigh-in
+WEIGHT_SAMPLINGS = ('day', 'week', 'lttb', 'raw')
+DEFAULT_LTTB_POINTS = 300
+MAX_LTTB_POINTS = 2000
+MAX_MOVING_AVERAGE_WINDOW = 365
+
+
+def get_day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def iterate_weight_logs(measures, start=None, end=None):
+    """The (history_date, weight) of the weigh-ins, oldest first, between the start and end dates."""
+    logs = measures.history.filter(weight__isnull=False)
+    if start is not None:
+        logs = logs.filter(history_date__gte=get_day_start(start))
+    if end is not None:
+        logs = logs.filter(history_date__lt=get_day_start(end + timedelta(days=1)))
+    return logs.order_by('history_date', 'history_id').values_list('history_date', 'weight').iterator()
+
+
+def sample_daily_last(logs):
+    days = {}
+    for history_date, weight in logs:
+        days[timezone.localdate(history_date)] = weight
+    return list(days.items())
+
+
+def sample_weekly_average(logs):
+    weeks = {}
+    for history_date, weight in logs:
+        day = timezone.localdate(history_date)
+        week = weeks.setdefault(day - timedelta(days=day.weekday()), [0, 0])
+        week[0] += weight
+        week[1] += 1
+    return [(week_start, round(total / count, 2)) for week_start, (total, count) in weeks.items()]
+
+
+def sample_lttb(points, threshold):
+    """Largest-Triangle-Three-Buckets downsampling of (datetime, value) points sorted by date."""
+    if threshold >= len(points) or threshold < 3:
+        return points
+    xs = [point[0].timestamp() for point in points]
+    bucket_size = (len(points) - 2) / (threshold - 2)
+    sampled = [points[0]]
+    selected = 0
+    for bucket in range(threshold - 2):
+        bucket_start = int(bucket * bucket_size) + 1
+        bucket_end = int((bucket + 1) * bucket_size) + 1
+        next_end = min(int((bucket + 2) * bucket_size) + 1, len(points))
+        # the third vertex is the average of the next bucket
+        next_points = range(bucket_end, next_end)
+        average_x = sum(xs[index] for index in next_points) / len(next_points)
+        average_y = sum(points[index][1] for index in next_points) / len(next_points)
+        selected_x, selected_y = xs[selected], points[selected][1]
+        selected = max(range(bucket_start, bucket_end), key=lambda index: abs(
+            (selected_x - average_x) * (points[index][1] - selected_y)
+            - (selected_x - xs[index]) * (average_y - selected_y)
+        ))
+        sampled.append(points[selected])
+    sampled.append(points[-1])
+    return sampled
+
+
+def get_weight_series(measures, sampling='day', start=None, end=None, points=DEFAULT_LTTB_POINTS,
+                      moving_average=None):
+    """
+    The weight series of the measures, sampled as asked. With `moving_average` every point
+    also has the trailing average of the last `moving_average` sampled points.
+    """
+    logs = iterate_weight_logs(measures, start, end)
+    if sampling == 'day':
+        series = sample_daily_last(logs)
+    elif sampling == 'week':
+        series = sample_weekly_average(logs)
+    elif sampling == 'lttb':
+        series = sample_lttb(list(logs), points)
+    else:
+        series = list(logs)
+
+    result = []
+    window_total = 0
+    for index, (date, weight) in enumerate(series):
+        point = {'date': date, 'weight': weight}
+        if moving_average:
+            window_total += weight
+            if index >= moving_average:
+                window_total -= series[index - moving_average][1]
+            point['moving_average'] = round(window_total / min(index + 1, moving_average), 2)
+        result.append(point)
+    return result
+
+
+def get_last_weigh_in(measures):
+    """The local date of the last weigh-in, None when the weight was never logged."""
+    history_date = measures.history.filter(weight__isnull=False).order_by('-history_date') \
+        .values_list('history_date', flat=True).first()
+    return timezone.localdate(history_date) if history_date is not None else None
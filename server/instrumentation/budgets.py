@@ -0,0 +1,36 @@
+import json
+from contextlib import contextmanager
+from pathlib import Path
+
+from server.instrumentation.recorder import QueryRecorder
+
+# The most queries every endpoint may run, enforced by the tests of this app against a seeded dataset.
+# The keys are "<METHOD> <path>", the path is formatted with the ids of the seeded objects.
+QUERY_BUDGETS_FILE = Path(__file__).resolve().parent / 'query_budgets.json'
+# the budgets of the first request, before the caches and the snapshots are built
+COLD_QUERY_BUDGETS_FILE = Path(__file__).resolve().parent / 'cold_query_budgets.json'
+
+
+def load_query_budgets(path=QUERY_BUDGETS_FILE):
+    with open(path) as budgets_file:
+        return {
+            tuple(endpoint.split(' ', 1)): max_queries
+            for endpoint, max_queries in json.load(budgets_file).items()
+        }
+
+
+def format_queries_report(recorder):
+    lines = [f"{recorder.count} queries in {recorder.duration * 1000:.1f} ms"]
+    lines += [f"  {count}x {sql}" for count, sql in recorder.duplicates.values()]
+    return '\n'.join(lines)
+
+
+class QueryBudgetMixin:
+    """A test case mixin, unlike assertNumQueries the report lists the repeated statements."""
+
+    @contextmanager
+    def assertQueryBudget(self, max_queries, msg=None):
+        with QueryRecorder() as recorder:
+            yield recorder
+        self.assertLessEqual(recorder.count, max_queries,
+                             f"{msg or 'Over the query budget'}\n{format_queries_report(recorder)}")
@@ -0,0 +1,64 @@
+import timeit
+from datetime import timedelta
+from io import BytesIO
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from server.renderers import FastJSONRenderer, FastJSONParser, orjson
+
+
+def build_workout_payload(exercises_count, sets_count):
+    """A workout details payload shaped like the ones of the API."""
+    created_at = timezone.now()
+    return {
+        'id': 1,
+        'name': 'Push day',
+        'created_at': created_at,
+        'total_exercises': exercises_count,
+        'exercises': [{
+            'id': exercise_index,
+            'session_type': 'exercise',
+            'order': exercise_index,
+            'notes': 'Slow eccentric',
+            'exercise': {'id': exercise_index, 'name': f'Exercise {exercise_index}', 'image': None},
+            'session_data': [{
+                'id': set_index,
+                'type': 'set',
+                'order': set_index,
+                'data': {
+                    'weight': 60.5 + set_index, 'reps': 10, 'min_reps': 8, 'max_reps': 12,
+                    'to_failure': False, 'bodyweight': False,
+                    'updated_at': created_at + timedelta(minutes=set_index),
+                },
+            } for set_index in range(sets_count)],
+        } for exercise_index in range(exercises_count)],
+    }
+
+
+class Command(BaseCommand):
+    help = "Compares the rendering and parsing time of the API's JSON renderer and parser with DRF's."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--exercises', type=int, default=10)
+        parser.add_argument('--sets', type=int, default=100, help="The sets of every exercise")
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write(self.style.WARNING("orjson is not installed, FastJSONRenderer falls back to DRF's"))
+        data = build_workout_payload(options['exercises'], options['sets'])
+        body = JSONRenderer().render(data)
+        self.stdout.write(f"Payload of {len(body) / 1024:.0f} KB, best of {options['repeat']} runs")
+
+        for action, current, fast in (
+                ('render', lambda: JSONRenderer().render(data), lambda: FastJSONRenderer().render(data)),
+                ('parse', lambda: JSONParser().parse(BytesIO(body)), lambda: FastJSONParser().parse(BytesIO(body))),
+        ):
+            current_time = min(timeit.repeat(current, number=1, repeat=options['repeat']))
+            fast_time = min(timeit.repeat(fast, number=1, repeat=options['repeat']))
+            self.stdout.write(f"{action}: DRF {current_time * 1000:.2f} ms, "
+                              f"fast {fast_time * 1000:.2f} ms ({current_time / fast_time:.1f}x)")
+
@@ -0,0 +1,63 @@
+import json
+import logging
+
+from django.conf import settings
+
+from server.instrumentation.recorder import QueryRecorder
+
+logger = logging.getLogger('server.queries')
+MAX_LOGGED_SQL_LENGTH = 300
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Records the queries of every request. In debug mode they are reported in the X-DB-* response headers,
+    otherwise they are logged as a JSON line, with the statements run more than once.
+    The streaming responses (the exports) run most of their queries while their content is consumed,
+    they are recorded until the end of the stream and always logged, their headers are already sent by then.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+
+        if response.streaming:
+            # the async iterators are consumed in another context than the recorder's
+            if not response.is_async:
+                response.streaming_content = self.record_streaming_content(
+                    request, response, recorder, response.streaming_content
+                )
+        elif settings.DEBUG:
+            duplicates = recorder.duplicates
+            response['X-DB-Query-Count'] = str(recorder.count)
+            response['X-DB-Time-Ms'] = f'{recorder.duration * 1000:.1f}'
+            response['X-DB-Duplicate-Queries'] = ','.join(
+                f'{fingerprint}:{count}' for fingerprint, (count, _) in duplicates.items()
+            )
+        else:
+            self.log_queries(request, response, recorder)
+        return response
+
+    def record_streaming_content(self, request, response, recorder, content):
+        try:
+            with recorder:
+                yield from content
+        finally:
+            self.log_queries(request, response, recorder)
+
+    def log_queries(self, request, response, recorder):
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'route': getattr(request.resolver_match, 'route', None),
+            'status': response.status_code,
+            'queries': recorder.count,
+            'db_time_ms': round(recorder.duration * 1000, 1),
+            'duplicates': [
+                {'fingerprint': fingerprint, 'count': count, 'sql': sql[:MAX_LOGGED_SQL_LENGTH]}
+                for fingerprint, (count, sql) in recorder.duplicates.items()
+            ],
+        }))
@@ -0,0 +1,68 @@
+import hashlib
+import re
+import time
+from collections import Counter
+
+from django.db import connections, DEFAULT_DB_ALIAS
+
+# the values are passed as params, a query differs from its duplicates only by the length of its IN lists
+IN_LIST_PATTERN = re.compile(r'IN \((?:%s, )*%s\)')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+
+def get_query_fingerprint(sql):
+    return hashlib.sha1(
+        WHITESPACE_PATTERN.sub(' ', IN_LIST_PATTERN.sub('IN (...)', sql)).strip().encode()
+    ).hexdigest()[:12]
+
+
+class QueryRecorder:
+    """
+    Records the SQL run on a database connection while active:
+        with QueryRecorder() as recorder:
+            ...
+        recorder.count, recorder.duration, recorder.duplicates
+    """
+
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        self.using = using
+        self.queries = []
+        self._wrapper = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - start))
+
+    def __enter__(self):
+        self._wrapper = connections[self.using].execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._wrapper.__exit__(*exc_info)
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def duration(self):
+        """The total time spent in the database, in seconds."""
+        return sum(duration for _, duration in self.queries)
+
+    @property
+    def duplicates(self):
+        """{fingerprint: (times run, sql)} of the queries run more than once, a sign of an N+1."""
+        fingerprints = Counter()
+        statements = {}
+        for sql, _ in self.queries:
+            fingerprint = get_query_fingerprint(sql)
+            fingerprints[fingerprint] += 1
+            statements.setdefault(fingerprint, sql)
+        return {
+            fingerprint: (count, statements[fingerprint])
+            for fingerprint, count in fingerprints.most_common() if count > 1
+        }
@@ -0,0 +1,122 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from server.instrumentation.budgets import QueryBudgetMixin, load_query_budgets, COLD_QUERY_BUDGETS_FILE
+from server.instrumentation.recorder import QueryRecorder, get_query_fingerprint
+from server.profiles.models import Profile
+from server.workouts.models import Exercise, ExerciseSession, WorkoutSession, WorkoutSnapshot, WorkoutTemplate
+from server.workouts.tests import build_exercise_payload
+
+UserModel = get_user_model()
+SEEDED_WORKOUTS = 5
+SEEDED_EXERCISES = 6
+SEEDED_SETS = 4
+
+
+class QueryRecorderTests(APITestCase):
+    def test_repeated_statements_are_reported_as_duplicates(self):
+        with QueryRecorder() as recorder:
+            for index in range(3):
+                list(Exercise.objects.filter(pk__in=range(index + 1)))
+            Exercise.objects.count()
+
+        self.assertEqual(recorder.count, 4)
+        [(count, sql)] = recorder.duplicates.values()
+        self.assertEqual(count, 3)
+        self.assertEqual(get_query_fingerprint(sql), get_query_fingerprint(recorder.queries[2][0]))
+
+    @override_settings(DEBUG=True)
+    def test_debug_responses_report_their_queries(self):
+        user = UserModel.objects.create_user(email='test@example.com', username='test_user', password='test_password')
+        Profile.objects.create_profile(user=user)
+        self.client.force_authenticate(user=user)
+
+        response = self.client.get('/fitness/workout/list/')
+
+        self.assertGreater(int(response['X-DB-Query-Count']), 0)
+        self.assertIn('X-DB-Time-Ms', response)
+
+    @override_settings(DEBUG=True)
+    def test_streaming_responses_are_recorded_until_the_end_of_the_stream(self):
+        user = UserModel.objects.create_user(email='test@example.com', username='test_user', password='test_password')
+        profile = Profile.objects.create_profile(user=user)
+        WorkoutSession.objects.create(name='Push day', total_exercises=0, total_sets=0, total_weight_volume=0,
+                                      created_by=profile)
+        self.client.force_authenticate(user=user)
+
+        response = self.client.get('/fitness/workout/export/ndjson/')
+        with self.assertLogs('server.queries') as logs, CaptureQueriesContext(connection) as context:
+            b''.join(response.streaming_content)
+
+        self.assertNotIn('X-DB-Query-Count', response)
+        [line] = logs.records
+        logged = json.loads(line.getMessage())
+        self.assertEqual(logged['path'], '/fitness/workout/export/ndjson/')
+        self.assertGreaterEqual(logged['queries'], len(context.captured_queries))
+        self.assertGreater(len(context.captured_queries), 0)
+
+
+class QueryBudgetTests(QueryBudgetMixin, APITestCase):
+    """
+    Runs every endpoint of query_budgets.json against a seeded dataset with warm caches, and the ones of
+    cold_query_budgets.json with no cache entries nor snapshots.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = UserModel.objects.create_user(email='test@example.com', username='test_user',
+                                                  password='test_password')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.profile = Profile.objects.create_profile(user=self.user)
+        self.client.force_authenticate(user=self.user)
+        exercises = [Exercise.objects.create(name=f'Exercise {index}') for index in range(SEEDED_EXERCISES)]
+
+        payload = {'name': 'Push day', 'exercises': [
+            build_exercise_payload(exercise, SEEDED_SETS, order) for order, exercise in enumerate(exercises[:-2])
+        ] + [{
+            'session_type': 'superset',
+            'order': len(exercises) - 2,
+            'exercises': [build_exercise_payload(exercise, SEEDED_SETS) for exercise in exercises[-2:]],
+        }]}
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(SEEDED_WORKOUTS):
+                response = self.client.post('/fitness/workout/create/', payload, format='json')
+                self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+            template_response = self.client.post('/fitness/workout/template/create/', payload, format='json')
+            self.assertEqual(template_response.status_code, status.HTTP_201_CREATED, template_response.data)
+            for weight in (82, 81, 80):
+                self.client.put('/health/measures/weight/', {'weight': weight})
+
+        self.ids = {
+            'workout_id': WorkoutSession.objects.latest('pk').pk,
+            'template_id': WorkoutTemplate.objects.get().pk,
+            'exercise_session_id': ExerciseSession.objects.latest('pk').pk,
+            'exercise_id': exercises[0].pk,
+        }
+
+    def test_endpoints_stay_within_their_query_budgets(self):
+        for (method, path), max_queries in load_query_budgets().items():
+            path = path.format(**self.ids)
+            with self.subTest(path=path):
+                # the first request warms the snapshots and the caches
+                response = self.client.generic(method, path)
+                self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+                with self.assertQueryBudget(max_queries, f"{method} {path}"):
+                    self.client.generic(method, path)
+
+    def test_endpoints_stay_within_their_cold_query_budgets(self):
+        for (method, path), max_queries in load_query_budgets(COLD_QUERY_BUDGETS_FILE).items():
+            path = path.format(**self.ids)
+            with self.subTest(path=path):
+                cache.clear()
+                WorkoutSnapshot.objects.all().delete()
+                with self.assertQueryBudget(max_queries, f"{method} {path}"):
+                    response = self.client.generic(method, path)
+                self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
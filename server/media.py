@@ -0,0 +1,48 @@
+import os
+
+from cloudinary.exceptions import Error as CloudinaryError
+from cloudinary.uploader import upload_large
+from django.core.files.storage import storages
+from django.utils.crypto import get_random_string
+
+# The uploaded pictures and videos are streamed to the spool storage by the views and the workers
+# get only their name there, so the broker messages stay tiny. A worker streams the spooled file
+# to Cloudinary in chunks and removes it once it was uploaded or ran out of retries.
+MEDIA_SPOOL_STORAGE = 'media_spool'
+# Cloudinary takes chunks of at least 5 MB, only the current one is held in memory
+MEDIA_UPLOAD_CHUNK_SIZE = 6 * 1024 * 1024
+MEDIA_UPLOAD_MAX_RETRIES = 5
+# seconds before the first retry, doubled for every next one
+MEDIA_UPLOAD_RETRY_BACKOFF = 10
+
+
+def get_spool_storage():
+    return storages[MEDIA_SPOOL_STORAGE]
+
+
+def spool_upload(uploaded_file, folder):
+    """Writes the upload to the spool storage chunk by chunk, returns its name there."""
+    extension = os.path.splitext(uploaded_file.name or '')[1].lower()
+    return get_spool_storage().save(f'{folder}/{get_random_string(32)}{extension}', uploaded_file)
+
+
+def remove_spooled_file(name):
+    get_spool_storage().delete(name)
+
+
+def upload_spooled_file(task, name, resource_type):
+    """
+    Uploads a spooled file from a bound task and returns its Cloudinary public id.
+    A failed upload is retried with an exponential backoff, the file is removed once the task is done with it.
+    """
+    try:
+        with get_spool_storage().open(name, 'rb') as spooled_file:
+            response = upload_large(spooled_file, resource_type=resource_type, chunk_size=MEDIA_UPLOAD_CHUNK_SIZE)
+    except CloudinaryError as e:
+        if task.request.retries < MEDIA_UPLOAD_MAX_RETRIES:
+            raise task.retry(exc=e, countdown=MEDIA_UPLOAD_RETRY_BACKOFF * 2 ** task.request.retries,
+                             max_retries=MEDIA_UPLOAD_MAX_RETRIES)
+        remove_spooled_file(name)
+        raise
+    remove_spooled_file(name)
+    return response['public_id']
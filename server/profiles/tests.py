@@ -1,3 +1,71 @@
-from django.test import TestCase
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from cloudinary.exceptions import Error as CloudinaryError
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from server.media import MEDIA_UPLOAD_MAX_RETRIES, get_spool_storage
+from server.profiles.models import Profile
+from server.profiles.tasks import upload_profile_picture_to_cloudinary_and_save_to_profile
+
+UserModel = get_user_model()
+SPOOL_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    'media_spool': {'BACKEND': 'django.core.files.storage.FileSystemStorage', 'OPTIONS': {'location': SPOOL_ROOT}},
+})
+class ProfilePictureUploadTests(APITestCase):
+    def setUp(self):
+        self.user = UserModel.objects.create_user(email='test@example.com', username='test_user',
+                                                  password='test_password')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.profile = Profile.objects.create_profile(user=self.user)
+        self.client.force_authenticate(user=self.user)
+
+    def spool_picture(self):
+        picture = SimpleUploadedFile('me.JPG', b'picture-bytes' * 1000, content_type='image/jpeg')
+        with mock.patch.object(upload_profile_picture_to_cloudinary_and_save_to_profile, 'delay') as delay:
+            response = self.client.put('/profile/profile-picture/', {'profile_picture': picture}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        return delay.call_args.args[0]
+
+    def test_upload_is_spooled_and_only_its_name_is_queued(self):
+        spooled_name = self.spool_picture()
+
+        self.assertTrue(spooled_name.startswith('profile_pictures/'))
+        self.assertTrue(spooled_name.endswith('.jpg'))
+        with get_spool_storage().open(spooled_name) as spooled_file:
+            self.assertEqual(spooled_file.read(), b'picture-bytes' * 1000)
+
+    def test_worker_streams_the_spooled_file_and_removes_it(self):
+        spooled_name = self.spool_picture()
+
+        with mock.patch('server.media.upload_large', return_value={'public_id': 'profile-picture'}) as upload_large:
+            upload_profile_picture_to_cloudinary_and_save_to_profile.apply(args=[spooled_name, self.profile.pk])
+
+        uploaded_file = upload_large.call_args.args[0]
+        self.assertTrue(hasattr(uploaded_file, 'read'))
+        self.assertEqual(upload_large.call_args.kwargs['resource_type'], 'image')
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.picture.public_id, 'profile-picture')
+        self.assertFalse(get_spool_storage().exists(spooled_name))
+
+    def test_spooled_file_is_removed_when_the_retries_run_out(self):
+        spooled_name = self.spool_picture()
+
+        with mock.patch('server.media.upload_large', side_effect=CloudinaryError('unavailable')):
+            result = upload_profile_picture_to_cloudinary_and_save_to_profile.apply(
+                args=[spooled_name, self.profile.pk], retries=MEDIA_UPLOAD_MAX_RETRIES,
+            )
+
+        self.assertTrue(result.failed())
+        self.assertFalse(get_spool_storage().exists(spooled_name))
+        self.profile.refresh_from_db()
+        self.assertFalse(self.profile.picture)
@@ -2,11 +2,11 @@ from cloudinary import uploader
 from django.contrib.auth import get_user_model
 from django.shortcuts import render
 from django.utils import timezone
-import base64
 from rest_framework import generics as rest_generic_views, status, views
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.response import Response
 
+from server.media import spool_upload
 from server.models_utils import MAX_LEN_PROFILE_FULL_NAME, MAX_LEN_ACCOUNT_USERNAME, MAX_LEN_PROFILE_BIO
 from server.profiles.models import Profile
 from server.profiles.serializers import BaseProfileSerializer, ProfileEditSerializer
@@ -197,10 +197,9 @@ class ProfilePictureView(views.APIView):
         profile = self.request.user.profile
         if not new_picture:
             return Response(status=status.HTTP_400_BAD_REQUEST)
-        # Coding the image to a base64
-        encoded_picture = base64.b64encode(new_picture.read()).decode('utf-8')
-        # sending the encoded base64 to celery
-        upload_profile_picture_to_cloudinary_and_save_to_profile.delay(encoded_picture, profile.pk)
+        # the worker gets only the name of the spooled picture
+        spooled_name = spool_upload(new_picture, 'profile_pictures')
+        upload_profile_picture_to_cloudinary_and_save_to_profile.delay(spooled_name, profile.pk)
         return Response(status=status.HTTP_202_ACCEPTED)
         # return Response(status=status.HTTP_204_NO_CONTENT)
 
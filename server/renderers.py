@@ -0,0 +1,82 @@
+import math
+import re
+from io import BytesIO
+
+from django.conf import settings
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# The API responses are rendered and the request bodies parsed with orjson when it is installed,
+# falling back to DRF's stdlib json implementation otherwise. The output is the same as
+# JSONRenderer's: compact, UTF-8, \u2028 and \u2029 escaped, and the dates, times and datetimes
+# (including the strings of transform_timestamp) formatted by DRF's encoder. The floats are the
+# exception: the very large and very small ones are written without the exponent's sign or with
+# no exponent (1e16 for 1e+16, 0.00001 for 1e-05), which parse back to the same values.
+# What orjson cannot encode, like the integers over 64 bits, and the NaN and infinite floats it
+# would write as null, are rendered by DRF, which rejects the latter. Likewise the bodies orjson
+# rejects (the lone surrogates) or would read differently (the integers over 64 bits, as floats)
+# are parsed by DRF.
+ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS if orjson is not None else 0
+# 19 digits in a row, the shortest integer literal that may not fit in 64 bits
+LONG_NUMBER = re.compile(rb'\d{19}')
+
+
+def encode_default(obj, encoder=JSONEncoder()):
+    """The types orjson does not handle natively, encoded like DRF does."""
+    return encoder.default(obj)
+
+
+def has_non_finite_floats(data):
+    if isinstance(data, float):
+        return not math.isfinite(data)
+    if isinstance(data, dict):
+        return any(has_non_finite_floats(value) for value in data.values())
+    if isinstance(data, (list, tuple)):
+        return any(has_non_finite_floats(value) for value in data)
+    return False
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        # the pretty printed, ascii only or non strict output is left to DRF
+        if orjson is None or self.ensure_ascii or not self.compact or not self.strict \
+                or self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=encode_default, option=ORJSON_OPTIONS)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # a NaN or an infinity was written as null, the data is only walked when there is one
+        if b'null' in ret and has_non_finite_floats(data):
+            return super().render(data, accepted_media_type, renderer_context)
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+
+        body = stream.read()
+        if not LONG_NUMBER.search(body):
+            try:
+                return orjson.loads(body)
+            except orjson.JSONDecodeError:
+                pass
+        # the invalid bodies get DRF's parse error
+        return super().parse(BytesIO(body), media_type, parser_context)
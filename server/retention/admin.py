@@ -0,0 +1,15 @@
+from django.contrib import admin
+
+from server.retention.models import HistoryArchive, HistoryRetentionState
+
+
+@admin.register(HistoryArchive)
+class HistoryArchiveAdmin(admin.ModelAdmin):
+    list_display = ('id', 'model_label', 'object_id', 'rows_count', 'first_history_date', 'last_history_date')
+    list_filter = ('model_label',)
+    exclude = ('data',)
+
+
+@admin.register(HistoryRetentionState)
+class HistoryRetentionStateAdmin(admin.ModelAdmin):
+    list_display = ('model_label', 'cursor', 'updated_at')
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from server.retention.policies import apply_retention, get_retention_policies
+
+
+class Command(BaseCommand):
+    help = "Prunes the simple_history tables with the policies of settings.HISTORY_RETENTION_POLICIES."
+
+    def add_arguments(self, parser):
+        parser.add_argument('model_labels', nargs='*', help="Only prune the history of these models, e.g. workouts.Set")
+
+    def handle(self, *args, **options):
+        policies = get_retention_policies()
+        model_labels = options['model_labels'] or list(policies)
+        unknown_labels = [model_label for model_label in model_labels if model_label not in policies]
+        if unknown_labels:
+            raise CommandError(f"No retention policy for {', '.join(unknown_labels)}")
+        for model_label in model_labels:
+            apply_retention(model_label, stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS("Done"))
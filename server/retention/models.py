@@ -0,0 +1,47 @@
+import json
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+
+
+class HistoryArchive(models.Model):
+    """
+    The historical rows of one object moved out of its simple_history table by the retention,
+    stored as zlib compressed JSON. See server.retention.policies.
+    """
+    MAX_LEN_MODEL_LABEL = 100
+
+    model_label = models.CharField(max_length=MAX_LEN_MODEL_LABEL)
+    object_id = models.PositiveBigIntegerField()
+    first_history_date = models.DateTimeField()
+    last_history_date = models.DateTimeField()
+    rows_count = models.PositiveIntegerField()
+    data = models.BinaryField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['model_label', 'object_id'], name='history_archive_object_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.model_label} {self.object_id} - {self.rows_count} rows"
+
+    @staticmethod
+    def compress_rows(rows):
+        return zlib.compress(json.dumps(rows, cls=DjangoJSONEncoder).encode())
+
+    def get_rows(self):
+        return json.loads(zlib.decompress(self.data))
+
+
+class HistoryRetentionState(models.Model):
+    """Where the retention of a history table stopped, so an interrupted run resumes from there."""
+    model_label = models.CharField(max_length=HistoryArchive.MAX_LEN_MODEL_LABEL, unique=True)
+    # the last object id processed by the current run
+    cursor = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.model_label} after {self.cursor}"
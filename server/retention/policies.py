@@ -0,0 +1,122 @@
+from datetime import timedelta
+from itertools import groupby, islice
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+
+# Every save of a model with HistoricalRecords writes a full row to its history table, so the
+# tables are pruned with the per model policies of settings.HISTORY_RETENTION_POLICIES.
+# The objects are walked in chunks of ascending ids, each chunk in its own transaction, and the
+# last processed id is saved after every chunk, so an interrupted run resumes where it stopped.
+# The first row of every object is never removed: `set.history.last()` is the set as planned.
+RETENTION_CHUNK_SIZE = 500
+RETENTION_DELETE_BATCH_SIZE = 1000
+HISTORY_TYPE_CHANGED = '~'
+
+
+def get_retention_policies():
+    return getattr(settings, 'HISTORY_RETENTION_POLICIES', {})
+
+
+def get_history_model(model_label):
+    return apps.get_model(model_label).history.model
+
+
+def iterate_in_batches(iterable, batch_size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, batch_size)):
+        yield batch
+
+
+def plan_object_retention(rows, policy):
+    """
+    Splits the historical rows of one object, oldest first, into the collapsed ones, which are
+    deleted, and the expired ones, which are archived or deleted.
+    """
+    collapse_window = timedelta(seconds=policy['collapse_window']) if policy.get('collapse_window') else None
+    keep_versions = policy.get('keep_versions')
+
+    collapsed = []
+    versions = []
+    # the later edit of the two already holds the final state of the object
+    for row, next_row in zip(rows[1:], rows[2:] + [None]):
+        if collapse_window is not None and next_row is not None \
+                and row['history_type'] == next_row['history_type'] == HISTORY_TYPE_CHANGED \
+                and next_row['history_date'] - row['history_date'] <= collapse_window:
+            collapsed.append(row)
+        else:
+            versions.append(row)
+    # the first row counts as one of the kept versions
+    expired = versions[:max(len(versions) + 1 - keep_versions, 0)] if keep_versions else []
+    return collapsed, expired
+
+
+def apply_retention_chunk(model_label, policy, after_object_id=0, chunk_size=RETENTION_CHUNK_SIZE):
+    """
+    Applies the policy to the next chunk of objects, read from the history's id index. The objects
+    with a single historical row have nothing to prune and are skipped.
+    Returns the last processed object id (None when the table is done) and the counts of the
+    collapsed, archived and deleted rows.
+    """
+    from server.retention.models import HistoryArchive, HistoryRetentionState
+
+    history_model = get_history_model(model_label)
+    stats = {'collapsed': 0, 'archived': 0, 'deleted': 0}
+    object_ids = list(history_model.objects.filter(id__gt=after_object_id).values_list('id', flat=True).distinct(
+    ).order_by('id')[:chunk_size])
+    if not object_ids:
+        HistoryRetentionState.objects.filter(model_label=model_label).delete()
+        return None, stats
+
+    archives = []
+    removed_history_ids = []
+    rows = history_model.objects.filter(id__in=object_ids).order_by('id', 'history_date', 'history_id').values()
+    for object_id, object_rows in groupby(rows.iterator(), key=lambda row: row['id']):
+        object_rows = list(object_rows)
+        if len(object_rows) == 1:
+            continue
+        collapsed, expired = plan_object_retention(object_rows, policy)
+        removed_history_ids += [row['history_id'] for row in collapsed + expired]
+        stats['collapsed'] += len(collapsed)
+        if expired and policy.get('archive'):
+            archives.append(HistoryArchive(
+                model_label=model_label,
+                object_id=object_id,
+                first_history_date=expired[0]['history_date'],
+                last_history_date=expired[-1]['history_date'],
+                rows_count=len(expired),
+                data=HistoryArchive.compress_rows(expired),
+            ))
+            stats['archived'] += len(expired)
+        else:
+            stats['deleted'] += len(expired)
+
+    with transaction.atomic():
+        HistoryArchive.objects.bulk_create(archives)
+        for history_ids in iterate_in_batches(removed_history_ids, RETENTION_DELETE_BATCH_SIZE):
+            history_model.objects.filter(history_id__in=history_ids).delete()
+        HistoryRetentionState.objects.update_or_create(model_label=model_label, defaults={'cursor': object_ids[-1]})
+    return object_ids[-1], stats
+
+
+def apply_retention(model_label, max_chunks=None, chunk_size=RETENTION_CHUNK_SIZE, stdout=None):
+    """
+    Applies the policy of the model from where its last run stopped.
+    `max_chunks` bounds the work of one call. Returns True once the whole table was processed.
+    """
+    from server.retention.models import HistoryRetentionState
+
+    policy = get_retention_policies()[model_label]
+    state = HistoryRetentionState.objects.filter(model_label=model_label).first()
+    cursor = state.cursor if state is not None else 0
+    chunks = 0
+    while max_chunks is None or chunks < max_chunks:
+        cursor, stats = apply_retention_chunk(model_label, policy, cursor, chunk_size)
+        if cursor is None:
+            return True
+        chunks += 1
+        if stdout is not None:
+            stdout.write(f"{model_label} up to {cursor}: {stats['collapsed']} collapsed, "
+                         f"{stats['archived']} archived, {stats['deleted']} deleted")
+    return False
@@ -0,0 +1,19 @@
+from celery import shared_task
+
+from server.retention.policies import apply_retention, get_retention_policies
+
+# the chunks a task processes before queueing the rest of its table, so a worker is never busy for long
+RETENTION_CHUNKS_PER_TASK = 10
+
+
+@shared_task
+def run_history_retention():
+    """Starts the retention of every configured history table, each from where its last run stopped."""
+    for model_label in get_retention_policies():
+        apply_history_retention.delay(model_label)
+
+
+@shared_task
+def apply_history_retention(model_label):
+    if not apply_retention(model_label, max_chunks=RETENTION_CHUNKS_PER_TASK):
+        apply_history_retention.delay(model_label)
@@ -0,0 +1,86 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from server.profiles.models import Profile
+from server.retention.models import HistoryArchive, HistoryRetentionState
+from server.retention.policies import apply_retention
+from server.workouts.models import Set
+
+UserModel = get_user_model()
+
+
+class HistoryRetentionTests(APITestCase):
+    def setUp(self):
+        self.user = UserModel.objects.create_user(email='test@example.com', username='test_user',
+                                                  password='test_password')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.profile = Profile.objects.create_profile(user=self.user)
+
+    def create_set(self, weights, minutes_apart):
+        """A set saved once per weight, the saves `minutes_apart` from each other."""
+        set_instance = Set.objects.create(weight=weights[0], reps=10, created_by=self.profile)
+        for weight in weights[1:]:
+            set_instance.weight = weight
+            set_instance.save()
+        start = timezone.now() - timedelta(days=1)
+        for index, history_id in enumerate(set_instance.history.order_by('history_id').values_list('history_id', flat=True)):
+            Set.history.filter(history_id=history_id).update(history_date=start + timedelta(minutes=index * minutes_apart))
+        return set_instance
+
+    def get_weights(self, set_instance):
+        return list(set_instance.history.order_by('history_date').values_list('weight', flat=True))
+
+    @override_settings(HISTORY_RETENTION_POLICIES={'workouts.Set': {'collapse_window': 60 * 10}})
+    def test_edits_within_the_window_are_collapsed(self):
+        quick_edits = self.create_set([50, 55, 60, 65], minutes_apart=1)
+        slow_edits = self.create_set([50, 55, 60], minutes_apart=60)
+
+        self.assertTrue(apply_retention('workouts.Set'))
+
+        self.assertEqual(self.get_weights(quick_edits), [50, 65])
+        self.assertEqual(self.get_weights(slow_edits), [50, 55, 60])
+        self.assertEqual(quick_edits.history.last().weight, 50)
+
+    @override_settings(HISTORY_RETENTION_POLICIES={'workouts.Set': {'keep_versions': 3, 'archive': True}})
+    def test_older_versions_are_archived_and_the_first_one_kept(self):
+        set_instance = self.create_set([50, 55, 60, 65, 70], minutes_apart=60)
+
+        call_command('apply_history_retention', 'workouts.Set', stdout=StringIO())
+
+        self.assertEqual(self.get_weights(set_instance), [50, 65, 70])
+        archive = HistoryArchive.objects.get(model_label='workouts.Set', object_id=set_instance.pk)
+        self.assertEqual(archive.rows_count, 2)
+        self.assertEqual([row['weight'] for row in archive.get_rows()], [55, 60])
+
+    @override_settings(HISTORY_RETENTION_POLICIES={'workouts.Set': {'keep_versions': 2}})
+    def test_interrupted_run_resumes_after_the_last_chunk(self):
+        first_set = self.create_set([50, 55, 60], minutes_apart=60)
+        second_set = self.create_set([50, 55, 60], minutes_apart=60)
+
+        self.assertFalse(apply_retention('workouts.Set', max_chunks=1, chunk_size=1))
+        self.assertEqual(HistoryRetentionState.objects.get(model_label='workouts.Set').cursor, first_set.pk)
+        self.assertEqual(self.get_weights(first_set), [50, 60])
+        self.assertEqual(self.get_weights(second_set), [50, 55, 60])
+
+        self.assertTrue(apply_retention('workouts.Set', chunk_size=1))
+        self.assertEqual(self.get_weights(second_set), [50, 60])
+        self.assertFalse(HistoryRetentionState.objects.exists())
+        self.assertFalse(HistoryArchive.objects.exists())
+
+    @override_settings(HISTORY_RETENTION_POLICIES={'workouts.Set': {'keep_versions': 2}})
+    def test_objects_with_a_single_row_are_skipped(self):
+        unchanged_set = self.create_set([50], minutes_apart=60)
+        edited_set = self.create_set([50, 55, 60], minutes_apart=60)
+
+        self.assertFalse(apply_retention('workouts.Set', max_chunks=1, chunk_size=1))
+        self.assertEqual(HistoryRetentionState.objects.get(model_label='workouts.Set').cursor, unchanged_set.pk)
+        self.assertTrue(apply_retention('workouts.Set', chunk_size=1))
+
+        self.assertEqual(self.get_weights(unchanged_set), [50])
+        self.assertEqual(self.get_weights(edited_set), [50, 60])
@@ -1,4 +1,6 @@
 from pathlib import Path
+from celery.schedules import crontab
+from corsheaders.defaults import default_headers
 from decouple import config
 import cloudinary.api
 import os
@@ -23,13 +25,19 @@ else:
 # ALLOWED_HOSTS += '192.168.0.4'
 
 CORS_ORIGIN_ALLOW_ALL = True
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
 
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'server.renderers.FastJSONRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'server.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'server.authentication.backends.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -82,10 +90,15 @@ INSTALLED_APPS = [
     'server.profiles',
     'server.workouts',
     'server.health',
+    'server.sync',
+    'server.retention',
+    'server.instrumentation',
 
 ]
 
 MIDDLEWARE = [
+    # first, so the queries of the other middleware are counted too
+    'server.instrumentation.middleware.QueryInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     "corsheaders.middleware.CorsMiddleware",
@@ -159,9 +172,72 @@ DATABASES = {
     }
 }
 
+if 'postgresql' in DATABASES['default']['ENGINE']:
+    # trigram lookups used by the workouts search
+    INSTALLED_APPS.append('django.contrib.postgres')
+
+# Required in production: the catalog and token cache invalidations reach the other web and Celery
+# processes only through a shared cache, the locmem fallback is local to each process.
+CACHE_URL = config('CACHE_URL', default='')
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 CELERY_BROKER_URL = config('CELERY_BROKER_URL')
 CELERY_RESULT_BACKEND = config('CELERY_RESULT_BACKEND')
 CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP = config('CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP')
+CELERY_BEAT_SCHEDULE = {
+    'history-retention': {
+        'task': 'server.retention.tasks.run_history_retention',
+        'schedule': crontab(hour=3, minute=30),
+    },
+    'idempotency-keys': {
+        'task': 'server.workouts.tasks.remove_expired_idempotency_keys',
+        'schedule': crontab(hour=4, minute=0),
+    },
+}
+
+# How the simple_history tables are pruned, see server.retention.policies.
+# keep_versions - the versions of an object kept in its history table, older ones are archived or deleted
+# collapse_window - seconds, an edit followed by another edit within the window is dropped
+# archive - move the expired versions to the compressed HistoryArchive instead of deleting them
+HISTORY_RETENTION_POLICIES = {
+    'workouts.Set': {'keep_versions': 20, 'collapse_window': 60 * 10, 'archive': True},
+    'workouts.ExerciseSession': {'keep_versions': 10, 'collapse_window': 60 * 10, 'archive': True},
+    'workouts.CustomExercise': {'keep_versions': 10, 'collapse_window': 60 * 10, 'archive': True},
+    'workouts.ExerciseInstruction': {'keep_versions': 10, 'collapse_window': 60 * 10, 'archive': True},
+    # the history of the measures is the weight log of the profile, only the corrections are collapsed
+    'health.Measures': {'collapse_window': 60 * 10},
+    'authentication.Username': {'keep_versions': 5, 'archive': True},
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        # a JSON line per request with its query count, the debug responses have them in headers instead
+        'server.queries': {
+            'handlers': ['console'],
+            'level': config('QUERY_LOG_LEVEL', default='WARNING' if DEBUG else 'INFO'),
+            'propagate': False,
+        },
+    },
+}
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -201,6 +277,22 @@ USE_TZ = True
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+    # the uploads waiting for the workers, must be shared with them, see server.media
+    'media_spool': {
+        'BACKEND': config('MEDIA_SPOOL_BACKEND', default='django.core.files.storage.FileSystemStorage'),
+        'OPTIONS': {
+            'location': config('MEDIA_SPOOL_ROOT', default=os.path.join(BASE_DIR, 'spool')),
+        },
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 AUTH_USER_MODEL = "authentication.AppUser"
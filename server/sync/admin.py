@@ -0,0 +1,8 @@
+from django.contrib import admin
+
+from server.sync.models import SyncChange
+
+
+@admin.register(SyncChange)
+class SyncChangeAdmin(admin.ModelAdmin):
+    list_display = ('sequence', 'profile', 'kind', 'object_id', 'is_deleted', 'changed_at')
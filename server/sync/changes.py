@@ -0,0 +1,272 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from weakref import WeakKeyDictionary
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Q
+
+# The changes of a transaction are collected and written to the log once, when it commits:
+# a set edit is traced back to the workouts, templates and routines showing it with a fixed
+# number of queries, however many rows the transaction touched. The changes recorded in a
+# savepoint that is rolled back are dropped with it.
+SYNC_PAGE_SIZE = 200
+MAX_SYNC_PAGE_SIZE = 1000
+
+
+def get_sync_models():
+    """{kind: (model, owner field)} of the synced objects."""
+    from server.health.models import Measures
+    from server.sync.models import SyncChange
+    from server.workouts.models import WorkoutSession, WorkoutTemplate, WorkoutPlan, CustomExercise
+
+    return {
+        SyncChange.KIND_WORKOUT: (WorkoutSession, 'created_by_id'),
+        SyncChange.KIND_TEMPLATE: (WorkoutTemplate, 'created_by_id'),
+        SyncChange.KIND_ROUTINE: (WorkoutPlan, 'created_by_id'),
+        SyncChange.KIND_CUSTOM_EXERCISE: (CustomExercise, 'created_by_id'),
+        SyncChange.KIND_MEASURES: (Measures, 'profile_id'),
+    }
+
+
+class PendingChanges:
+    """
+    Changes recorded in a transaction. Its commit() is registered as an on_commit callback: Django drops
+    it together with the savepoint it was recorded in when that is rolled back, and only runs it,
+    marking the changes as committed, once the whole transaction committed.
+    """
+
+    def __init__(self):
+        self.objects = defaultdict(set)
+        self.deleted = {}
+        self.exercise_sessions = set()
+        self.supersets = set()
+        self.session_items = defaultdict(set)
+        self.committed = False
+
+    def commit(self):
+        self.committed = True
+
+    def __bool__(self):
+        return any(self.objects.values()) or any(self.session_items.values()) or bool(self.deleted) \
+            or bool(self.exercise_sessions) or bool(self.supersets)
+
+    def update(self, other):
+        for kind, object_ids in other.objects.items():
+            self.objects[kind].update(object_ids)
+        self.deleted.update(other.deleted)
+        self.exercise_sessions.update(other.exercise_sessions)
+        self.supersets.update(other.supersets)
+        for content_type_id, object_ids in other.session_items.items():
+            self.session_items[content_type_id].update(object_ids)
+
+
+class ChangesFlush:
+    """
+    Writes the committed PendingChanges of a transaction at once. It is registered with on_commit
+    after the changes it writes, in the savepoints it was registered in.
+    """
+
+    def __init__(self, connection, pending_changes, savepoint_ids=frozenset()):
+        self.connection = connection
+        self.pending_changes = pending_changes
+        self.savepoint_ids = savepoint_ids
+        self.done = False
+
+    def flush(self):
+        self.done = True
+        if transaction_flushes.get(self.connection) is self:
+            del transaction_flushes[self.connection]
+        committed = PendingChanges()
+        for pending in self.pending_changes:
+            if pending.committed:
+                committed.update(pending)
+        flush_changes(committed)
+
+
+# {connection: the last ChangesFlush registered in its transaction}
+transaction_flushes = WeakKeyDictionary()
+
+
+@contextmanager
+def recording_changes():
+    """Yields the PendingChanges to record changes into, they are written once the transaction commits."""
+    connection = transaction.get_connection()
+    pending = PendingChanges()
+    if not connection.in_atomic_block:
+        # autocommit, the changes are written right away
+        pending.commit()
+        yield pending
+        transaction.on_commit(ChangesFlush(connection, [pending]).flush, robust=True)
+        return
+
+    yield pending
+    transaction.on_commit(pending.commit)
+    # a flush has to run after the changes, so every call registers one. It takes over the changes of
+    # the previous flush when it is dropped with it, i.e. when it is not in a savepoint the previous one
+    # is out of, and that one is left with nothing to write. Otherwise both write their own changes.
+    savepoint_ids = frozenset(connection.savepoint_ids)
+    flush = ChangesFlush(connection, [], savepoint_ids)
+    previous_flush = transaction_flushes.get(connection)
+    if previous_flush is not None and not previous_flush.done and savepoint_ids <= previous_flush.savepoint_ids:
+        flush.pending_changes, previous_flush.pending_changes = previous_flush.pending_changes, []
+    flush.pending_changes.append(pending)
+    transaction.on_commit(flush.flush, robust=True)
+    transaction_flushes[connection] = flush
+
+
+def record_changes(kind, object_ids):
+    with recording_changes() as pending:
+        pending.objects[kind].update(object_ids)
+
+
+def record_deletion(kind, object_id, profile_id):
+    with recording_changes() as pending:
+        pending.deleted[(kind, object_id)] = profile_id
+
+
+def record_exercise_sessions_changes(exercise_session_ids):
+    with recording_changes() as pending:
+        pending.exercise_sessions.update(exercise_session_ids)
+
+
+def record_supersets_changes(superset_ids):
+    with recording_changes() as pending:
+        pending.supersets.update(superset_ids)
+
+
+def record_session_item_change(item):
+    """A set, rest or interval changed, the sessions holding it are looked up when the transaction commits."""
+    with recording_changes() as pending:
+        pending.session_items[ContentType.objects.get_for_model(item).id].add(item.pk)
+
+
+def resolve_workout_tree_changes(pending):
+    """Adds the workouts, templates and routines showing the changed sessions, supersets and items."""
+    from server.sync.models import SyncChange
+    from server.workouts.models import ExerciseSession, ExerciseSessionItem, SupersetSession, WorkoutPlan, \
+        WorkoutExerciseSession, WorkoutTemplateExerciseItem
+
+    objects = pending.objects
+    exercise_session_ids = set(pending.exercise_sessions)
+    if pending.session_items:
+        items_filter = Q()
+        for content_type_id, object_ids in pending.session_items.items():
+            items_filter |= Q(content_type_id=content_type_id, object_id__in=object_ids)
+        exercise_session_ids.update(ExerciseSessionItem.objects.filter(items_filter).values_list(
+            'exercise_session_id', flat=True
+        ))
+
+    superset_ids = set(pending.supersets)
+    if exercise_session_ids:
+        superset_ids.update(SupersetSession.exercises.through.objects.filter(
+            exercisesession_id__in=exercise_session_ids
+        ).values_list('supersetsession_id', flat=True))
+
+    if exercise_session_ids or superset_ids:
+        tree_filter = (
+            Q(content_type=ContentType.objects.get_for_model(ExerciseSession), object_id__in=exercise_session_ids) |
+            Q(content_type=ContentType.objects.get_for_model(SupersetSession), object_id__in=superset_ids)
+        )
+        objects[SyncChange.KIND_WORKOUT].update(WorkoutExerciseSession.objects.filter(tree_filter).values_list(
+            'workout_session_id', flat=True
+        ))
+        objects[SyncChange.KIND_TEMPLATE].update(WorkoutTemplateExerciseItem.objects.filter(
+            tree_filter
+        ).values_list('workout_template_id', flat=True))
+
+    # the routines list shows their workouts
+    if objects[SyncChange.KIND_WORKOUT]:
+        objects[SyncChange.KIND_ROUTINE].update(WorkoutPlan.workouts.through.objects.filter(
+            workoutsession_id__in=objects[SyncChange.KIND_WORKOUT]
+        ).values_list('workoutplan_id', flat=True))
+
+
+def update_workout_snapshots(pending):
+    """The rendered trees of the changed workouts and templates are rebuilt on their next read."""
+    from server.sync.models import SyncChange
+    from server.workouts.models import WorkoutSnapshot
+    from server.workouts.snapshots import invalidate_snapshots, remove_snapshots
+
+    for kind, snapshot_kind in ((SyncChange.KIND_WORKOUT, WorkoutSnapshot.KIND_WORKOUT),
+                                (SyncChange.KIND_TEMPLATE, WorkoutSnapshot.KIND_TEMPLATE)):
+        deleted_ids = {object_id for deleted_kind, object_id in pending.deleted if deleted_kind == kind}
+        invalidate_snapshots(snapshot_kind, pending.objects[kind] - deleted_ids)
+        remove_snapshots(snapshot_kind, deleted_ids)
+
+
+def allocate_sequences(changes):
+    """
+    Numbers the changes of every profile after its last sequence. The profiles' SyncSequence rows stay
+    locked until the transaction commits, so the changes of a profile commit in the order of their sequences
+    and a client never moves its cursor past a change that is still to commit.
+    """
+    from server.sync.models import SyncSequence
+
+    profile_ids = sorted({change.profile_id for change in changes})
+    # locked in the same order by every flush, so two of them never deadlock
+    sequences = {sequence.profile_id: sequence for sequence in SyncSequence.objects.select_for_update().filter(
+        profile_id__in=profile_ids
+    ).order_by('profile_id')}
+    missing_profile_ids = [profile_id for profile_id in profile_ids if profile_id not in sequences]
+    if missing_profile_ids:
+        SyncSequence.objects.bulk_create([SyncSequence(profile_id=profile_id) for profile_id in missing_profile_ids],
+                                         ignore_conflicts=True)
+        sequences.update({sequence.profile_id: sequence for sequence in SyncSequence.objects.select_for_update().filter(
+            profile_id__in=missing_profile_ids
+        ).order_by('profile_id')})
+    for change in changes:
+        sequence = sequences[change.profile_id]
+        sequence.last_sequence += 1
+        change.sequence = sequence.last_sequence
+    SyncSequence.objects.bulk_update(sequences.values(), ['last_sequence'])
+
+
+def flush_changes(pending):
+    from server.profiles.models import Profile
+    from server.sync.models import SyncChange
+    from server.utils import get_upsert_options
+
+    if not pending:
+        return
+    resolve_workout_tree_changes(pending)
+    update_workout_snapshots(pending)
+
+    changes = {}
+    for kind, (model, owner_field) in get_sync_models().items():
+        object_ids = pending.objects[kind]
+        if not object_ids:
+            continue
+        for object_id, profile_id in model.objects.filter(pk__in=object_ids).values_list('pk', owner_field):
+            changes[(kind, object_id)] = SyncChange(profile_id=profile_id, kind=kind, object_id=object_id)
+
+    deleted = {key: profile_id for key, profile_id in pending.deleted.items() if key not in changes}
+    # the objects deleted with their profile need no tombstones
+    existing_profile_ids = set(Profile.objects.filter(pk__in=set(deleted.values())).values_list('pk', flat=True)) \
+        if deleted else set()
+    for (kind, object_id), profile_id in deleted.items():
+        if profile_id in existing_profile_ids:
+            changes[(kind, object_id)] = SyncChange(profile_id=profile_id, kind=kind, object_id=object_id,
+                                                    is_deleted=True)
+    if not changes:
+        return
+
+    # a changed object gets a new sequence in its row, so it is past the cursors of every client
+    with transaction.atomic():
+        allocate_sequences(changes.values())
+        SyncChange.objects.bulk_create(changes.values(), **get_upsert_options(
+            ['kind', 'object_id'], ['profile', 'sequence', 'is_deleted', 'changed_at']
+        ))
+
+
+def get_changes(profile, cursor=0, page_size=SYNC_PAGE_SIZE):
+    """
+    Returns the page of the profile's changes after the cursor, read from the (profile, sequence) index,
+    and whether there are more.
+    """
+    from server.sync.models import SyncChange
+
+    changes = list(SyncChange.objects.filter(profile=profile, sequence__gt=cursor).order_by('sequence')[
+        :page_size + 1
+    ])
+    return changes[:page_size], len(changes) > page_size
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.6 on 2026-10-18 10:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('profiles', '0006_alter_profile_full_name_alter_profile_gender'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('workout', 'Workout session'), ('template', 'Workout template'), ('routine', 'Routine'), ('custom_exercise', 'Custom exercise'), ('measures', 'Measures')], max_length=20)),
+                ('object_id', models.PositiveIntegerField()),
+                ('is_deleted', models.BooleanField(default=False)),
+                ('changed_at', models.DateTimeField(auto_now=True)),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='profiles.profile')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['profile', 'id'], name='sync_change_cursor_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='syncchange',
+            constraint=models.UniqueConstraint(fields=('kind', 'object_id'), name='sync_change_unique_object'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.6 on 2026-10-18 10:34
+
+from django.db import migrations
+
+SYNCED_MODELS = [
+    ('workout', 'workouts', 'WorkoutSession', 'created_by_id'),
+    ('template', 'workouts', 'WorkoutTemplate', 'created_by_id'),
+    ('routine', 'workouts', 'WorkoutPlan', 'created_by_id'),
+    ('custom_exercise', 'workouts', 'CustomExercise', 'created_by_id'),
+    ('measures', 'health', 'Measures', 'profile_id'),
+]
+CHUNK_SIZE = 1000
+
+
+def backfill_sync_changes(apps, schema_editor):
+    """Logs the existing objects, so the first sync of a client sends them all."""
+    SyncChange = apps.get_model('sync', 'SyncChange')
+    for kind, app_label, model_name, owner_field in SYNCED_MODELS:
+        model = apps.get_model(app_label, model_name)
+        last_pk = 0
+        while True:
+            rows = list(model.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', owner_field)[:CHUNK_SIZE])
+            if not rows:
+                break
+            SyncChange.objects.bulk_create([
+                SyncChange(profile_id=profile_id, kind=kind, object_id=object_id) for object_id, profile_id in rows
+            ])
+            last_pk = rows[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sync', '0001_initial'),
+        ('workouts', '0010_exercise_progress_day'),
+        ('health', '0008_alter_fitness_profile_alter_measures_profile'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_sync_changes, migrations.RunPython.noop),
+    ]
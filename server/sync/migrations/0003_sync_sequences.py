@@ -0,0 +1,50 @@
+# Generated by Django 4.2.6 on 2026-10-18 11:37
+
+from django.db import migrations, models
+from django.db.models import F, Max
+import django.db.models.deletion
+
+
+def backfill_sequences(apps, schema_editor):
+    """The ids were the cursors until now, so the clients' cursors stay valid."""
+    SyncChange = apps.get_model('sync', 'SyncChange')
+    SyncSequence = apps.get_model('sync', 'SyncSequence')
+    SyncChange.objects.update(sequence=F('id'))
+    SyncSequence.objects.bulk_create([
+        SyncSequence(profile_id=profile_id, last_sequence=last_sequence)
+        for profile_id, last_sequence in SyncChange.objects.values('profile_id').annotate(
+            last_sequence=Max('id')
+        ).values_list('profile_id', 'last_sequence')
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0006_alter_profile_full_name_alter_profile_gender'),
+        ('sync', '0002_backfill_sync_changes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncSequence',
+            fields=[
+                ('profile', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='profiles.profile')),
+                ('last_sequence', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='syncchange',
+            name='sync_change_cursor_idx',
+        ),
+        migrations.AddField(
+            model_name='syncchange',
+            name='sequence',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_sequences, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='syncchange',
+            index=models.Index(fields=['profile', 'sequence'], name='sync_change_sequence_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+from django.db import models
+
+from server.profiles.models import Profile
+
+
+class SyncChange(models.Model):
+    """
+    The last change of an object the mobile client keeps offline. Every change of the object
+    updates its row with the next sequence of the profile, so the sequences serve as the sync cursor,
+    and a profile never has more rows than objects (plus the tombstones of the deleted ones).
+    """
+    KIND_WORKOUT = 'workout'
+    KIND_TEMPLATE = 'template'
+    KIND_ROUTINE = 'routine'
+    KIND_CUSTOM_EXERCISE = 'custom_exercise'
+    KIND_MEASURES = 'measures'
+    KIND_CHOICES = [
+        (KIND_WORKOUT, 'Workout session'),
+        (KIND_TEMPLATE, 'Workout template'),
+        (KIND_ROUTINE, 'Routine'),
+        (KIND_CUSTOM_EXERCISE, 'Custom exercise'),
+        (KIND_MEASURES, 'Measures'),
+    ]
+
+    profile = models.ForeignKey(Profile, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.PositiveIntegerField()
+    is_deleted = models.BooleanField(default=False)
+    sequence = models.BigIntegerField(default=0)
+    changed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='sync_change_unique_object'),
+        ]
+        indexes = [
+            models.Index(fields=['profile', 'sequence'], name='sync_change_sequence_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id} {'deleted' if self.is_deleted else 'changed'} at {self.changed_at}"
+
+
+class SyncSequence(models.Model):
+    """The last sequence given to a change of the profile, its row is locked while the changes are written."""
+    profile = models.OneToOneField(Profile, on_delete=models.CASCADE, primary_key=True)
+    last_sequence = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.profile} at {self.last_sequence}"
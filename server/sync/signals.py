@@ -0,0 +1,144 @@
+from django.db.models.signals import post_save, post_delete, m2m_changed, pre_delete
+from django.dispatch import receiver
+
+from server.health.models import Measures
+from server.sync.changes import record_changes, record_deletion, record_exercise_sessions_changes, \
+    record_supersets_changes, record_session_item_change
+from server.sync.models import SyncChange
+from server.workouts.models import WorkoutSession, WorkoutTemplate, WorkoutPlan, CustomExercise, Set, Rest, \
+    Interval, ExerciseSession, ExerciseSessionItem, SupersetSession, WorkoutExerciseSession, \
+    WorkoutTemplateExerciseItem, ActiveRoutine, Exercise, MuscleGroup
+
+SYNC_KINDS = {
+    WorkoutSession: (SyncChange.KIND_WORKOUT, 'created_by_id'),
+    WorkoutTemplate: (SyncChange.KIND_TEMPLATE, 'created_by_id'),
+    WorkoutPlan: (SyncChange.KIND_ROUTINE, 'created_by_id'),
+    CustomExercise: (SyncChange.KIND_CUSTOM_EXERCISE, 'created_by_id'),
+    Measures: (SyncChange.KIND_MEASURES, 'profile_id'),
+}
+
+
+@receiver(post_save, sender=WorkoutSession)
+@receiver(post_save, sender=WorkoutTemplate)
+@receiver(post_save, sender=WorkoutPlan)
+@receiver(post_save, sender=CustomExercise)
+@receiver(post_save, sender=Measures)
+def record_object_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        record_changes(SYNC_KINDS[sender][0], [instance.pk])
+
+
+@receiver(post_delete, sender=WorkoutSession)
+@receiver(post_delete, sender=WorkoutTemplate)
+@receiver(post_delete, sender=WorkoutPlan)
+@receiver(post_delete, sender=CustomExercise)
+@receiver(post_delete, sender=Measures)
+def record_object_deletion(sender, instance, **kwargs):
+    kind, owner_field = SYNC_KINDS[sender]
+    record_deletion(kind, instance.pk, getattr(instance, owner_field))
+
+
+# The workouts and templates are synced with their whole exercise tree,
+# so a change anywhere in the tree syncs the objects showing it.
+@receiver(post_save, sender=Set)
+@receiver(post_save, sender=Rest)
+@receiver(post_save, sender=Interval)
+def record_session_item_data_change(sender, instance, created, raw=False, **kwargs):
+    # a new set is synced once it is added to a session
+    if not created and not raw:
+        record_session_item_change(instance)
+
+
+@receiver(post_save, sender=ExerciseSessionItem)
+@receiver(post_delete, sender=ExerciseSessionItem)
+@receiver(post_save, sender=ExerciseSession)
+def record_exercise_session_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        record_exercise_sessions_changes([instance.pk if sender is ExerciseSession else instance.exercise_session_id])
+
+
+@receiver(post_save, sender=SupersetSession)
+def record_superset_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        record_supersets_changes([instance.pk])
+
+
+@receiver(m2m_changed, sender=SupersetSession.exercises.through)
+def record_superset_exercises_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action.startswith('pre_'):
+        return
+    if reverse:
+        record_exercise_sessions_changes([instance.pk])
+    else:
+        record_supersets_changes([instance.pk])
+
+
+@receiver(post_save, sender=WorkoutExerciseSession)
+@receiver(post_delete, sender=WorkoutExerciseSession)
+def record_workout_exercise_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        record_changes(SyncChange.KIND_WORKOUT, [instance.workout_session_id])
+
+
+@receiver(post_save, sender=WorkoutTemplateExerciseItem)
+@receiver(post_delete, sender=WorkoutTemplateExerciseItem)
+def record_template_exercise_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        record_changes(SyncChange.KIND_TEMPLATE, [instance.workout_template_id])
+
+
+@receiver(m2m_changed, sender=WorkoutPlan.workouts.through)
+def record_routine_workouts_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action.startswith('pre_'):
+        return
+    if not reverse:
+        record_changes(SyncChange.KIND_ROUTINE, [instance.pk])
+    elif pk_set:
+        record_changes(SyncChange.KIND_ROUTINE, pk_set)
+
+
+# the routines list shows which routine is active
+@receiver(post_save, sender=ActiveRoutine)
+@receiver(post_delete, sender=ActiveRoutine)
+def record_active_routine_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        record_changes(SyncChange.KIND_ROUTINE, [instance.workout_plan_id])
+
+
+# The trees embed their exercises with the muscle groups, so a change of an exercise syncs
+# (and rebuilds the snapshots of) the workouts and templates using it.
+def record_exercises_change(exercise_ids):
+    record_exercise_sessions_changes(ExerciseSession.objects.filter(exercise_id__in=exercise_ids).values_list(
+        'pk', flat=True
+    ))
+
+
+@receiver(post_save, sender=Exercise)
+@receiver(pre_delete, sender=Exercise)
+def record_exercise_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        record_exercises_change([instance.pk])
+
+
+@receiver(post_save, sender=MuscleGroup)
+@receiver(pre_delete, sender=MuscleGroup)
+def record_muscle_group_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        record_exercises_change(Exercise.targeted_muscle_groups.through.objects.filter(
+            musclegroup_id=instance.pk
+        ).values_list('exercise_id', flat=True))
+
+
+@receiver(m2m_changed, sender=Exercise.targeted_muscle_groups.through)
+def record_exercise_muscle_groups_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == 'pre_clear':
+        # the exercises of the muscle group are gone after the clear
+        record_exercises_change(sender.objects.filter(musclegroup_id=instance.pk).values_list(
+            'exercise_id', flat=True
+        ))
+    if action.startswith('pre_'):
+        return
+    if not reverse:
+        record_exercises_change([instance.pk])
+    elif pk_set:
+        record_exercises_change(pk_set)
@@ -0,0 +1,178 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from server.profiles.models import Profile
+from server.sync.models import SyncChange, SyncSequence
+from server.workouts.models import Exercise, Set, WorkoutSession
+
+UserModel = get_user_model()
+
+
+class SyncChangesTests(APITestCase):
+    def setUp(self):
+        self.user = UserModel.objects.create_user(email='test@example.com', username='test_user',
+                                                  password='test_password')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.profile = Profile.objects.create_profile(user=self.user)
+        self.client.force_authenticate(user=self.user)
+        self.exercise = Exercise.objects.create(name='Bench press')
+
+    def create_workout(self, name='Push day'):
+        payload = {'name': name, 'exercises': [{
+            'session_type': 'exercise',
+            'order': 0,
+            'exercise': {'id': self.exercise.id, 'name': self.exercise.name},
+            'session_data': [{'type': 'set', 'data': {
+                'weight': 60, 'reps': 10, 'min_reps': 8, 'max_reps': 12, 'to_failure': False, 'bodyweight': False,
+            }}],
+        }]}
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/fitness/workout/create/', payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        return WorkoutSession.objects.get(pk=response.data['id'])
+
+    def sync(self, cursor=None, **params):
+        if cursor is not None:
+            params['cursor'] = cursor
+        response = self.client.get('/sync/changes/', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        return response.data
+
+    def test_first_sync_sends_everything_and_the_next_one_nothing(self):
+        workout = self.create_workout()
+
+        first_sync = self.sync()
+        self.assertEqual([item['id'] for item in first_sync['changes']['workout']], [workout.pk])
+        self.assertEqual(first_sync['changes']['workout'][0]['name'], 'Push day')
+        self.assertEqual(len(first_sync['changes']['measures']), 1)
+        self.assertFalse(first_sync['has_more'])
+
+        next_sync = self.sync(first_sync['cursor'])
+        self.assertEqual(next_sync, {'cursor': first_sync['cursor'], 'has_more': False, 'changes': {}, 'deleted': {}})
+
+    def test_set_edit_syncs_its_workout_only(self):
+        workout = self.create_workout()
+        self.create_workout('Pull day')
+        cursor = self.sync()['cursor']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            set_instance = Set.objects.order_by('pk').first()
+            set_instance.weight = 80
+            set_instance.save()
+
+        changes = self.sync(cursor)['changes']
+        self.assertEqual([item['id'] for item in changes['workout']], [workout.pk])
+        self.assertEqual(list(changes), ['workout'])
+
+    def test_deleted_objects_are_sent_as_tombstones(self):
+        workout = self.create_workout()
+        workout_id = workout.pk
+        cursor = self.sync()['cursor']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            workout.delete()
+
+        data = self.sync(cursor)
+        self.assertEqual(data['deleted'], {'workout': [workout_id]})
+        self.assertEqual(data['changes'], {})
+
+    def test_changes_are_paged_by_the_cursor(self):
+        for index in range(3):
+            self.create_workout(f'Workout {index}')
+
+        first_page = self.sync(page_size=2)
+        second_page = self.sync(first_page['cursor'], page_size=2)
+
+        self.assertTrue(first_page['has_more'])
+        self.assertFalse(second_page['has_more'])
+        # 3 workouts and the measures
+        self.assertEqual(sum(len(items) for page in (first_page, second_page) for items in page['changes'].values()), 4)
+
+    def test_an_object_keeps_a_single_log_row(self):
+        workout = self.create_workout()
+        for name in ('Legs', 'Legs 2'):
+            with self.captureOnCommitCallbacks(execute=True):
+                workout.name = name
+                workout.save()
+
+        self.assertEqual(SyncChange.objects.filter(kind=SyncChange.KIND_WORKOUT, object_id=workout.pk).count(), 1)
+
+    def test_changes_get_the_next_sequence_of_their_profile(self):
+        workout = self.create_workout()
+        first_sequence = SyncChange.objects.get(kind=SyncChange.KIND_WORKOUT, object_id=workout.pk).sequence
+        with self.captureOnCommitCallbacks(execute=True):
+            workout.name = 'Legs'
+            workout.save()
+
+        change = SyncChange.objects.get(kind=SyncChange.KIND_WORKOUT, object_id=workout.pk)
+        self.assertGreater(change.sequence, first_sequence)
+        self.assertEqual(SyncSequence.objects.get(profile=self.profile).last_sequence, change.sequence)
+        self.assertEqual(self.sync()['cursor'], str(change.sequence))
+
+    def test_rolled_back_changes_are_not_logged(self):
+        workout = self.create_workout()
+        cursor = self.sync()['cursor']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    workout.delete()
+                    raise ValueError
+            except ValueError:
+                pass
+
+        self.assertEqual(self.sync(cursor)['deleted'], {})
+        self.assertFalse(SyncChange.objects.filter(kind=SyncChange.KIND_WORKOUT, is_deleted=True).exists())
+
+    def test_changes_outside_the_rolled_back_savepoint_are_logged(self):
+        workout = self.create_workout()
+        other_workout = self.create_workout('Pull day')
+        cursor = self.sync()['cursor']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            workout.name = 'Legs'
+            workout.save()
+            try:
+                with transaction.atomic():
+                    other_workout.delete()
+                    raise ValueError
+            except ValueError:
+                pass
+
+        data = self.sync(cursor)
+        self.assertEqual([item['id'] for item in data['changes']['workout']], [workout.pk])
+        self.assertEqual(data['deleted'], {})
+
+    def test_changes_after_a_rolled_back_savepoint_are_logged(self):
+        workout = self.create_workout()
+        other_workout = self.create_workout('Pull day')
+        cursor = self.sync()['cursor']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            transaction.on_commit(lambda: None)
+            try:
+                with transaction.atomic():
+                    other_workout.delete()
+                    raise ValueError
+            except ValueError:
+                pass
+            workout.name = 'Legs'
+            workout.save()
+
+        data = self.sync(cursor)
+        self.assertEqual([item['id'] for item in data['changes']['workout']], [workout.pk])
+        self.assertEqual(data['deleted'], {})
+
+    def test_failed_flush_does_not_fail_the_request(self):
+        with mock.patch('server.sync.changes.flush_changes', side_effect=RuntimeError), \
+                self.assertLogs('django', level='ERROR'):
+            self.create_workout()
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get('/sync/changes/', {'cursor': 'abc'})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
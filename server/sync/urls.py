@@ -0,0 +1,7 @@
+from django.urls import path
+
+from server.sync.views import SyncView
+
+urlpatterns = [
+    path('changes/', SyncView.as_view(), name='sync changes'),
+]
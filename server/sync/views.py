@@ -0,0 +1,62 @@
+from rest_framework import status, views
+from rest_framework.response import Response
+
+from server.health.serializers import BaseMeasuresSerializer
+from server.sync.changes import SYNC_PAGE_SIZE, MAX_SYNC_PAGE_SIZE, get_changes, get_sync_models
+from server.sync.models import SyncChange
+from server.workouts.exercise_serializers import CustomExerciseSerializer
+from server.workouts.prefetch import prefetch_workout_plans
+from server.workouts.serializers import WorkoutListSerializer, WorkoutTemplateListSerializer, RoutinesListSerializer
+from server.workouts.snapshots import prefetch_workout_snapshots
+
+# the objects are sent the way the list endpoints show them
+SYNC_SERIALIZERS = {
+    SyncChange.KIND_WORKOUT: (WorkoutListSerializer, prefetch_workout_snapshots),
+    SyncChange.KIND_TEMPLATE: (WorkoutTemplateListSerializer, prefetch_workout_snapshots),
+    SyncChange.KIND_ROUTINE: (RoutinesListSerializer, prefetch_workout_plans),
+    SyncChange.KIND_CUSTOM_EXERCISE: (
+        CustomExerciseSerializer, lambda exercises: exercises.prefetch_related('targeted_muscle_groups')
+    ),
+    SyncChange.KIND_MEASURES: (BaseMeasuresSerializer, list),
+}
+
+
+class SyncView(views.APIView):
+    """
+    Returns what changed since the `cursor` the client got from its last sync:
+    the changed workouts, templates, routines, custom exercises and measures, and the ids of the deleted ones.
+    Without a cursor everything is sent, page by page while `has_more` is true.
+    """
+
+    def get(self, request, *args, **kwargs):
+        try:
+            cursor = int(request.query_params.get('cursor') or 0)
+            page_size = min(int(request.query_params.get('page_size', SYNC_PAGE_SIZE)), MAX_SYNC_PAGE_SIZE)
+        except ValueError:
+            return Response("The cursor and the page size must be numbers", status=status.HTTP_400_BAD_REQUEST)
+        if cursor < 0 or page_size < 1:
+            return Response("The cursor and the page size must be positive", status=status.HTTP_400_BAD_REQUEST)
+
+        sync_changes, has_more = get_changes(request.user.profile, cursor, page_size)
+        changed_ids = {}
+        deleted_ids = {}
+        for sync_change in sync_changes:
+            (deleted_ids if sync_change.is_deleted else changed_ids).setdefault(sync_change.kind, []).append(
+                sync_change.object_id
+            )
+
+        sync_models = get_sync_models()
+        changes = {}
+        for kind, object_ids in changed_ids.items():
+            model, owner_field = sync_models[kind]
+            serializer_class, prefetch = SYNC_SERIALIZERS[kind]
+            # an object deleted after its change was read is left to the next sync
+            instances = prefetch(model.objects.filter(pk__in=object_ids, **{owner_field: request.user.profile.pk}))
+            changes[kind] = serializer_class(instances, many=True, context={'request': request}).data
+
+        return Response({
+            'cursor': str(sync_changes[-1].sequence if sync_changes else cursor),
+            'has_more': has_more,
+            'changes': changes,
+            'deleted': deleted_ids,
+        }, status=status.HTTP_200_OK)
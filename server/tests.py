@@ -1 +1,107 @@
-import server.authentication.tests
\ No newline at end of file
+import server.authentication.tests
+
+import json
+import math
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO
+from unittest import mock
+from uuid import UUID
+
+from django.db import connection
+from django.test import SimpleTestCase
+from django.utils import timezone
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from server.renderers import FastJSONRenderer, FastJSONParser
+from server.utils import transform_timestamp, transform_timestamp_without_hour, get_upsert_options
+
+
+class FastJSONRendererTests(SimpleTestCase):
+    def test_output_is_byte_identical_to_the_drf_renderer(self):
+        created_at = datetime(2024, 1, 31, 18, 5, 7, 123456, tzinfo=dt_timezone.utc)
+        data = {
+            'created_at': created_at,
+            'local_created_at': timezone.localtime(created_at),
+            'naive': datetime(2024, 2, 1, 7, 30),
+            'date': date(2024, 2, 29),
+            'time': time(0, 1, 30),
+            'duration': timedelta(minutes=90),
+            'timestamp': transform_timestamp(str(created_at)),
+            'day': transform_timestamp_without_hour(str(created_at)),
+            'weight': Decimal('82.5'),
+            'volume': 1234.5,
+            'id': UUID('12345678-1234-5678-1234-567812345678'),
+            'name': 'Жим лежа   "quoted" \\ \x1f',
+            'sets': [{'reps': 10, 'to_failure': False, 'min_reps': None}],
+            1: 'numeric key',
+        }
+
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_exponent_floats_parse_to_the_drf_values(self):
+        data = {'large': 1e16, 'small': 0.00001}
+
+        self.assertEqual(FastJSONRenderer().render(data), b'{"large":1e16,"small":0.00001}')
+        self.assertEqual(JSONRenderer().render(data), b'{"large":1e+16,"small":1e-05}')
+        self.assertEqual(json.loads(FastJSONRenderer().render(data)), json.loads(JSONRenderer().render(data)))
+
+    def test_integers_over_64_bits_fall_back_to_drf(self):
+        data = {'id': 2 ** 70, 'nested': [{'id': -2 ** 64}]}
+
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_non_finite_floats_are_rejected_like_drf_does(self):
+        for value in (math.nan, math.inf, -math.inf):
+            with self.subTest(value=value), self.assertRaises(ValueError):
+                FastJSONRenderer().render({'sets': [{'weight': value, 'notes': None}]})
+
+    def test_unknown_types_fall_back_to_drf(self):
+        with self.assertRaises(TypeError):
+            FastJSONRenderer().render({'value': object()})
+
+    def test_pretty_printed_output_falls_back_to_drf(self):
+        data = {'name': 'Push day', 'exercises': [1, 2]}
+
+        self.assertEqual(FastJSONRenderer().render(data, 'application/json; indent=2'),
+                         JSONRenderer().render(data, 'application/json; indent=2'))
+
+
+class FastJSONParserTests(SimpleTestCase):
+    def test_parses_like_the_drf_parser(self):
+        body = '{"name": "Жим", "exercises": [{"order": 0, "weight": 82.5, "notes": null}]}'.encode()
+
+        self.assertEqual(FastJSONParser().parse(BytesIO(body)), JSONParser().parse(BytesIO(body)))
+
+    def test_integers_over_64_bits_are_parsed_like_the_drf_parser(self):
+        body = b'{"id": 18446744073709551616, "min": -9223372036854775809, "max": 18446744073709551615}'
+
+        data = FastJSONParser().parse(BytesIO(body))
+
+        self.assertEqual(data, JSONParser().parse(BytesIO(body)))
+        self.assertEqual(data['id'], 2 ** 64)
+
+    def test_lone_surrogates_are_parsed_like_the_drf_parser(self):
+        body = b'{"name": "\\ud800 bench"}'
+
+        self.assertEqual(FastJSONParser().parse(BytesIO(body)), JSONParser().parse(BytesIO(body)))
+
+    def test_invalid_body_is_a_parse_error(self):
+        with self.assertRaises(ParseError):
+            FastJSONParser().parse(BytesIO(b'{"name": '))
+
+
+class UpsertOptionsTests(SimpleTestCase):
+    def test_conflict_target_is_left_out_where_it_is_not_supported(self):
+        with mock.patch.object(connection.features, 'supports_update_conflicts_with_target', False):
+            options = get_upsert_options(['profile', 'day'], ('total',))
+
+        self.assertEqual(options, {'update_conflicts': True, 'update_fields': ['total']})
+
+    def test_conflict_target_is_passed_where_it_is_supported(self):
+        with mock.patch.object(connection.features, 'supports_update_conflicts_with_target', True):
+            options = get_upsert_options(['profile', 'day'], ('total',))
+
+        self.assertEqual(options['unique_fields'], ['profile', 'day'])
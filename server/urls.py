@@ -7,5 +7,6 @@ urlpatterns = [
     path('authentication/', include('server.authentication.urls')),
     path('profile/', include('server.profiles.urls')),
     path('fitness/', include('server.workouts.urls')),
-    path('health/', include('server.health.urls'))
+    path('health/', include('server.health.urls')),
+    path('sync/', include('server.sync.urls')),
 ]
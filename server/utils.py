@@ -1,5 +1,6 @@
 from datetime import datetime
 from distutils.util import strtobool
+from itertools import islice
 
 
 def transform_timestamp(input_timestamp):
@@ -22,4 +23,32 @@ def string_to_bool(value):
     """
     Convert a string representation of boolean ('true' or 'false') to a boolean value.
     """
-    return bool(strtobool(str(value)))
\ No newline at end of file
+    return bool(strtobool(str(value)))
+
+
+def iterate_in_chunks(iterable, chunk_size):
+    """Lists of up to chunk_size items of the iterable, read one chunk at a time."""
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, chunk_size)):
+        yield chunk
+
+
+def has_shared_cache():
+    """Whether the processes share the default cache (Redis), rather than each keeping its own locmem cache."""
+    from django.core.cache import caches
+    from django.core.cache.backends.locmem import LocMemCache
+
+    return not isinstance(caches['default'], LocMemCache)
+
+
+def get_upsert_options(unique_fields, update_fields):
+    """
+    The bulk_create options of an insert updating the rows that conflict on `unique_fields`.
+    MySQL upserts on any unique key (ON DUPLICATE KEY UPDATE) and rejects an explicit conflict target.
+    """
+    from django.db import connection
+
+    options = {'update_conflicts': True, 'update_fields': list(update_fields)}
+    if connection.features.supports_update_conflicts_with_target:
+        options['unique_fields'] = list(unique_fields)
+    return options
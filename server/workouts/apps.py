@@ -7,4 +7,4 @@ class WorkoutsConfig(AppConfig):
 
 
     def ready(self):
-        from . import signals
\ No newline at end of file
+        from . import checks, signals
\ No newline at end of file
@@ -0,0 +1,174 @@
+from datetime import time
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ValidationError, PermissionDenied
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from simple_history.utils import bulk_update_with_history
+
+from server.utils import string_to_bool
+from server.workouts.bulk import EMPTY_VALUES, parse_optional_number
+from server.workouts.utils import convert_str_time_to_interval_time
+
+MAX_PATCHES = 500
+
+
+def parse_time(value):
+    transformed_time = convert_str_time_to_interval_time(str(value))
+    return time(transformed_time['hours'], transformed_time['minutes'], transformed_time['seconds'])
+
+
+def parse_number(value, cast):
+    if value in EMPTY_VALUES:
+        raise ValueError(value)
+    return cast(value)
+
+
+# the editable fields of every item type and how their values are read
+ITEM_FIELD_PARSERS = {
+    'set': {
+        'weight': lambda value: parse_optional_number(value, float),
+        'reps': lambda value: parse_optional_number(value, int),
+        'min_reps': lambda value: parse_optional_number(value, int),
+        'max_reps': lambda value: parse_optional_number(value, int),
+        'to_failure': string_to_bool,
+        'bodyweight': string_to_bool,
+    },
+    'rest': {
+        'minutes': lambda value: parse_number(value, int),
+        'seconds': lambda value: parse_number(value, int),
+    },
+    'interval': {
+        'time': parse_time,
+        'distance': lambda value: parse_number(value, int),
+        'level': lambda value: parse_number(value, int),
+        'pace': lambda value: parse_number(value, int),
+    },
+}
+
+
+def get_item_models():
+    from server.workouts.models import Set, Rest, Interval
+
+    return {'set': Set, 'rest': Rest, 'interval': Interval}
+
+
+def parse_patches(patches):
+    """Validates the [{'type', 'id', 'data'}] patches, returns {type: {id: data}}."""
+    if not isinstance(patches, list) or not patches:
+        raise ValidationError("Provide the items to edit")
+    if len(patches) > MAX_PATCHES:
+        raise ValidationError(f"At most {MAX_PATCHES} items can be edited at once")
+
+    parsed_patches = {}
+    for patch in patches:
+        item_type = patch.get('type') if isinstance(patch, dict) else None
+        if item_type not in ITEM_FIELD_PARSERS:
+            raise ValidationError(f"Unknown item type - {item_type}")
+        data = patch.get('data')
+        if not isinstance(data, dict) or not data:
+            raise ValidationError("Can't edit an item without data!")
+        try:
+            item_id = int(patch.get('id'))
+            values = {
+                field: ITEM_FIELD_PARSERS[item_type][field](value)
+                for field, value in data.items() if field in ITEM_FIELD_PARSERS[item_type]
+            }
+        except (TypeError, ValueError):
+            raise ValidationError(f"The values of the {item_type} {patch.get('id')} are not valid")
+        parsed_patches.setdefault(item_type, {}).setdefault(item_id, {}).update(values)
+    return parsed_patches
+
+
+def get_scope_filter(exercise_session_id=None, workout_id=None):
+    """Matches the session items of the exercise session or of all the sessions of the workout."""
+    from server.workouts.models import ExerciseSession, SupersetSession, WorkoutExerciseSession
+
+    if exercise_session_id is not None:
+        return Q(exercise_session_id=exercise_session_id)
+    workout_items = WorkoutExerciseSession.objects.filter(workout_session_id=workout_id)
+    return Q(exercise_session_id__in=workout_items.filter(
+        content_type=ContentType.objects.get_for_model(ExerciseSession)
+    ).values('object_id')) | Q(exercise_session_id__in=SupersetSession.exercises.through.objects.filter(
+        supersetsession_id__in=workout_items.filter(
+            content_type=ContentType.objects.get_for_model(SupersetSession)
+        ).values('object_id')
+    ).values('exercisesession_id'))
+
+
+def edit_session_items(profile, patches, exercise_session_id=None, workout_id=None, user=None):
+    """
+    Applies a batch of set, rest and interval patches of an exercise session or a whole workout
+    in one transaction: a query per item type loads the targets, one more checks they belong to the
+    session/workout, and the changed rows are written with a bulk update per model.
+    Returns the number of changed items.
+    """
+    from server.workouts.models import ExerciseSessionItem, WorkoutSession, Set
+    from server.workouts.progress import schedule_progress_update
+    from server.workouts.totals import get_workout_ids_for_sessions, recompute_workout_totals
+    from server.sync.changes import record_exercise_sessions_changes
+
+    parsed_patches = parse_patches(patches)
+    item_models = get_item_models()
+
+    with transaction.atomic():
+        targets = {}
+        for item_type, item_patches in parsed_patches.items():
+            instances = item_models[item_type].objects.select_for_update().in_bulk(list(item_patches))
+            if len(instances) != len(item_patches):
+                raise ValidationError(f"Some of the {item_type}s do not exist")
+            if any(instance.created_by_id != profile.pk for instance in instances.values()):
+                raise PermissionDenied("You can only edit your own sets")
+            targets[item_type] = instances
+
+        items_filter = Q()
+        for item_type, instances in targets.items():
+            items_filter |= Q(content_type=ContentType.objects.get_for_model(item_models[item_type]),
+                              object_id__in=list(instances))
+        session_items = set(ExerciseSessionItem.objects.filter(items_filter).filter(
+            get_scope_filter(exercise_session_id, workout_id)
+        ).values_list('content_type_id', 'object_id', 'exercise_session_id'))
+        if len({(content_type_id, object_id) for content_type_id, object_id, _ in session_items}) != \
+                sum(len(instances) for instances in targets.values()):
+            raise ValidationError("The items must belong to the edited session")
+        exercise_session_ids = {exercise_session_id for _, _, exercise_session_id in session_items}
+
+        now = timezone.now()
+        changed_items = 0
+        volume_changed = False
+        for item_type, instances in targets.items():
+            changed_instances = []
+            changed_fields = set()
+            for item_id, values in parsed_patches[item_type].items():
+                instance = instances[item_id]
+                fields = {field for field, value in values.items() if getattr(instance, field) != value}
+                if not fields:
+                    continue
+                volume_changed = volume_changed or item_type == 'set' and bool(fields & {'weight', 'reps'})
+                for field in fields:
+                    setattr(instance, field, values[field])
+                instance.updated_at = now
+                changed_instances.append(instance)
+                changed_fields.update(fields)
+            if not changed_instances:
+                continue
+            changed_fields = sorted(changed_fields) + ['updated_at']
+            model = item_models[item_type]
+            if model is Set:
+                bulk_update_with_history(changed_instances, Set, changed_fields, default_user=user,
+                                         default_date=now)
+            else:
+                model.objects.bulk_update(changed_instances, changed_fields)
+            changed_items += len(changed_instances)
+
+        if not changed_items:
+            return 0
+        # bulk updates skip the signals keeping the totals, the progress rollups and the sync log up to date
+        if volume_changed:
+            recompute_workout_totals(WorkoutSession.objects.filter(
+                pk__in=get_workout_ids_for_sessions(exercise_session_ids)
+            ).only('pk', 'total_sets', 'total_weight_volume'))
+            schedule_progress_update(exercise_session_ids=exercise_session_ids)
+        record_exercise_sessions_changes(exercise_session_ids)
+    return changed_items
@@ -0,0 +1,385 @@
+from datetime import time
+
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.utils import timezone
+from simple_history.utils import bulk_create_with_history
+
+from server.utils import string_to_bool
+from server.workouts.ordering import ORDER_GAP, allocate_item_orders, get_item_order
+from server.workouts.progress import schedule_progress_update
+from server.workouts.totals import get_set_volume, suspend_totals_tracking
+from server.workouts.utils import convert_str_time_to_interval_time, get_value_or_default
+
+EMPTY_VALUES = (None, '', 'null')
+
+
+def parse_optional_number(value, cast):
+    return cast(value) if value not in EMPTY_VALUES else None
+
+
+def copy_instance(instance, **fields):
+    """An unsaved copy of the model instance with some of its fields (by attname) replaced."""
+    values = {
+        field.attname: getattr(instance, field.attname)
+        for field in instance._meta.concrete_fields if not field.primary_key
+    }
+    values.update(fields)
+    return type(instance)(**values)
+
+
+def allocate_primary_keys(model, instances):
+    """
+    Sets the ids of the instances after the highest existing one. The last row is locked until the end
+    of the transaction, so the concurrent inserts wait instead of taking the same ids.
+    """
+    last_pk = model.objects.select_for_update().order_by('-pk').values_list('pk', flat=True).first() or 0
+    for instance in instances:
+        if instance.pk is None:
+            last_pk += 1
+            instance.pk = last_pk
+
+
+def bulk_create_instances(model, instances, with_history=False, user=None):
+    """
+    Inserts the instances with a single statement per batch. The generic relations need the
+    new ids, so on backends that cannot return them from a bulk insert (MySQL) they are allocated first.
+    """
+    if not instances:
+        return instances
+    if not connection.features.can_return_rows_from_bulk_insert:
+        with transaction.atomic():
+            allocate_primary_keys(model, instances)
+            if with_history:
+                return bulk_create_with_history(instances, model, default_user=user)
+            return model.objects.bulk_create(instances)
+    if with_history:
+        return bulk_create_with_history(instances, model, default_user=user)
+    return model.objects.bulk_create(instances)
+
+
+def bulk_delete_with_history(queryset, user=None):
+    """
+    Deletes the rows of a model with simple_history with a single statement, their '-' history rows
+    are inserted in bulk too. The delete signals and cascades are skipped, the related rows must be gone.
+    """
+    model = queryset.model
+    instances = list(queryset)
+    if not instances:
+        return 0
+    history_model = model.history.model
+    history_date = timezone.now()
+    history_model.objects.bulk_create([
+        history_model(history_date=history_date, history_type='-', history_user=user, **{
+            field.attname: getattr(instance, field.attname) for field in history_model.tracked_fields
+        })
+        for instance in instances
+    ])
+    return model.objects.filter(pk__in=[instance.pk for instance in instances])._raw_delete(queryset.db)
+
+
+class ExerciseTreeBuilder:
+    """
+    Creates the exercise sessions, supersets, sets, rests and intervals of one or more
+    workout sessions/templates with one bulk insert per model.
+
+    The whole payload is parsed and validated by `add()` and `validate()` before anything
+    is written, so the owners can be created with their final totals.
+    """
+
+    def __init__(self, profile, user=None):
+        self.profile = profile
+        self.user = user
+        self._owners = []
+        self._superset_members = []
+        self._appended_items = []
+        self._exercise_references = set()
+
+    def add(self, owner, exercise_sessions, created_at=None):
+        """
+        Registers the exercise sessions payload for a (possibly not yet saved) workout session or template.
+        `created_at` backdates the exercise sessions, e.g. for imported workouts.
+        Returns the (total_sets, total_weight_volume) the owner will have.
+        """
+        entries = []
+        for exercise_session in exercise_sessions:
+            session_type = exercise_session.get('session_type')
+            if session_type == 'superset':
+                sessions = [self._parse_exercise_session(session) for session in exercise_session['exercises']]
+            elif session_type == 'exercise':
+                sessions = [self._parse_exercise_session(exercise_session)]
+            else:
+                continue
+            for session in sessions:
+                session['created_at'] = created_at
+            entries.append({
+                'type': session_type,
+                'order': exercise_session.get('order') or 0,
+                'notes': exercise_session.get('notes'),
+                'sessions': sessions,
+            })
+        return self._add_owner(owner, entries)
+
+    def add_copy(self, owner, exercise_items):
+        """
+        Registers copies of the exercise sessions and supersets of another workout session or template,
+        from its WorkoutExerciseSession/WorkoutTemplateExerciseItem rows loaded with prefetch_exercise_items.
+        Nothing is parsed or validated, the copies are inserted with new ids by `save()`.
+        Returns the (total_sets, total_weight_volume) the owner will have.
+        """
+        from server.workouts.prefetch import get_content_type_model
+
+        entries = []
+        for exercise_item in exercise_items:
+            content_object = exercise_item.content_object
+            if content_object is None:
+                continue
+            if get_content_type_model(exercise_item) == 'supersetsession':
+                session_type = 'superset'
+                exercise_sessions = content_object.exercises.all()
+            else:
+                session_type = 'exercise'
+                exercise_sessions = [content_object]
+            entries.append({
+                'type': session_type,
+                'order': exercise_item.order,
+                'notes': content_object.notes,
+                'sessions': [self._copy_exercise_session(exercise_session) for exercise_session in exercise_sessions],
+            })
+        return self._add_owner(owner, entries)
+
+    def _add_owner(self, owner, entries):
+        total_sets = 0
+        total_volume = 0
+        for entry in entries:
+            for session in entry['sessions']:
+                total_sets += len(session['items'])
+                total_volume += sum(get_set_volume(item.weight, item.reps) for item in session['items']
+                                    if item._meta.model_name == 'set')
+        self._owners.append((owner, entries))
+        return total_sets, total_volume
+
+    def add_to_superset(self, superset_id, exercise_sessions):
+        """Registers new exercise sessions for an existing superset."""
+        sessions = [self._parse_exercise_session(session) for session in exercise_sessions]
+        if sessions:
+            self._superset_members.append((superset_id, sessions))
+
+    def add_items(self, exercise_session, session_data):
+        """Registers sets, rests and intervals appended to an existing exercise session."""
+        items = self._parse_items(session_data)
+        if items:
+            self._appended_items.append((exercise_session, items))
+
+    def validate(self):
+        """Checks that all the referenced exercises exist with a single query."""
+        from server.workouts.models import Exercise
+
+        exercise_names = dict(Exercise.objects.filter(
+            pk__in={exercise_id for exercise_id, _ in self._exercise_references}
+        ).values_list('pk', 'name'))
+        for exercise_id, exercise_name in self._exercise_references:
+            if exercise_names.get(exercise_id) != exercise_name:
+                raise ValidationError(f"There was a problem selecting the exercise - {exercise_name}")
+
+    def save(self):
+        """
+        Writes everything registered so far. The owners must already be saved.
+        Returns the created WorkoutExerciseSession/WorkoutTemplateExerciseItem rows of each owner,
+        in the order the owners were added.
+        """
+        from server.workouts.models import ExerciseSession, ExerciseSessionItem, SupersetSession, Set, Rest, \
+            Interval, WorkoutSession
+
+        entries = [entry for _, owner_entries in self._owners for entry in owner_entries]
+        member_sessions = [session for _, superset_sessions in self._superset_members for session in superset_sessions]
+        sessions = [session for entry in entries for session in entry['sessions']] + member_sessions
+
+        with transaction.atomic(), suspend_totals_tracking():
+            bulk_create_instances(ExerciseSession, [session['instance'] for session in sessions],
+                                  with_history=True, user=self.user)
+            # created_at is set on insert (auto_now_add), backdating needs an update
+            backdated_sessions = [session['instance'] for session in sessions if session['created_at']]
+            for session in sessions:
+                if session['created_at']:
+                    session['instance'].created_at = session['created_at']
+            ExerciseSession.objects.bulk_update(backdated_sessions, ['created_at'])
+
+            items = [item for session in sessions for item in session['items']]
+            items += [item for _, session_items in self._appended_items for item in session_items]
+            bulk_create_instances(Set, [item for item in items if isinstance(item, Set)],
+                                  with_history=True, user=self.user)
+            bulk_create_instances(Rest, [item for item in items if isinstance(item, Rest)])
+            bulk_create_instances(Interval, [item for item in items if isinstance(item, Interval)])
+            session_items = [
+                ExerciseSessionItem(exercise_session=session['instance'], item=item, order=get_item_order(index))
+                for session in sessions
+                for index, item in enumerate(session['items'])
+            ]
+            for exercise_session, appended_items in self._appended_items:
+                first_order = allocate_item_orders(exercise_session, len(appended_items))
+                session_items += [
+                    ExerciseSessionItem(exercise_session=exercise_session, item=item,
+                                        order=first_order + index * ORDER_GAP)
+                    for index, item in enumerate(appended_items)
+                ]
+            bulk_create_instances(ExerciseSessionItem, session_items)
+
+            superset_entries = [entry for entry in entries if entry['type'] == 'superset']
+            for entry in superset_entries:
+                entry['instance'] = SupersetSession(created_by=self.profile, notes=entry['notes'])
+            bulk_create_instances(SupersetSession, [entry['instance'] for entry in superset_entries])
+            SupersetSession.exercises.through.objects.bulk_create([
+                SupersetSession.exercises.through(supersetsession_id=entry['instance'].pk,
+                                                  exercisesession_id=session['instance'].pk)
+                for entry in superset_entries
+                for session in entry['sessions']
+            ] + [
+                SupersetSession.exercises.through(supersetsession_id=superset_id,
+                                                  exercisesession_id=session['instance'].pk)
+                for superset_id, superset_sessions in self._superset_members
+                for session in superset_sessions
+            ])
+            for entry in entries:
+                if entry['type'] == 'exercise':
+                    entry['instance'] = entry['sessions'][0]['instance']
+
+            # bulk inserts skip the signals, the logged sessions are handed to the progress rollups directly.
+            # The rollups skip the template sessions among the existing ones.
+            schedule_progress_update(exercise_session_ids=[
+                session['instance'].pk
+                for owner, owner_entries in self._owners if isinstance(owner, WorkoutSession)
+                for entry in owner_entries
+                for session in entry['sessions']
+            ] + [session['instance'].pk for session in member_sessions] + [
+                exercise_session.pk for exercise_session, _ in self._appended_items
+            ])
+            return self._save_owners_exercises()
+
+    def _save_owners_exercises(self):
+        """Links the exercises to their owners with one insert per table for all owners of a model."""
+        from server.workouts.models import WorkoutTemplate, WorkoutTemplateExerciseItem, WorkoutExerciseSession
+
+        owners_exercise_items = []
+        for owner, entries in self._owners:
+            if isinstance(owner, WorkoutTemplate):
+                owners_exercise_items.append([
+                    WorkoutTemplateExerciseItem(content_object=entry['instance'], workout_template=owner,
+                                                order=entry['order'])
+                    for entry in entries
+                ])
+            else:
+                owners_exercise_items.append([
+                    WorkoutExerciseSession(content_object=entry['instance'], workout_session=owner,
+                                           order=entry['order'])
+                    for entry in entries
+                ])
+
+        for owner_model in dict.fromkeys(type(owner) for owner, _ in self._owners):
+            owners = [
+                (owner, exercise_items)
+                for (owner, _), exercise_items in zip(self._owners, owners_exercise_items)
+                if type(owner) is owner_model
+            ]
+            exercise_items = [exercise_item for _, owner_items in owners for exercise_item in owner_items]
+            if not exercise_items:
+                continue
+            bulk_create_instances(type(exercise_items[0]), exercise_items)
+
+            exercises_field = owner_model.exercises.field
+            through = owner_model.exercises.through
+            through.objects.bulk_create([
+                through(**{
+                    f'{exercises_field.m2m_field_name()}_id': owner.pk,
+                    f'{exercises_field.m2m_reverse_field_name()}_id': exercise_item.pk,
+                })
+                for owner, owner_items in owners
+                for exercise_item in owner_items
+            ])
+        return owners_exercise_items
+
+    def _parse_exercise_session(self, data):
+        from server.workouts.models import ExerciseSession
+
+        exercise = data['exercise']
+        try:
+            exercise_id = int(exercise['id'])
+        except (TypeError, ValueError):
+            raise ValidationError(f"There was a problem selecting the exercise - {exercise.get('name')}")
+        self._exercise_references.add((exercise_id, exercise['name']))
+
+        session_data = data.get('session_data')
+        if not session_data or len(session_data) <= 0:  # if there is no data for the session
+            raise ValidationError("Cant create empty exercise session")
+
+        items = self._parse_items(session_data)
+        return {
+            'instance': ExerciseSession(profile=self.profile, exercise_id=exercise_id, notes=data.get('notes'),
+                                        next_item_order=get_item_order(len(items) - 1)),
+            'items': items,
+            'created_at': None,
+        }
+
+    def _parse_items(self, session_data):
+        items = []
+        for item in session_data:
+            if 'type' not in item or not item['type']:
+                raise ValidationError("Can't create set session without a type!")
+            if 'data' not in item or not item['data']:
+                raise ValidationError("Can't create set session without data!")
+            if item['type'] == 'set':
+                items.append(self._build_set(item['data']))
+            elif item['type'] == 'rest':
+                items.append(self._build_rest(item['data']))
+            elif item['type'] == 'interval':
+                items.append(self._build_interval(item['data']))
+        return items
+
+    def _copy_exercise_session(self, exercise_session):
+        items = [
+            copy_instance(session_item.item, created_by_id=self.profile.pk)
+            for session_item in exercise_session.exercisesessionitem_set.all() if session_item.item is not None
+        ]
+        return {
+            'instance': copy_instance(exercise_session, profile_id=self.profile.pk,
+                                      next_item_order=get_item_order(len(items) - 1)),
+            'items': items,
+            'created_at': None,
+        }
+
+    def _build_set(self, set_data):
+        from server.workouts.models import Set
+
+        try:
+            return Set(
+                weight=parse_optional_number(set_data.get('weight'), float),
+                reps=parse_optional_number(set_data.get('reps'), int),
+                min_reps=parse_optional_number(set_data.get('min_reps'), int),
+                max_reps=parse_optional_number(set_data.get('max_reps'), int),
+                to_failure=string_to_bool(set_data.get('to_failure', False)),
+                bodyweight=string_to_bool(set_data.get('bodyweight', False)),
+                created_by=self.profile,
+            )
+        except ValueError:
+            raise ValidationError("The set values must be numbers")
+
+    def _build_rest(self, rest_data):
+        from server.workouts.models import Rest
+
+        return Rest(
+            minutes=rest_data.get('minutes', 0),
+            seconds=rest_data.get('seconds', 0),
+            created_by=self.profile,
+        )
+
+    def _build_interval(self, interval_data):
+        from server.workouts.models import Interval
+
+        transformed_time = convert_str_time_to_interval_time(interval_data.get('time', '0:0:0'))
+        return Interval(
+            time=time(transformed_time['hours'], transformed_time['minutes'], transformed_time['seconds']),
+            distance=get_value_or_default(interval_data, 'distance'),
+            level=get_value_or_default(interval_data, 'level'),
+            pace=get_value_or_default(interval_data, 'pace'),
+            created_by=self.profile,
+        )
@@ -0,0 +1,81 @@
+import hashlib
+import json
+import time
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import prefetch_related_objects
+
+# The catalog version lives in the cache, so a bump reaches the other processes only through a shared
+# cache (CACHE_URL). With the per process locmem fallback the other workers keep serving their catalog
+# until it expires, see server.workouts.checks.
+CATALOG_VERSION_KEY = 'workouts:catalog:version'
+CATALOG_KEY = 'workouts:catalog:{version}'
+CATALOG_TIMEOUT = 60 * 60 * 24
+
+
+def get_catalog_version():
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        # a time based start keeps a lost version key from reusing the versions of stale catalogs
+        cache.add(CATALOG_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    try:
+        return cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        return get_catalog_version()
+
+
+def build_exercise_catalog():
+    """
+    Builds the exercises grouped by muscle group, plus the cardio exercises,
+    with three queries no matter how many groups and exercises there are.
+    """
+    from server.workouts.exercise_serializers import ExerciseDetailsSerializer
+    from server.workouts.models import Exercise, MuscleGroup
+
+    exercises = list(Exercise.objects.order_by('pk'))
+    prefetch_related_objects(exercises, 'targeted_muscle_groups')
+    serialized_exercises = dict(zip(
+        (exercise.pk for exercise in exercises),
+        ExerciseDetailsSerializer(exercises, many=True).data,
+    ))
+
+    exercises_by_muscle_group = {}
+    for exercise in exercises:
+        for muscle_group in exercise.targeted_muscle_groups.all():
+            exercises_by_muscle_group.setdefault(muscle_group.pk, []).append(serialized_exercises[exercise.pk])
+
+    catalog = [
+        {
+            "name": muscle_group.name,
+            "exercises": exercises_by_muscle_group.get(muscle_group.pk, []),
+        }
+        for muscle_group in MuscleGroup.objects.order_by('pk')
+    ]
+    catalog.append({
+        'name': "Cardio",
+        "exercises": [serialized_exercises[exercise.pk] for exercise in exercises if exercise.is_cardio],
+    })
+    return catalog
+
+
+def get_exercise_catalog():
+    """Returns {'version', 'etag', 'data'} from the cache, building the catalog once per version."""
+    version = get_catalog_version()
+    key = CATALOG_KEY.format(version=version)
+    catalog = cache.get(key)
+    if catalog is None:
+        data = build_exercise_catalog()
+        content = json.dumps(data, sort_keys=True, cls=DjangoJSONEncoder).encode('utf-8')
+        catalog = {
+            'version': version,
+            'etag': f'"{hashlib.sha1(content).hexdigest()}"',
+            'data': data,
+        }
+        cache.set(key, catalog, timeout=CATALOG_TIMEOUT)
+    return catalog
@@ -0,0 +1,16 @@
+from django.core.checks import Tags, Warning, register
+
+from server.utils import has_shared_cache
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """The cached versions (exercise catalog, tokens) are only invalidated everywhere through a shared cache."""
+    if has_shared_cache():
+        return []
+    return [Warning(
+        "The default cache is local to every process, the exercise catalog changes reach the other workers "
+        "only once their cached catalog expires.",
+        hint="Set CACHE_URL to a Redis server shared by the web and Celery processes.",
+        id='workouts.W001',
+    )]
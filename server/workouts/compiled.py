@@ -0,0 +1,161 @@
+from functools import lru_cache
+from operator import attrgetter
+
+from rest_framework import serializers
+from rest_framework.relations import PKOnlyObject
+
+# The workout trees are serialized with serializers compiled once from the DRF ones: the getter and
+# the converter of every field are resolved up front, so an object becomes a dict with a loop over
+# plain functions and no serializer is instantiated per session, set or rest. The output is the
+# same as the DRF serializers' for prefetched trees, see server.workouts.prefetch.
+
+# the DRF fields whose to_representation is a plain cast
+FIELD_CONVERTERS = {
+    serializers.IntegerField: int,
+    serializers.FloatField: float,
+    serializers.CharField: str,
+    serializers.BooleanField: bool,
+    serializers.ReadOnlyField: None,
+}
+
+
+def compile_field(field):
+    """Returns the (getter, converter) of a bound DRF field, the converter is None for the values used as is."""
+    if isinstance(field, serializers.ListSerializer) and not field.source_attrs[1:]:
+        child = CompiledSerializer(type(field.child))
+        return attrgetter(field.source), lambda related: [child(instance) for instance in related.all()]
+    if isinstance(field, serializers.BaseSerializer) and not field.source_attrs[1:] \
+            and type(field).to_representation is serializers.Serializer.to_representation:
+        return attrgetter(field.source), CompiledSerializer(type(field))
+    if isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None and field.source != '*':
+        return attrgetter(field.parent.Meta.model._meta.get_field(field.source).attname), None
+    if isinstance(field, serializers.ManyRelatedField) and field.source != '*' \
+            and isinstance(field.child_relation, serializers.PrimaryKeyRelatedField) \
+            and field.child_relation.pk_field is None:
+        return attrgetter(field.source), lambda related: [instance.pk for instance in related.all()]
+    if type(field) in FIELD_CONVERTERS and field.source != '*' and not field.source_attrs[1:]:
+        return attrgetter(field.source), FIELD_CONVERTERS[type(field)]
+
+    def get_attribute(instance):
+        attribute = field.get_attribute(instance)
+        if isinstance(attribute, PKOnlyObject) and attribute.pk is None:
+            return None
+        return attribute
+
+    return get_attribute, field.to_representation
+
+
+class CompiledSerializer:
+    """
+    A read-only serializer compiled from a DRF serializer class. `overrides` replaces fields with
+    functions of the instance, `extra` adds constant fields, like the ones of to_representation overrides.
+    """
+
+    def __init__(self, serializer_class, overrides=None, extra=None):
+        overrides = overrides or {}
+        self.fields = []
+        for name, field in serializer_class().fields.items():
+            if field.write_only:
+                continue
+            if name in overrides:
+                self.fields.append((name, overrides[name], None))
+            else:
+                self.fields.append((name, *compile_field(field)))
+        self.extra = extra or {}
+
+    def __call__(self, instance):
+        data = {}
+        for name, getter, converter in self.fields:
+            value = getter(instance)
+            data[name] = value if value is None or converter is None else converter(value)
+        data.update(self.extra)
+        return data
+
+
+@lru_cache(maxsize=None)
+def get_compiled_serializers():
+    """Compiles the serializers of the workout trees once per process."""
+    from server.workouts.exercise_serializers import ExerciseSessionDetailsSerializer, \
+        BaseSupersetSessionSerializer, ExerciseSessionSerializerNameOnly, SupersetSessionSerializerNameOnly
+    from server.workouts.set_serializers import SetDetailsSerializer, RestDetailsSerializer, \
+        IntervalDetailsSerializer
+
+    compiled = {
+        'set': CompiledSerializer(SetDetailsSerializer),
+        'rest': CompiledSerializer(RestDetailsSerializer),
+        'interval': CompiledSerializer(IntervalDetailsSerializer),
+    }
+    compiled['exercisesession'] = CompiledSerializer(
+        ExerciseSessionDetailsSerializer, overrides={'session_data': serialize_session_items},
+        extra={'session_type': 'exercise'},
+    )
+    compiled['supersetsession'] = CompiledSerializer(
+        BaseSupersetSessionSerializer,
+        overrides={'exercises': lambda superset: [
+            compiled['exercisesession'](exercise_session) for exercise_session in superset.exercises.all()
+        ]},
+        extra={'session_type': 'superset'},
+    )
+    compiled['exercisesession_summary'] = CompiledSerializer(
+        ExerciseSessionSerializerNameOnly, overrides={
+            'name': lambda exercise_session: exercise_session.exercise.name,
+            'sets_count': lambda exercise_session: len(exercise_session.exercisesessionitem_set.all()),
+        },
+        extra={'session_type': 'exercise'},
+    )
+    compiled['supersetsession_summary'] = CompiledSerializer(
+        SupersetSessionSerializerNameOnly,
+        overrides={'exercises': lambda superset: [
+            compiled['exercisesession_summary'](exercise_session) for exercise_session in superset.exercises.all()
+        ]},
+        extra={'session_type': 'superset'},
+    )
+    return compiled
+
+
+def serialize_session_items(exercise_session):
+    """The sets, rests and intervals of a prefetched exercise session, as ExerciseSessionDetailsSerializer does."""
+    from server.workouts.prefetch import get_content_type_model, get_last_set_history
+
+    compiled = get_compiled_serializers()
+    session_items = []
+    for session_item in exercise_session.exercisesessionitem_set.all():
+        item_type = get_content_type_model(session_item)
+        if item_type not in ('set', 'rest', 'interval'):
+            continue
+        last = None
+        if item_type == 'set':
+            last_history = get_last_set_history(session_item.item)
+            last = compiled['set'](last_history) if last_history else None
+        session_items.append({
+            'id': session_item.item.pk,
+            'item_id': session_item.pk,
+            'type': item_type,
+            'data': compiled[item_type](session_item.item),
+            'last': last,
+        })
+    return session_items
+
+
+def serialize_exercise_items(exercise_items, summary=False):
+    """
+    The exercises of a workout session or template, resolved in bulk. The details are what
+    serializer_exericses_for_session_or_template returns, the summaries what get_serialized_exercises does.
+    """
+    from server.workouts.prefetch import prefetch_exercise_items, get_content_type_model
+
+    compiled = get_compiled_serializers()
+    serialized_exercises = []
+    for exercise_item in prefetch_exercise_items(exercise_items, with_last_history=not summary):
+        exercise_type = get_content_type_model(exercise_item)
+        if exercise_type not in ('exercisesession', 'supersetsession') or exercise_item.content_object is None:
+            continue
+        if not summary:
+            serialized_exercises.append(compiled[exercise_type](exercise_item.content_object))
+            continue
+        serialized_exercises.append({
+            'id': exercise_item.id,
+            'type': 'superset' if exercise_type == 'supersetsession' else 'exercise',
+            'data': compiled[f'{exercise_type}_summary'](exercise_item.content_object),
+        })
+    return serialized_exercises
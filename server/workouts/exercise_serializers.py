@@ -1,17 +1,19 @@
 from rest_framework import serializers
 
+from server.workouts.fieldsets import FieldsetsSerializerMixin
 from server.workouts.models import CustomExercise
+from server.workouts.prefetch import prefetch_exercise_sessions, get_content_type_model, get_last_set_history
 from server.workouts.set_serializers import SetDetailsSerializer, RestDetailsSerializer, IntervalDetailsSerializer
 
 
-class CustomExerciseSerializer(serializers.ModelSerializer):
+class CustomExerciseSerializer(FieldsetsSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = CustomExercise
         # fields = '__all__'
         exclude = ['created_by', 'created_at']
 
 
-class BaseExerciseSerializer(serializers.ModelSerializer):
+class BaseExerciseSerializer(FieldsetsSerializerMixin, serializers.ModelSerializer):
     class Meta:
         from server.workouts.models import Exercise
         model = Exercise
@@ -24,6 +26,8 @@ class ExerciseDetailsSerializer(BaseExerciseSerializer):
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
+        if 'targeted_muscle_groups' not in representation:
+            return representation
         # Customize targeted_muscle_groups to include names instead of ids
         targeted_muscle_groups = instance.targeted_muscle_groups.all()
         representation['targeted_muscle_groups'] = [group.name for group in targeted_muscle_groups]
@@ -51,33 +55,35 @@ class ExerciseSessionDetailsSerializer(BaseExerciseSessionSerializer):
         fields = BaseExerciseSessionSerializer.Meta.fields
 
     def get_session_data(self, obj):
-        from server.workouts.models import Rest, Set, Interval
+        prefetch_exercise_sessions([obj])
         exercise_session_items = obj.exercisesessionitem_set.all()
         final_list = []
-        print(obj)
         for instance in exercise_session_items:
-            model_class = instance.content_type.model_class()
-            if model_class == Rest:
+            model_name = get_content_type_model(instance)
+            if model_name == 'rest':
                 final_list.append(
                     {
                         "id": instance.item.pk,
+                        "item_id": instance.pk,
                         "type": "rest",
                         "data": RestDetailsSerializer(instance.item).data,
                         "last": None}
                 )
-            elif model_class == Set:
+            elif model_name == 'set':
+                last_history = get_last_set_history(instance.item)
                 final_list.append(
                     {
                         "id": instance.item.pk,
+                        "item_id": instance.pk,
                         "type": "set",
                         "data": SetDetailsSerializer(instance.item).data,
-                        "last": SetDetailsSerializer(
-                            instance.item.history.last()).data if instance.item.history.last() else None
+                        "last": SetDetailsSerializer(last_history).data if last_history else None
                     })
-            elif model_class == Interval:
+            elif model_name == 'interval':
                 final_list.append(
                     {
                         "id": instance.item.pk,
+                        "item_id": instance.pk,
                         "type": "interval",
                         "data": IntervalDetailsSerializer(instance.item).data,
                         "last": None
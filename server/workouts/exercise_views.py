@@ -1,11 +1,17 @@
+from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ValidationError
+from django.utils.dateparse import parse_date
+from django.utils.http import parse_etags
 from rest_framework import generics as rest_generic_views, status, serializers, views
 from rest_framework.response import Response
 
-from server.utils import transform_timestamp
+from server.workouts.catalog import get_exercise_catalog
 from server.workouts.exercise_serializers import ExerciseDetailsSerializer, BaseExerciseSerializer, \
-    ExerciseSessionEditSerializer, CreateCustomExerciseSerializer
-from server.workouts.models import Exercise, ExerciseSession, Set, MuscleGroup, CustomExercise
+    ExerciseSessionEditSerializer, CreateCustomExerciseSerializer, CustomExerciseSerializer
+from server.workouts.fieldsets import get_fieldsets
+from server.workouts.models import Exercise, ExerciseSession, Set, CustomExercise, ExerciseSessionItem, SearchDocument
+from server.workouts.progress import PROGRESS_RESOLUTIONS, get_progress_series
+from server.workouts.search import search_documents, load_documents_objects, get_search_page
 
 
 # from .serializers import CustomExerciseSerializer
@@ -15,6 +21,9 @@ class ExerciseDetailsView(rest_generic_views.RetrieveAPIView):
     queryset = Exercise.objects.all()
     serializer_class = ExerciseDetailsSerializer
 
+    def get_serializer_context(self):
+        return {**super().get_serializer_context(), 'fieldsets': get_fieldsets(self.request)}
+
     def get(self, request, *args, **kwargs):
         return self.retrieve(request, *args, **kwargs)
 
@@ -22,21 +31,37 @@ class ExerciseDetailsView(rest_generic_views.RetrieveAPIView):
 class SearchExerciseView(rest_generic_views.ListAPIView):
     queryset = Exercise.objects.all()
     serializer_class = BaseExerciseSerializer
+    custom_exercise_serializer_class = CustomExerciseSerializer
 
     def get(self, request, *args, **kwargs):
         profile = request.user.profile
-        searched_name = request.query_params.get('name')
-        all_exercises_by_name = self.queryset.filter(name__icontains=searched_name).all()
-        exercises_created_by_user = all_exercises_by_name.filter(created_by=profile).all()
-        exercises = all_exercises_by_name.filter(is_published=True)
-
-        return Response({
-            'exercises_by_user': self.serializer_class(exercises_created_by_user, many=True).data,
-            'exercises': self.serializer_class(exercises, many=True).data
-        }, status=status.HTTP_200_OK)
-
-
-
+        searched_name = request.query_params.get('name', '')
+        page, page_size = get_search_page(request)
+        # the fields of both lists are selected with their names, e.g. ?fields=exercises.name
+        fieldsets = get_fieldsets(request)
+        fieldsets.validate(('exercises_by_user', 'exercises', 'next_page'), ('exercises_by_user', 'exercises'))
+        results = {}
+        has_next = has_next_custom = False
+
+        if fieldsets.includes('exercises_by_user'):
+            custom_documents, has_next_custom = search_documents(
+                searched_name, [SearchDocument.KIND_CUSTOM_EXERCISE], {'owner': profile}, page, page_size
+            )
+            results['exercises_by_user'] = self.custom_exercise_serializer_class(
+                load_documents_objects(custom_documents), many=True,
+                context={'request': request, 'fieldsets': fieldsets.child('exercises_by_user')}
+            ).data
+        if fieldsets.includes('exercises'):
+            documents, has_next = search_documents(
+                searched_name, [SearchDocument.KIND_EXERCISE], {'is_public': True}, page, page_size
+            )
+            results['exercises'] = self.serializer_class(
+                load_documents_objects(documents, self.get_queryset()), many=True,
+                context={'request': request, 'fieldsets': fieldsets.child('exercises')}
+            ).data
+
+        results['next_page'] = page + 1 if has_next or has_next_custom else None
+        return Response(results, status=status.HTTP_200_OK)
 
 
 class CreateCustomExerciseView(rest_generic_views.CreateAPIView):
@@ -66,28 +91,50 @@ class CreateCustomExerciseView(rest_generic_views.CreateAPIView):
 
 
 class GetExerciseProgress(views.APIView):
+    """The weight history of every set of an exercise session, oldest first, read with two queries."""
     authentication_classes = []
     permission_classes = []
 
     def get(self, request, *args, **kwargs):
         session_id = kwargs.get('session_id')
-        try:
-            exercise_session = ExerciseSession.objects.get(id=session_id)
-        except ExerciseSession.DoesNotExist:
+        if not ExerciseSession.objects.filter(id=session_id).exists():
             return Response("Exercise session does not exist!", status=status.HTTP_400_BAD_REQUEST)
-        sets = exercise_session.sets.all()
-        return_array = []
-        for set in sets:
-            if len(set.history.all()) > 0:
-                set_history_array = []
-                for set_history in set.history.all()[::-1]:
-                    set_history_array.append({
-                        'weight': set_history.weight,
-                        'updated_at': transform_timestamp(str(set_history.updated_at))
-                    })
-                return_array.append(set_history_array)
-            return_array.append([])
-        return Response(return_array, status=status.HTTP_200_OK)
+        set_ids = list(ExerciseSessionItem.objects.filter(
+            exercise_session_id=session_id, content_type=ContentType.objects.get_for_model(Set)
+        ).values_list('object_id', flat=True))
+        sets_history = {set_id: [] for set_id in set_ids}
+        for set_id, weight, updated_at in Set.history.filter(id__in=set_ids).order_by(
+                'history_date', 'history_id').values_list('id', 'weight', 'updated_at'):
+            sets_history[set_id].append({
+                'weight': weight,
+                'updated_at': updated_at.strftime("%d %b %Y %H:%M"),
+            })
+        return Response(list(sets_history.values()), status=status.HTTP_200_OK)
+
+
+class ExerciseProgressSeriesView(views.APIView):
+    """
+    The progress of the user on an exercise, a point per day, week or month (`resolution`),
+    optionally between the `start` and `end` dates.
+    """
+
+    def get(self, request, *args, **kwargs):
+        resolution = request.query_params.get('resolution', 'day')
+        if resolution not in PROGRESS_RESOLUTIONS:
+            return Response(f"The resolution must be one of: {', '.join(PROGRESS_RESOLUTIONS)}",
+                            status=status.HTTP_400_BAD_REQUEST)
+        dates = {}
+        for param in ('start', 'end'):
+            value = request.query_params.get(param)
+            try:
+                dates[param] = parse_date(value) if value else None
+            except ValueError:
+                dates[param] = None
+            if value and dates[param] is None:
+                return Response("The start and end must be YYYY-MM-DD dates", status=status.HTTP_400_BAD_REQUEST)
+        series = get_progress_series(request.user.profile, kwargs.get('exercise_id'), resolution,
+                                     dates['start'], dates['end'])
+        return Response(series, status=status.HTTP_200_OK)
 
 
 # TODO: Fix this view
@@ -142,36 +189,45 @@ class EditExerciseSessionNotesView(rest_generic_views.UpdateAPIView):
             return Response("Exercise session does not exist!", status=status.HTTP_400_BAD_REQUEST)
 
 
-class ExercisesByMuscleGroup(views.APIView):
-    serializer_class = ExerciseDetailsSerializer
+class MoveExerciseSessionItemView(views.APIView):
+    """Moves a set/rest/interval right after the `after` item of the same session, or to the top when it is null."""
+
+    def put(self, request, *args, **kwargs):
+        try:
+            session_item = ExerciseSessionItem.objects.select_related('exercise_session').get(id=kwargs.get('item_id'))
+        except ExerciseSessionItem.DoesNotExist:
+            return Response("Exercise session item does not exist!", status=status.HTTP_400_BAD_REQUEST)
+        if session_item.exercise_session.profile_id != request.user.profile.pk:
+            return Response(status=status.HTTP_403_FORBIDDEN)
 
-    # custom_exercise_serializer_class = CustomExerciseSerializer
+        after_item = None
+        after_item_id = request.data.get('after')
+        if after_item_id is not None:
+            try:
+                after_item = ExerciseSessionItem.objects.get(id=after_item_id,
+                                                             exercise_session_id=session_item.exercise_session_id)
+            except (ExerciseSessionItem.DoesNotExist, ValueError):
+                return Response("The item must be moved within its exercise session!",
+                                status=status.HTTP_400_BAD_REQUEST)
+
+        ExerciseSessionItem.move(session_item, after_item)
+        return Response({'id': session_item.id, 'order': session_item.order}, status=status.HTTP_200_OK)
+
+
+class ExercisesByMuscleGroup(views.APIView):
+    """
+    The exercise catalog is cached per version and served with an ETag,
+    so clients that already have the current catalog get an empty 304.
+    """
 
     def get(self, request):
-        muscle_groups = MuscleGroup.objects.all()
-        final_list = []
-        for muscle_group in muscle_groups:
-            muscle_group_obj = {
-                "name": muscle_group.name,
-                "exercises": self.serializer_class(muscle_group.exercise_set.all(), many=True).data,
-            }
-            final_list.append(muscle_group_obj)
-
-        # getting the cardio exercises
-        cardio_exercise_obj = {
-            'name': "Cardio",
-            "exercises": []
-        }
-        for exercise in Exercise.objects.filter(is_cardio=True).all():
-            cardio_exercise_obj['exercises'].append(self.serializer_class(exercise).data)
-        final_list.append(cardio_exercise_obj)
-
-        # getting the user exercises
-        # custom_exercises_obj = {
-        #     "name": "Custom",
-        #     "exercises": [self.custom_exercise_serializer_class(exercise).data for exercise in
-        #                   CustomExercise.objects.filter(created_by=request.user.profile).all()]
-        # }
-        # final_list.append(custom_exercises_obj)
-
-        return Response(final_list, status=status.HTTP_200_OK)
+        catalog = get_exercise_catalog()
+        etag = catalog['etag']
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match and (if_none_match.strip() == '*' or etag in parse_etags(if_none_match)):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(catalog['data'], status=status.HTTP_200_OK)
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
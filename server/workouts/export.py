@@ -0,0 +1,110 @@
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from server.utils import iterate_in_chunks
+from server.workouts.prefetch import prefetch_workout_exercises, get_content_type_model
+
+EXPORT_CHUNK_SIZE = 200
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+EXPORT_FIELDS = (
+    'workout_id', 'workout_name', 'workout_created_at',
+    'exercise_order', 'superset_id', 'exercise_session_id', 'exercise_id', 'exercise_name', 'notes',
+    'item_order', 'item_type',
+    'weight', 'reps', 'min_reps', 'max_reps', 'to_failure', 'bodyweight',
+    'minutes', 'seconds',
+    'time', 'distance', 'level', 'pace',
+)
+ITEM_FIELDS = {
+    'set': ('weight', 'reps', 'min_reps', 'max_reps', 'to_failure', 'bodyweight'),
+    'rest': ('minutes', 'seconds'),
+    'interval': ('time', 'distance', 'level', 'pace'),
+}
+
+
+def iterate_workouts(profile, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Walks the workouts of the profile with a server-side cursor and loads the exercise trees
+    one chunk at a time, so only a chunk of workouts is ever held in memory.
+    """
+    from server.workouts.models import WorkoutSession
+
+    workouts = WorkoutSession.objects.filter(created_by=profile).order_by('created_at', 'id')
+    for chunk in iterate_in_chunks(workouts.iterator(chunk_size=chunk_size), chunk_size):
+        yield from prefetch_workout_exercises(chunk, with_last_history=False)
+
+
+def get_exercise_session_rows(workout_row, exercise_session):
+    exercise_row = {
+        **workout_row,
+        'exercise_session_id': exercise_session.pk,
+        'exercise_id': exercise_session.exercise_id,
+        'exercise_name': exercise_session.exercise.name,
+        'notes': exercise_session.notes,
+    }
+    for session_item in exercise_session.exercisesessionitem_set.all():
+        item_type = get_content_type_model(session_item)
+        if session_item.item is None or item_type not in ITEM_FIELDS:
+            continue
+        row = {**exercise_row, 'item_order': session_item.order, 'item_type': item_type}
+        for field in ITEM_FIELDS[item_type]:
+            row[field] = getattr(session_item.item, field)
+        yield row
+
+
+def iterate_history_rows(profile, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yields one flat row per set, rest and interval of the profile's workouts, oldest first."""
+    for workout in iterate_workouts(profile, chunk_size):
+        workout_row = {
+            'workout_id': workout.pk,
+            'workout_name': workout.name,
+            'workout_created_at': workout.created_at,
+        }
+        for exercise_item in workout.exercises.all():
+            content_object = exercise_item.content_object
+            if content_object is None:
+                continue
+            item_row = {**workout_row, 'exercise_order': exercise_item.order, 'superset_id': None}
+            if get_content_type_model(exercise_item) == 'supersetsession':
+                item_row['superset_id'] = content_object.pk
+                for exercise_session in content_object.exercises.all():
+                    yield from get_exercise_session_rows(item_row, exercise_session)
+            else:
+                yield from get_exercise_session_rows(item_row, content_object)
+
+
+class EchoBuffer:
+    """File-like object handing back what is written, so csv.writer can feed a generator."""
+
+    def write(self, value):
+        return value
+
+
+def render_ndjson(rows):
+    for row in rows:
+        yield json.dumps({field: row.get(field) for field in EXPORT_FIELDS}, cls=DjangoJSONEncoder) + '\n'
+
+
+def render_csv(rows):
+    # dates and times are written the same way as in the ndjson export
+    encoder = DjangoJSONEncoder()
+    writer = csv.writer(EchoBuffer())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        yield writer.writerow([
+            encoder.default(value) if hasattr(value, 'isoformat') else value
+            for value in (row.get(field) for field in EXPORT_FIELDS)
+        ])
+
+
+def export_history(profile, export_format, chunk_size=EXPORT_CHUNK_SIZE):
+    """Lazily renders the training history of the profile as 'ndjson' or 'csv' lines."""
+    renderers = {
+        'ndjson': render_ndjson,
+        'csv': render_csv,
+    }
+    return renderers[export_format](iterate_history_rows(profile, chunk_size))
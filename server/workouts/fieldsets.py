@@ -0,0 +1,121 @@
+from functools import cached_property
+
+from rest_framework.exceptions import ValidationError
+
+# The workout, template, routine and exercise responses can be trimmed by the clients with two
+# query params of comma separated, dotted paths:
+# ?fields=name,id,workouts.name - only these fields, a nested level that names no fields keeps all of them
+# ?expand=workouts - only these nested branches (the serializers' Meta.expandable_fields) are rendered,
+# every branch is rendered when the param is missing, and a branch named in ?fields= is always expanded.
+# The views and serializers decide on the selection before anything is read, so a branch
+# that is left out is never prefetched nor serialized.
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+
+def parse_paths(value, param):
+    """Parses 'a,b.c,b.d' into {'a': {}, 'b': {'c': {}, 'd': {}}}."""
+    tree = {}
+    for path in value.split(','):
+        path = path.strip()
+        if not path:
+            continue
+        node = tree
+        for name in path.split('.'):
+            if not name:
+                raise ValidationError({param: f"Invalid path {path}"})
+            node = node.setdefault(name, {})
+    return tree
+
+
+class Fieldsets:
+    """The fields and the expanded branches asked for one level of a response."""
+
+    def __init__(self, fields=None, expand=None):
+        # None (or empty) fields are all the fields, None expand are the default branches
+        self.fields = fields or None
+        self.expand = expand
+
+    def includes(self, name):
+        return self.fields is None or name in self.fields
+
+    def expands(self, name):
+        """Whether an expandable branch is rendered."""
+        if not self.includes(name):
+            return False
+        return self.expand is None or name in self.expand or self.fields is not None
+
+    def child(self, name):
+        return Fieldsets(
+            self.fields.get(name) if self.fields is not None else None,
+            self.expand.get(name, {}) if self.expand is not None else None,
+        )
+
+    def validate(self, names, expandable=()):
+        unknown_fields = set(self.fields or ()) - set(names)
+        if unknown_fields:
+            raise ValidationError({FIELDS_PARAM: f"Unknown fields: {', '.join(sorted(unknown_fields))}"})
+        unknown_branches = set(self.expand or ()) - set(expandable)
+        if unknown_branches:
+            raise ValidationError({EXPAND_PARAM: f"Unknown branches: {', '.join(sorted(unknown_branches))}"})
+
+    def select(self, data):
+        """Trims plain data, like the exercise trees served from the snapshots."""
+        if isinstance(data, list):
+            return [self.select(item) for item in data]
+        if not isinstance(data, dict) or self.fields is None:
+            return data
+        return {name: self.child(name).select(value) for name, value in data.items() if name in self.fields}
+
+
+def get_fieldsets(request):
+    params = request.query_params
+    return Fieldsets(
+        parse_paths(params[FIELDS_PARAM], FIELDS_PARAM) if FIELDS_PARAM in params else None,
+        parse_paths(params[EXPAND_PARAM], EXPAND_PARAM) if EXPAND_PARAM in params else None,
+    )
+
+
+def select_document_fields(document, fieldsets, expandable=()):
+    """Trims a serialized document, e.g. a snapshot, rejecting the fields it does not have."""
+    fieldsets.validate(document.keys(), expandable)
+    return fieldsets.select(document)
+
+
+class FieldsetsSerializerMixin:
+    """
+    Renders only the fields of context['fieldsets'] for the serializer's place in the response.
+    The fields left out are dropped before serializing, so their method fields and nested
+    serializers run no queries.
+    """
+
+    @cached_property
+    def fieldsets(self):
+        fieldsets = self.context.get('fieldsets')
+        if fieldsets is None:
+            return None
+        path = []
+        serializer = self
+        while serializer.parent is not None:
+            # the child of a many=True serializer is bound with no name
+            if serializer.field_name:
+                path.append(serializer.field_name)
+            serializer = serializer.parent
+        for name in reversed(path):
+            fieldsets = fieldsets.child(name)
+        return fieldsets
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if self.fieldsets is None:
+            return fields
+        expandable = getattr(self.Meta, 'expandable_fields', ())
+        self.fieldsets.validate(fields, expandable)
+        return {
+            name: field for name, field in fields.items()
+            if (self.fieldsets.expands(name) if name in expandable else self.fieldsets.includes(name))
+        }
+
+    def select_fields(self, name, data):
+        """Trims the plain data a method field returns for a nested branch."""
+        return self.fieldsets.child(name).select(data) if self.fieldsets is not None else data
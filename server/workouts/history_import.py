@@ -0,0 +1,275 @@
+import csv
+import io
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models.functions import Lower
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from server.workouts.bulk import ExerciseTreeBuilder, bulk_create_instances
+from server.workouts.export import ITEM_FIELDS
+
+IMPORT_FORMATS = ('csv', 'ndjson', 'json')
+HISTORY_IMPORT_SPOOL_FOLDER = 'history_imports'
+# the workouts are written in transactions of about this many sets, rests and intervals
+IMPORT_CHUNK_SIZE = 5000
+MAX_REPORTED_ERRORS = 20
+# the columns the rows are looked up and grouped by, they must be plain values
+KEY_COLUMNS = ('item_type', 'exercise_name', 'workout_id', 'workout_name', 'workout_created_at', 'superset_id',
+               'exercise_session_id')
+
+
+def parse_rows(history_file, import_format):
+    """
+    Parses the flat rows written by the history export - one row per set, rest or interval
+    with its workout, superset and exercise columns. The CSV and NDJSON files are read line by line.
+    An NDJSON line is a row, a blank one is None and a malformed one the ValidationError to report.
+    """
+    if import_format == 'csv':
+        yield from csv.DictReader(history_file)
+    elif import_format == 'ndjson':
+        for line in history_file:
+            if not line.strip():
+                yield None
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as error:
+                yield ValidationError(f"Invalid JSON - {error.msg}")
+    elif import_format == 'json':
+        rows = json.load(history_file)
+        if not isinstance(rows, list):
+            raise ValidationError("The JSON import must be a list of rows")
+        yield from rows
+    else:
+        raise ValidationError(f"The import format must be one of: {', '.join(IMPORT_FORMATS)}")
+
+
+def clean_value(value):
+    return None if value in (None, '') else value
+
+
+def parse_exercise_order(value):
+    value = clean_value(value)
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValidationError(f"Invalid exercise order - {value}")
+
+
+def get_item_data(item_type, row):
+    # the empty columns are left out so the builder applies its defaults
+    return {
+        field: row[field]
+        for field in ITEM_FIELDS[item_type]
+        if clean_value(row.get(field)) is not None
+    }
+
+
+class ExerciseLookup:
+    """Resolves the exercise names of a whole file with one query per exercise model."""
+
+    def __init__(self, profile, names):
+        from server.workouts.models import Exercise, CustomExercise
+
+        lower_names = {name.strip().lower() for name in names if name}
+        self.exercises = {
+            lower_name: (exercise_id, name)
+            for exercise_id, name, lower_name in Exercise.objects.annotate(lower_name=Lower('name')).filter(
+                lower_name__in=lower_names
+            ).values_list('pk', 'name', 'lower_name')
+        }
+        self.custom_exercise_names = set(CustomExercise.objects.annotate(lower_name=Lower('name')).filter(
+            created_by=profile, lower_name__in=lower_names - set(self.exercises)
+        ).values_list('lower_name', flat=True))
+
+    def resolve(self, name):
+        """Returns the {'id', 'name'} of the exercise or raises a ValidationError."""
+        lower_name = (str(name) if name is not None else '').strip().lower()
+        if lower_name in self.exercises:
+            exercise_id, exercise_name = self.exercises[lower_name]
+            return {'id': exercise_id, 'name': exercise_name}
+        if lower_name in self.custom_exercise_names:
+            raise ValidationError(f"Custom exercises can not be logged in workouts - {name}")
+        raise ValidationError(f"Unknown exercise - {name}")
+
+
+def group_workouts(rows, lookup, report):
+    """
+    Turns the rows into (first row number, name, created_at, exercises payload, items count) tuples,
+    the payload having the shape the workout create endpoint accepts.
+    """
+    workouts = OrderedDict()
+    for line_number, row in enumerate(rows, start=1):
+        if row is None:
+            continue
+        try:
+            if isinstance(row, ValidationError):
+                raise row
+            if not isinstance(row, dict):
+                raise ValidationError("A row must be an object")
+            for column in KEY_COLUMNS:
+                if isinstance(row.get(column), (list, dict)):
+                    raise ValidationError(f"Invalid {column.replace('_', ' ')}")
+            item_type = row.get('item_type')
+            if item_type not in ITEM_FIELDS:
+                raise ValidationError(f"Unknown item type - {item_type}")
+            exercise = lookup.resolve(row.get('exercise_name'))
+            exercise_order = parse_exercise_order(row.get('exercise_order'))
+        except ValidationError as error:
+            report.add_error(line_number, error)
+            continue
+
+        workout_key = row.get('workout_id') or (row.get('workout_name'), row.get('workout_created_at'))
+        workout = workouts.setdefault(workout_key, {
+            'line_number': line_number,
+            'name': row.get('workout_name') or 'Imported workout',
+            'created_at': row.get('workout_created_at'),
+            'exercises': OrderedDict(),
+            'items_count': 0,
+        })
+        superset_id = clean_value(row.get('superset_id'))
+        exercise_key = ('superset', superset_id) if superset_id is not None \
+            else ('exercise', row.get('exercise_session_id') or exercise_order)
+        exercise_item = workout['exercises'].setdefault(exercise_key, {
+            'order': exercise_order or len(workout['exercises']),
+            'sessions': OrderedDict(),
+        })
+        session = exercise_item['sessions'].setdefault(row.get('exercise_session_id') or exercise['id'], {
+            'session_type': 'exercise',
+            'exercise': exercise,
+            'notes': clean_value(row.get('notes')),
+            'session_data': [],
+        })
+        session['session_data'].append({'type': item_type, 'data': get_item_data(item_type, row)})
+        workout['items_count'] += 1
+
+    for workout in workouts.values():
+        exercises = []
+        for (exercise_type, _), exercise_item in workout['exercises'].items():
+            sessions = list(exercise_item['sessions'].values())
+            if exercise_type == 'superset':
+                exercises.append({'session_type': 'superset', 'order': exercise_item['order'], 'exercises': sessions})
+            else:
+                exercises.append({**sessions[0], 'order': exercise_item['order']})
+        yield (workout['line_number'], workout['name'], parse_created_at(workout['created_at']), exercises,
+               workout['items_count'])
+
+
+def parse_created_at(value):
+    created_at = parse_datetime(value) if isinstance(value, str) else value
+    if created_at is None:
+        return timezone.now()
+    if timezone.is_naive(created_at):
+        return timezone.make_aware(created_at)
+    return created_at
+
+
+class ImportReport:
+    def __init__(self, progress_callback=None):
+        self.workouts = 0
+        self.items = 0
+        self.skipped_rows = 0
+        self.errors = []
+        self.progress_callback = progress_callback
+
+    def add_error(self, line_number, error, skipped_rows=1):
+        self.skipped_rows += skipped_rows
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"Row {line_number}: {' '.join(error.messages)}")
+
+    def progress(self, total_items):
+        if self.progress_callback is not None:
+            self.progress_callback({'items': self.items, 'total_items': total_items, 'workouts': self.workouts})
+
+    def as_dict(self):
+        return {
+            'workouts': self.workouts,
+            'items': self.items,
+            'skipped_rows': self.skipped_rows,
+            'errors': self.errors,
+        }
+
+
+def save_workouts_chunk(profile, user, chunk, report):
+    """Writes a chunk of workouts with their exercise trees using a bulk insert per model."""
+    from server.sync.changes import record_changes
+    from server.sync.models import SyncChange
+    from server.workouts.models import WorkoutSession, SearchDocument
+    from server.workouts.search import index_objects
+
+    builder = ExerciseTreeBuilder(profile, user=user)
+    workouts = []
+    items = 0
+    for line_number, name, created_at, exercises, items_count in chunk:
+        workout = WorkoutSession(name=name[:WorkoutSession.MAX_LEN_NAME], total_exercises=len(exercises),
+                                 created_by=profile)
+        try:
+            # a workout is only registered once its whole payload parsed
+            workout.total_sets, workout.total_weight_volume = builder.add(workout, exercises, created_at=created_at)
+        except ValidationError as error:
+            report.add_error(line_number, error, skipped_rows=items_count)
+            continue
+        workout.created_at = created_at
+        workouts.append(workout)
+        items += items_count
+    if not workouts:
+        return
+    builder.validate()
+
+    with transaction.atomic():
+        imported_dates = [workout.created_at for workout in workouts]
+        bulk_create_instances(WorkoutSession, workouts)
+        # created_at is overwritten on insert (auto_now_add), the imported dates are written back
+        for workout, created_at in zip(workouts, imported_dates):
+            workout.created_at = created_at
+        WorkoutSession.objects.bulk_update(workouts, ['created_at'])
+        builder.save()
+        # bulk inserts skip the signals that keep the search index and the sync log up to date
+        index_objects(SearchDocument.KIND_WORKOUT, workouts)
+        record_changes(SyncChange.KIND_WORKOUT, [workout.pk for workout in workouts])
+
+    report.workouts += len(workouts)
+    report.items += items
+
+
+def import_history(profile, history_file, import_format, user=None, chunk_size=IMPORT_CHUNK_SIZE,
+                   progress_callback=None):
+    """
+    Imports the workouts of an exported history file (a seekable text file or its content) for the profile.
+    The file is read twice, for the exercise names and then for the workouts, instead of being held in memory.
+    Rows with unknown exercises or item types are skipped and reported.
+    """
+    if isinstance(history_file, str):
+        history_file = io.StringIO(history_file)
+    report = ImportReport(progress_callback)
+    try:
+        lookup = ExerciseLookup(profile, {
+            row.get('exercise_name') for row in parse_rows(history_file, import_format)
+            if isinstance(row, dict) and isinstance(row.get('exercise_name'), str)
+        })
+        history_file.seek(0)
+        workouts = list(group_workouts(parse_rows(history_file, import_format), lookup, report))
+    except UnicodeDecodeError:
+        raise ValidationError("The history file must be UTF-8 encoded")
+    total_items = sum(workout[-1] for workout in workouts)
+
+    chunk = []
+    chunk_items = 0
+    for workout in workouts:
+        chunk.append(workout)
+        chunk_items += workout[-1]
+        if chunk_items >= chunk_size:
+            save_workouts_chunk(profile, user, chunk, report)
+            report.progress(total_items)
+            chunk = []
+            chunk_items = 0
+    if chunk:
+        save_workouts_chunk(profile, user, chunk, report)
+        report.progress(total_items)
+    return report.as_dict()
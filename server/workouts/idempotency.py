@@ -0,0 +1,129 @@
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from server.utils import has_shared_cache
+
+# The clients send an Idempotency-Key header with the requests they may retry. The first request
+# with a key stores its response, a retry gets the stored response back without running the view again.
+# The responses are stored in the shared cache (Redis in production), or in the database when every
+# process has its own locmem cache, so the retries reaching another worker are deduplicated too.
+IDEMPOTENCY_HEADER = 'HTTP_IDEMPOTENCY_KEY'
+IDEMPOTENCY_KEY = 'workouts:idempotency:{profile_id}:{key}'
+IDEMPOTENCY_TIMEOUT = 60 * 60 * 24
+# how long a request is considered in progress, a crashed worker must not block its key for a day
+IDEMPOTENCY_LOCK_TIMEOUT = 60 * 5
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
+
+def get_request_fingerprint(request):
+    """The same key sent with another body or to another endpoint is a client bug, not a retry."""
+    body = json.dumps(request.data, sort_keys=True, cls=DjangoJSONEncoder, default=str)
+    return hashlib.sha256(f'{request.method}:{request.path}:{body}'.encode()).hexdigest()
+
+
+def get_idempotency_cache_key(request, key):
+    return IDEMPOTENCY_KEY.format(profile_id=request.user.profile.pk,
+                                  key=hashlib.sha256(key.encode()).hexdigest())
+
+
+class DatabaseIdempotencyStore:
+    """The add, get, set and delete of the cache, on the IdempotencyRecord table."""
+
+    def add(self, key, value, timeout):
+        from server.workouts.models import IdempotencyRecord
+
+        now = timezone.now()
+        IdempotencyRecord.objects.filter(key=key, expires_at__lte=now).delete()
+        try:
+            with transaction.atomic():
+                IdempotencyRecord.objects.create(key=key, value=value, expires_at=now + timedelta(seconds=timeout))
+        except IntegrityError:
+            return False
+        return True
+
+    def get(self, key):
+        from server.workouts.models import IdempotencyRecord
+
+        return IdempotencyRecord.objects.filter(key=key, expires_at__gt=timezone.now()).values_list(
+            'value', flat=True
+        ).first()
+
+    def set(self, key, value, timeout):
+        from server.workouts.models import IdempotencyRecord
+
+        IdempotencyRecord.objects.update_or_create(key=key, defaults={
+            'value': value, 'expires_at': timezone.now() + timedelta(seconds=timeout),
+        })
+
+    def delete(self, key):
+        from server.workouts.models import IdempotencyRecord
+
+        IdempotencyRecord.objects.filter(key=key).delete()
+
+
+def get_idempotency_store():
+    return cache if has_shared_cache() else DatabaseIdempotencyStore()
+
+
+def remove_expired_idempotency_records():
+    from server.workouts.models import IdempotencyRecord
+
+    return IdempotencyRecord.objects.filter(expires_at__lte=timezone.now()).delete()[0]
+
+
+def replay_response(stored, fingerprint):
+    if stored['fingerprint'] != fingerprint:
+        return Response("The Idempotency-Key was already used for another request.",
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    if stored['status'] is None:
+        return Response("A request with this Idempotency-Key is still being processed.",
+                        status=status.HTTP_409_CONFLICT)
+    return Response(stored['data'], status=stored['status'], headers={'Idempotent-Replayed': 'true'})
+
+
+def idempotent(view_method):
+    """
+    Makes a view method safe to retry with an Idempotency-Key header.
+    Only the final responses are stored, the server errors can be retried.
+    """
+
+    @wraps(view_method)
+    def wrapper(view, request, *args, **kwargs):
+        key = request.META.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view_method(view, request, *args, **kwargs)
+        if len(key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+            return Response(f"The Idempotency-Key must be at most {MAX_IDEMPOTENCY_KEY_LENGTH} characters.",
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        store = get_idempotency_store()
+        cache_key = get_idempotency_cache_key(request, key)
+        fingerprint = get_request_fingerprint(request)
+        # adding the key is atomic, of two concurrent requests only one runs the view
+        if not store.add(cache_key, {'fingerprint': fingerprint, 'status': None}, IDEMPOTENCY_LOCK_TIMEOUT):
+            stored = store.get(cache_key)
+            if stored is not None:
+                return replay_response(stored, fingerprint)
+
+        try:
+            response = view_method(view, request, *args, **kwargs)
+        except Exception:
+            store.delete(cache_key)
+            raise
+        if response.status_code >= 500:
+            store.delete(cache_key)
+        else:
+            store.set(cache_key, {'fingerprint': fingerprint, 'status': response.status_code, 'data': response.data},
+                      IDEMPOTENCY_TIMEOUT)
+        return response
+
+    return wrapper
@@ -0,0 +1,66 @@
+import timeit
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from server.profiles.models import Profile
+from server.workouts.bulk import ExerciseTreeBuilder
+from server.workouts.compiled import serialize_exercise_items
+from server.workouts.exercise_serializers import ExerciseSessionDetailsSerializer, BaseSupersetSessionSerializer
+from server.workouts.models import Exercise, WorkoutSession
+from server.workouts.utils import serializer_exericses_for_session_or_template
+
+
+def build_exercises_payload(exercises, sets_count):
+    """Exercise sessions of `sets_count` sets followed by a rest each, like the ones of the API."""
+    return [{
+        'session_type': 'exercise',
+        'order': index,
+        'exercise': {'id': exercise.id, 'name': exercise.name},
+        'session_data': [item for set_index in range(sets_count) for item in (
+            {'type': 'set', 'data': {'weight': 60 + set_index, 'reps': 10, 'min_reps': 8, 'max_reps': 12,
+                                     'to_failure': False, 'bodyweight': False}},
+            {'type': 'rest', 'data': {'minutes': 1, 'seconds': 30}},
+        )],
+    } for index, exercise in enumerate(exercises)]
+
+
+class Command(BaseCommand):
+    help = "Compares the serialization time of a large workout with the compiled and the DRF serializers. " \
+           "The workout is created in a transaction that is rolled back."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--exercises', type=int, default=10)
+        parser.add_argument('--sets', type=int, default=100, help="The sets of every exercise")
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = get_user_model().objects.create_user(email='benchmark@example.com', username='benchmark_user',
+                                                        password=None)
+            profile = Profile.objects.create_profile(user=user)
+            exercises = [Exercise.objects.create(name=f'Benchmark {index}') for index in range(options['exercises'])]
+            workout = WorkoutSession(name='Benchmark', total_exercises=len(exercises), created_by=profile)
+            builder = ExerciseTreeBuilder(profile, user=user)
+            workout.total_sets, workout.total_weight_volume = builder.add(
+                workout, build_exercises_payload(exercises, options['sets'])
+            )
+            builder.validate()
+            workout.save()
+            builder.save()
+
+            self.stdout.write(f"Workout of {workout.total_sets} sets, best of {options['repeat']} runs "
+                              f"(queries included)")
+            timings = []
+            for name, serialize in (
+                    ('DRF', lambda: serializer_exericses_for_session_or_template(
+                        workout.exercises.all(), ExerciseSessionDetailsSerializer, BaseSupersetSessionSerializer
+                    )),
+                    ('compiled', lambda: serialize_exercise_items(workout.exercises.all())),
+            ):
+                best = min(timeit.repeat(serialize, number=1, repeat=options['repeat']))
+                timings.append(best)
+                self.stdout.write(f"{name}: {best * 1000:.1f} ms")
+            self.stdout.write(self.style.SUCCESS(f"Compiled serializers {timings[0] / timings[1]:.1f}x faster"))
+            transaction.set_rollback(True)
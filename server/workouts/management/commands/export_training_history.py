@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from server.profiles.models import Profile
+from server.workouts.export import EXPORT_FORMATS, EXPORT_CHUNK_SIZE, export_history
+
+
+class Command(BaseCommand):
+    help = "Exports every set, rest and interval of a profile's workouts as NDJSON or CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument('profile_id', type=int)
+        parser.add_argument('--export-format', choices=list(EXPORT_FORMATS), default='ndjson')
+        parser.add_argument('--output', help="File to write to, the standard output by default")
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            profile = Profile.objects.get(pk=options['profile_id'])
+        except Profile.DoesNotExist:
+            raise CommandError(f"Profile {options['profile_id']} does not exist")
+
+        lines = export_history(profile, options['export_format'], options['chunk_size'])
+        if not options['output']:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+            output.writelines(lines)
+        self.stderr.write(self.style.SUCCESS(f"Exported the history to {options['output']}"))
@@ -0,0 +1,40 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from server.profiles.models import Profile
+from server.workouts.history_import import IMPORT_FORMATS, IMPORT_CHUNK_SIZE, import_history
+
+
+class Command(BaseCommand):
+    help = "Imports the workouts of an exported NDJSON, JSON or CSV training history file for a profile."
+
+    def add_arguments(self, parser):
+        parser.add_argument('profile_id', type=int)
+        parser.add_argument('path')
+        parser.add_argument('--import-format', choices=IMPORT_FORMATS, default='ndjson')
+        parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            profile = Profile.objects.select_related('user').get(pk=options['profile_id'])
+        except Profile.DoesNotExist:
+            raise CommandError(f"Profile {options['profile_id']} does not exist")
+
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as history_file:
+                report = import_history(
+                    profile, history_file, options['import_format'], user=profile.user,
+                    chunk_size=options['chunk_size'],
+                    progress_callback=lambda progress: self.stderr.write(
+                        f"Imported {progress['items']}/{progress['total_items']} items"
+                    ),
+                )
+        except (ValidationError, ValueError) as error:
+            raise CommandError(f"The history file could not be read - {error}")
+
+        for error in report['errors']:
+            self.stderr.write(self.style.WARNING(error))
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {report['workouts']} workouts with {report['items']} items, "
+            f"skipped {report['skipped_rows']} rows"
+        ))
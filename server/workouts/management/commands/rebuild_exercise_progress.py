@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from server.profiles.models import Profile
+from server.workouts.progress import rebuild_progress
+
+
+class Command(BaseCommand):
+    help = "Recomputes the per day exercise progress rollups from the sets logged in workout sessions."
+
+    def add_arguments(self, parser):
+        parser.add_argument('profile_ids', nargs='*', type=int, help="Only rebuild the rollups of these profiles")
+
+    def handle(self, *args, **options):
+        profile_ids = options['profile_ids'] or Profile.objects.order_by('pk').values_list('pk', flat=True)
+        rebuild_progress(profile_ids, stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS("Done"))
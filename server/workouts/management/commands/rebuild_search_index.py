@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from server.workouts.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the exercise and workout search index from the searchable models."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rebuild_search_index(chunk_size=options['chunk_size'], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS("Done, the search index was rebuilt"))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from server.workouts.models import WorkoutSession
+from server.workouts.totals import recompute_workout_totals
+
+
+class Command(BaseCommand):
+    help = "Recomputes total_sets and total_weight_volume of workout sessions from their stored exercises."
+
+    def add_arguments(self, parser):
+        parser.add_argument('workout_ids', nargs='*', type=int, help="Only repair these workout sessions")
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        workouts = WorkoutSession.objects.order_by('pk')
+        if options['workout_ids']:
+            workouts = workouts.filter(pk__in=options['workout_ids'])
+
+        repaired = 0
+        last_pk = 0
+        while True:
+            chunk = list(workouts.filter(pk__gt=last_pk).only('pk', 'total_sets', 'total_weight_volume')[:chunk_size])
+            if not chunk:
+                break
+            recompute_workout_totals(chunk)
+            repaired += len(chunk)
+            last_pk = chunk[-1].pk
+            self.stdout.write(f"Recomputed {repaired} workout sessions")
+
+        self.stdout.write(self.style.SUCCESS(f"Done, {repaired} workout sessions recomputed"))
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.6 on 2026-10-18 10:11
+
+from django.db import migrations, models
+
+ORDER_GAP = 1024
+
+
+def spread_session_items(apps, schema_editor):
+    """Renumbers the existing items with gaps and initializes the counter of every session."""
+    ExerciseSession = apps.get_model('workouts', 'ExerciseSession')
+    ExerciseSessionItem = apps.get_model('workouts', 'ExerciseSessionItem')
+
+    session_items = []
+    sessions = []
+    current_session_id = None
+    index = 0
+    for session_item in ExerciseSessionItem.objects.order_by('exercise_session_id', 'order', 'pk').only(
+            'pk', 'exercise_session_id', 'order').iterator(chunk_size=2000):
+        if session_item.exercise_session_id != current_session_id:
+            current_session_id = session_item.exercise_session_id
+            index = 0
+        index += 1
+        session_item.order = index * ORDER_GAP
+        session_items.append(session_item)
+        if len(session_items) >= 2000:
+            ExerciseSessionItem.objects.bulk_update(session_items, ['order'])
+            session_items = []
+    ExerciseSessionItem.objects.bulk_update(session_items, ['order'])
+
+    for exercise_session_id, order in ExerciseSessionItem.objects.values('exercise_session_id').annotate(
+            last_order=models.Max('order')).values_list('exercise_session_id', 'last_order').iterator():
+        sessions.append(ExerciseSession(pk=exercise_session_id, next_item_order=order))
+    ExerciseSession.objects.bulk_update(sessions, ['next_item_order'], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workouts', '0006_routine_routineworkout_routine_workouts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exercisesession',
+            name='next_item_order',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(spread_session_items, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.6 on 2026-10-18 10:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workouts', '0007_exercisesession_next_item_order'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='workoutplan',
+            index=models.Index(fields=['created_by', 'created_at', 'id'], name='workoutplan_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workoutsession',
+            index=models.Index(fields=['created_by', 'created_at', 'id'], name='workoutsession_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workouttemplate',
+            index=models.Index(fields=['created_by', 'created_at', 'id'], name='workouttemplate_keyset_idx'),
+        ),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 4.2.6 on 2026-10-18 10:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_postgres_search_indexes(apps, schema_editor):
+    """Trigram and prefix (LIKE 'x%') indexes, only available on PostgreSQL."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS search_document_trgm_idx '
+        'ON workouts_searchdocument USING gin (normalized_name gin_trgm_ops)'
+    )
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS search_token_pattern_idx '
+        'ON workouts_searchtoken (kind, token varchar_pattern_ops)'
+    )
+
+
+def drop_postgres_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS search_document_trgm_idx')
+    schema_editor.execute('DROP INDEX IF EXISTS search_token_pattern_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0006_alter_profile_full_name_alter_profile_gender'),
+        ('workouts', '0008_list_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('exercise', 'Exercise'), ('custom_exercise', 'Custom exercise'), ('workout', 'Workout session'), ('template', 'Workout template')], max_length=20)),
+                ('object_id', models.PositiveIntegerField()),
+                ('is_public', models.BooleanField(default=True)),
+                ('name', models.CharField(max_length=100)),
+                ('normalized_name', models.CharField(max_length=100)),
+                ('owner', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='profiles.profile')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SearchTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('exercise', 'Exercise'), ('custom_exercise', 'Custom exercise'), ('workout', 'Workout session'), ('template', 'Workout template')], max_length=20)),
+                ('trigram', models.CharField(max_length=3)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trigrams', to='workouts.searchdocument')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'trigram'], name='search_trigram_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('exercise', 'Exercise'), ('custom_exercise', 'Custom exercise'), ('workout', 'Workout session'), ('template', 'Workout template')], max_length=20)),
+                ('token', models.CharField(max_length=100)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tokens', to='workouts.searchdocument')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'token'], name='search_token_prefix_idx')],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='searchdocument',
+            index=models.Index(fields=['kind', 'owner'], name='search_document_owner_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='searchdocument',
+            constraint=models.UniqueConstraint(fields=('kind', 'object_id'), name='search_document_unique_object'),
+        ),
+        migrations.RunPython(create_postgres_search_indexes, drop_postgres_search_indexes),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.6 on 2026-10-18 10:28
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0006_alter_profile_full_name_alter_profile_gender'),
+        ('workouts', '0009_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExerciseProgressDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('sets_count', models.PositiveIntegerField(default=0)),
+                ('total_reps', models.PositiveIntegerField(default=0)),
+                ('total_volume', models.PositiveIntegerField(default=0)),
+                ('top_set_weight', models.FloatField(blank=True, null=True)),
+                ('top_set_reps', models.IntegerField(blank=True, null=True)),
+                ('estimated_one_rep_max', models.FloatField(blank=True, null=True)),
+                ('exercise', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='workouts.exercise')),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='profiles.profile')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='exerciseprogressday',
+            constraint=models.UniqueConstraint(fields=('profile', 'exercise', 'day'), name='exercise_progress_day_unique'),
+        ),
+    ]
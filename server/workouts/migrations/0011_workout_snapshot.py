@@ -0,0 +1,29 @@
+# Generated by Django 4.2.6 on 2026-10-18 10:45
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workouts', '0010_exercise_progress_day'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkoutSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('workout', 'Workout session'), ('template', 'Workout template')], max_length=20)),
+                ('object_id', models.PositiveIntegerField()),
+                ('schema_version', models.PositiveIntegerField(default=0)),
+                ('document', models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True)),
+                ('invalidated_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='workoutsnapshot',
+            constraint=models.UniqueConstraint(fields=('kind', 'object_id'), name='workout_snapshot_unique_object'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.6 on 2026-10-18 12:12
+
+from django.db import migrations, models
+import rest_framework.utils.encoders
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workouts', '0011_workout_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=150, unique=True)),
+                ('value', models.JSONField(encoder=rest_framework.utils.encoders.JSONEncoder)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
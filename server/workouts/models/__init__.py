@@ -1,5 +1,6 @@
-
 from .workouts import *
 from .exercise import *
-
-
+from .search import *
+from .progress import *
+from .snapshots import *
+from .idempotency import *
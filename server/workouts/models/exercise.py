@@ -1,8 +1,7 @@
 from datetime import datetime
 
-from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelation
 from django.db import models, transaction
-from django.db.models import Max
 from simple_history.models import HistoricalRecords
 from django.core.exceptions import ValidationError, PermissionDenied
 
@@ -30,6 +29,8 @@ class Rest(models.Model):
         Profile,
         on_delete=models.CASCADE
     )
+    # deleting the rest removes it from its exercise session
+    session_items = GenericRelation('ExerciseSessionItem')
 
     def __str__(self):
         return f"{self.minutes}m {self.seconds}s"
@@ -82,6 +83,8 @@ class Set(models.Model):
         Profile,
         on_delete=models.CASCADE
     )
+    # deleting the set removes it from its exercise session
+    session_items = GenericRelation('ExerciseSessionItem')
 
     history = HistoricalRecords()
 
@@ -89,7 +92,7 @@ class Set(models.Model):
     def edit_data(request, set_instance, set_data):
         # TODO: Check if all the fields are the same, to not make the edits
         if request.user.profile != set_instance.created_by:
-            return PermissionDenied("You can only edit your own sets")
+            raise PermissionDenied("You can only edit your own sets")
         set_intance_fields = {
             'weight': set_instance.weight,
             'reps': set_instance.reps,
@@ -140,6 +143,8 @@ class Interval(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     created_by = models.ForeignKey(Profile, on_delete=models.CASCADE)
+    # deleting the interval removes it from its exercise session
+    session_items = GenericRelation('ExerciseSessionItem')
 
     index_in_session = models.PositiveIntegerField(
         default=0
@@ -147,7 +152,7 @@ class Interval(models.Model):
 
     def edit_data(self, request, interval_data):
         if request.user.profile != self.created_by:
-            return PermissionDenied("You can only edit your own sets")
+            raise PermissionDenied("You can only edit your own sets")
         interval_instance_fields = {
             'time': self.time,
             'distance': self.distance,
@@ -295,8 +300,12 @@ class ExerciseSession(models.Model):
         blank=True,
         null=True
     )
+    # the last order handed out to the session items, see server.workouts.ordering
+    next_item_order = models.PositiveIntegerField(
+        default=0
+    )
 
-    history = HistoricalRecords()
+    history = HistoricalRecords(excluded_fields=['next_item_order'])
 
     @staticmethod
     def validate_sets(data):
@@ -365,52 +374,35 @@ class ExerciseSession(models.Model):
 
     @staticmethod
     def add_single_set_instance(request, exercise_session, set_data):
-        current_sets = exercise_session.sets.all()
-        max_set_index = current_sets.aggregate(Max('set_index'))['set_index__max']
-        new_set_index = max_set_index + 1 if max_set_index is not None else 0
         try:
-            is_valid = ExerciseSession.validate_sets([set_data])
+            ExerciseSession.validate_sets([set_data])
         except ValidationError as e:
             raise ValidationError(e.message)
-        set_instance = Set.objects.create(
-            weight=set_data.get('weight', 0),
-            reps=set_data.get('reps', 0),
-            min_reps=set_data.get('min_reps', 0),
-            max_reps=set_data.get('max_reps', 0),
-            to_failure=set_data.get('to_failure', False),
-            bodyweight=set_data.get('bodyweight', False),
-            set_index=new_set_index,
-            created_by=request.user.profile
-        )
-
-        exercise_session.sets.add(set_instance)
+        with transaction.atomic():
+            set_instance = Set.objects.create(
+                weight=set_data.get('weight', 0),
+                reps=set_data.get('reps', 0),
+                min_reps=set_data.get('min_reps', 0),
+                max_reps=set_data.get('max_reps', 0),
+                to_failure=set_data.get('to_failure', False),
+                bodyweight=set_data.get('bodyweight', False),
+                created_by=request.user.profile
+            )
+            session_item = ExerciseSession.add_item(exercise_session, set_instance)
+            set_instance.set_index = session_item.order
+            Set.objects.filter(pk=set_instance.pk).update(set_index=set_instance.set_index)
         return set_instance
 
     @staticmethod
-    def edit_session(request, exercise_session, data):
-        sets = data['session_data']
-        notes = data['notes']
-        for exercise_set in sets:
-            if not 'id' in exercise_set:
-                ExerciseSession.add_single_set_instance(request, exercise_session, exercise_set)
-                continue
-            if exercise_set['type'] == 'rest':
-                rest = Rest.objects.get(pk=exercise_set['id'])
-                rest.edit_session(exercise_set['data']['minutes'], exercise_set['data']['seconds'])
-                continue
-            # TODO: Check if the item is rest or interval
-            if exercise_set['type'] == 'interval':
-                interval_instance = Interval.objects.get(pk=exercise_set['id'])
-                interval_instance.edit_data(request, exercise_set.get('data', {}))
-                continue
-            try:
-                set_instance = Set.objects.get(pk=exercise_set['id'])
-                Set.edit_data(request, set_instance, exercise_set.get('data', {}))
-            except Set.DoesNotExist:
-                return models.ObjectDoesNotExist
-        exercise_session.notes = notes
-        exercise_session.save()
-        return exercise_session
+    def add_item(exercise_session, item):
+        """Appends the set/rest/interval at the end of the session."""
+        from server.workouts.ordering import allocate_item_orders
+
+        return ExerciseSessionItem.objects.create(
+            exercise_session=exercise_session,
+            item=item,
+            order=allocate_item_orders(exercise_session)
+        )
 
     # added later
     @staticmethod
@@ -426,13 +418,7 @@ class ExerciseSession(models.Model):
             bodyweight=string_to_bool(set_data.get('bodyweight', False)),  # Convert string to boolean
             created_by=request.user.profile
         )
-        content_type = ContentType.objects.get_for_model(set_instance)
-        ExerciseSessionItem.objects.create(
-            exercise_session=exercise_session,
-            content_type=content_type,
-            object_id=set_instance.id,
-            order=ExerciseSessionItem.objects.filter(exercise_session=exercise_session).count()
-        )
+        ExerciseSession.add_item(exercise_session, set_instance)
         return set_instance
 
     # added later
@@ -443,13 +429,7 @@ class ExerciseSession(models.Model):
             seconds=rest_data.get('seconds', 0),
             created_by=request.user.profile
         )
-        content_type = ContentType.objects.get_for_model(rest_instance)
-        ExerciseSessionItem.objects.create(
-            exercise_session=exercise_session,
-            content_type=content_type,
-            object_id=rest_instance.id,
-            order=ExerciseSessionItem.objects.filter(exercise_session=exercise_session).count()
-        )
+        ExerciseSession.add_item(exercise_session, rest_instance)
         return rest_instance
 
     @staticmethod
@@ -465,13 +445,7 @@ class ExerciseSession(models.Model):
             pace=get_value_or_default(interval_data, 'pace'),
             created_by=request.user.profile
         )
-        content_type = ContentType.objects.get_for_model(interval_instance)
-        ExerciseSessionItem.objects.create(
-            exercise_session=exercise_session,
-            content_type=content_type,
-            object_id=interval_instance.id,
-            order=ExerciseSessionItem.objects.filter(exercise_session=exercise_session).count()
-        )
+        ExerciseSession.add_item(exercise_session, interval_instance)
         return interval_instance
 
 
@@ -484,39 +458,6 @@ class SupersetSession(models.Model):
     def __str__(self):
         return f"Superset Session created by {self.created_by} at {self.created_at}"
 
-    def add_exercise_sessions(self, exercise_sessions):
-        """Iterating over the exercises and checking if the exercise session
-        is not in the superset and if it is not adding it to the list of exercises to add"""
-        exercises = self.exercises.all()
-        exercises_to_add = []
-
-        for exercise_session in exercise_sessions:
-            if exercise_session not in exercises:
-                exercises_to_add.append(exercise_session)
-        if len(exercises_to_add) == 0:
-            return self
-        self.exercises.add(*exercises_to_add)
-        self.save()
-        return self
-
-    @staticmethod
-    def edit_session(request, superset_session, data):
-        from server.workouts.utils import remove_exercises_not_in_list
-        exercises_in_superset_instance = superset_session.exercises.all()
-        """This function is removing the exercises that are not in the list of exercises but are in the superset"""
-        exercises_after_deletion = remove_exercises_not_in_list(exercises_in_superset_instance,
-                                                                data.get('exercises', {}))
-        """This function is adding the new exercises to the superset"""
-        session_after_exercise_add = superset_session.add_exercise_sessions(exercises_after_deletion)
-        for exercise_session in session_after_exercise_add.exercises.all():
-            exercise_data = next(
-                (exercise for exercise in data.get('exercises') if exercise['id'] == exercise_session.pk),
-                None)
-            """And this is editing the exercise"""
-            ExerciseSession.edit_session(request, exercise_session, exercise_data)
-        superset_session.notes = data.get('notes')
-        return superset_session.save()
-
 
 # added later
 class ExerciseSessionItem(models.Model):
@@ -528,3 +469,9 @@ class ExerciseSessionItem(models.Model):
 
     class Meta:
         ordering = ['order']
+
+    @staticmethod
+    def move(session_item, after_item=None):
+        from server.workouts.ordering import move_session_item
+
+        return move_session_item(session_item, after_item)
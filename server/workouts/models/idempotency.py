@@ -0,0 +1,16 @@
+from django.db import models
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class IdempotencyRecord(models.Model):
+    """
+    The stored response of an Idempotency-Key, when the processes do not share a cache.
+    See server.workouts.idempotency.
+    """
+    key = models.CharField(max_length=150, unique=True)
+    # encoded like the responses are rendered
+    value = models.JSONField(encoder=JSONEncoder)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.key} until {self.expires_at}"
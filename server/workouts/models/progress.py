@@ -0,0 +1,30 @@
+from django.db import models
+
+from server.profiles.models import Profile
+from server.workouts.models.exercise import Exercise
+
+
+class ExerciseProgressDay(models.Model):
+    """
+    The rollup of the sets a profile logged for an exercise on a day, in its workout sessions.
+    Kept up to date by the signals in server.workouts.signals, see server.workouts.progress.
+    """
+    profile = models.ForeignKey(Profile, on_delete=models.CASCADE)
+    exercise = models.ForeignKey(Exercise, on_delete=models.CASCADE)
+    day = models.DateField()
+    sets_count = models.PositiveIntegerField(default=0)
+    total_reps = models.PositiveIntegerField(default=0)
+    total_volume = models.PositiveIntegerField(default=0)
+    # the heaviest set of the day, the reps break the ties
+    top_set_weight = models.FloatField(blank=True, null=True)
+    top_set_reps = models.IntegerField(blank=True, null=True)
+    estimated_one_rep_max = models.FloatField(blank=True, null=True)
+
+    class Meta:
+        # the unique index also serves the (profile, exercise, day range) series queries
+        constraints = [
+            models.UniqueConstraint(fields=['profile', 'exercise', 'day'], name='exercise_progress_day_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.exercise_id} progress of {self.profile_id} on {self.day}"
@@ -0,0 +1,69 @@
+from django.db import models
+
+from server.profiles.models import Profile
+
+
+class SearchDocument(models.Model):
+    """
+    The searchable name of an exercise, custom exercise, workout session or workout template.
+    Kept in sync by the signals in server.workouts.signals, see server.workouts.search.
+    """
+    KIND_EXERCISE = 'exercise'
+    KIND_CUSTOM_EXERCISE = 'custom_exercise'
+    KIND_WORKOUT = 'workout'
+    KIND_TEMPLATE = 'template'
+    KIND_CHOICES = [
+        (KIND_EXERCISE, 'Exercise'),
+        (KIND_CUSTOM_EXERCISE, 'Custom exercise'),
+        (KIND_WORKOUT, 'Workout session'),
+        (KIND_TEMPLATE, 'Workout template'),
+    ]
+    MAX_LEN_NAME = 100
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.PositiveIntegerField()
+    # private documents are only visible to their owner
+    owner = models.ForeignKey(Profile, on_delete=models.CASCADE, blank=True, null=True)
+    is_public = models.BooleanField(default=True)
+    name = models.CharField(max_length=MAX_LEN_NAME)
+    normalized_name = models.CharField(max_length=MAX_LEN_NAME)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='search_document_unique_object'),
+        ]
+        indexes = [
+            models.Index(fields=['kind', 'owner'], name='search_document_owner_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id} - {self.name}"
+
+
+class SearchToken(models.Model):
+    """A normalized word of a document name, matched by prefix for the autocomplete."""
+    MAX_LEN_TOKEN = 100
+
+    document = models.ForeignKey(SearchDocument, on_delete=models.CASCADE, related_name='tokens')
+    kind = models.CharField(max_length=20, choices=SearchDocument.KIND_CHOICES)
+    token = models.CharField(max_length=MAX_LEN_TOKEN)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['kind', 'token'], name='search_token_prefix_idx'),
+        ]
+
+
+class SearchTrigram(models.Model):
+    """
+    A trigram of a document name, used for the typo tolerant matching on the databases
+    without trigram indexes. PostgreSQL uses pg_trgm on SearchDocument.normalized_name instead.
+    """
+    document = models.ForeignKey(SearchDocument, on_delete=models.CASCADE, related_name='trigrams')
+    kind = models.CharField(max_length=20, choices=SearchDocument.KIND_CHOICES)
+    trigram = models.CharField(max_length=3)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['kind', 'trigram'], name='search_trigram_idx'),
+        ]
@@ -0,0 +1,30 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+
+
+class WorkoutSnapshot(models.Model):
+    """
+    The serialized exercise tree of a workout session or workout template, so it is read with one query.
+    Invalidated when the tree changes and rebuilt on the next read, see server.workouts.snapshots.
+    """
+    KIND_WORKOUT = 'workout'
+    KIND_TEMPLATE = 'template'
+    KIND_CHOICES = [
+        (KIND_WORKOUT, 'Workout session'),
+        (KIND_TEMPLATE, 'Workout template'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.PositiveIntegerField()
+    # the document format, documents of an older format are rebuilt
+    schema_version = models.PositiveIntegerField(default=0)
+    document = models.JSONField(blank=True, null=True, encoder=DjangoJSONEncoder)
+    invalidated_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='workout_snapshot_unique_object'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id} snapshot"
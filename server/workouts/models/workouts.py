@@ -16,6 +16,10 @@ class BaseWorkoutModel(models.Model):
 
     class Meta:
         abstract = True
+        # the list endpoints page through a profile's rows by (created_at, id)
+        indexes = [
+            models.Index(fields=['created_by', 'created_at', 'id'], name='%(class)s_keyset_idx'),
+        ]
 
 
 class WorkoutTemplate(BaseWorkoutModel):
@@ -24,30 +28,64 @@ class WorkoutTemplate(BaseWorkoutModel):
 
     @staticmethod
     def create_workout_template(request, workout_name, exercises):
+        from server.workouts.bulk import ExerciseTreeBuilder
 
-        from server.workouts.utils import create_exercise_sessions_for_workout
+        builder = ExerciseTreeBuilder(request.user.profile, user=request.user)
+        workout_template = WorkoutTemplate.prepare_workout_template(request, workout_name, exercises, builder)
+        builder.validate()
+        WorkoutTemplate.save_prepared_templates([workout_template], builder)
+        return workout_template
+
+    @staticmethod
+    def prepare_workout_template(request, workout_name, exercises, builder):
+        """Validates the template and registers its exercises in the builder. Returns the unsaved template."""
         if not workout_name:
             raise ValidationError("Provide a name for your workout template")
         if len(exercises) == 0:
             raise ValidationError("Please add exercises to your workout template")
 
-        workout_template = WorkoutTemplate.objects.create(
+        workout_template = WorkoutTemplate(
             name=workout_name,
             total_exercises=len(exercises),
-            total_sets=0,
             created_by=request.user.profile
-
         )
-        workout_template_session = TemplateWorkoutSession.create(request, template_id=workout_template.id,
-                                                                 workout_data=exercises)
-        exercise_sessions = create_exercise_sessions_for_workout(request, workout_template, exercises)
-        if not exercise_sessions or len(exercise_sessions) == 0:
-            workout_template.delete()
-            raise ValidationError("Please add exercises to your workout template")
-        workout_template.exercises.add(*exercise_sessions)
-        workout_template.save()
+        workout_template.total_sets, _ = builder.add(workout_template, exercises)
         return workout_template
 
+    @staticmethod
+    def save_prepared_templates(workout_templates, builder):
+        with transaction.atomic():
+            for workout_template in workout_templates:
+                workout_template.save()
+            builder.save()
+
+    @staticmethod
+    def start_workout(request, workout_template):
+        """
+        Copies the exercise tree of the template into a new workout session of the user.
+        The tree is loaded with a query per relation and copied with a bulk insert per model.
+        """
+        from server.workouts.bulk import ExerciseTreeBuilder
+        from server.workouts.prefetch import prefetch_exercise_items
+
+        profile = request.user.profile
+        builder = ExerciseTreeBuilder(profile, user=request.user)
+        exercise_items = prefetch_exercise_items(workout_template.exercises.all(), with_last_history=False)
+        workout_session = WorkoutSession(
+            name=workout_template.name,
+            total_exercises=len(exercise_items),
+            created_by=profile,
+        )
+        workout_session.total_sets, workout_session.total_weight_volume = builder.add_copy(
+            workout_session, exercise_items
+        )
+        with transaction.atomic():
+            workout_session.save()
+            builder.save()
+            TemplateWorkoutSession.objects.create(template=workout_template, workout_session=workout_session,
+                                                  created_by=profile)
+        return workout_session
+
     @staticmethod
     def publish_template(request, workout_id):
         user = request.user
@@ -63,8 +101,6 @@ class WorkoutTemplate(BaseWorkoutModel):
 
     @staticmethod
     def edit_template(request, workout_session, new_data):
-        from server.workouts.utils import update_workout_session_exercises
-
         workout_name = new_data.get('name')
         exercises = new_data.get('exercises')
 
@@ -82,36 +118,37 @@ class WorkoutSession(BaseWorkoutModel):
     )
 
     @staticmethod
-    def create_session(request, workout_name, exercises, workout_template=None):
-        from server.workouts.utils import create_exercise_sessions_for_workout
+    def create_session(request, workout_name, exercises):
+        from server.workouts.bulk import ExerciseTreeBuilder
 
+        builder = ExerciseTreeBuilder(request.user.profile, user=request.user)
+        workout_session = WorkoutSession.prepare_session(request, workout_name, exercises, builder)
+        builder.validate()
+        with transaction.atomic():
+            workout_session.save()
+            builder.save()
+        return workout_session
+
+    @staticmethod
+    def prepare_session(request, workout_name, exercises, builder):
+        """Validates the workout and registers its exercises in the builder. Returns the unsaved session."""
         if not workout_name:
             raise ValidationError("Provide a name for your workout")
         if len(exercises) == 0:
             raise ValidationError("Please add exercises to your workout")
 
-        workout_session = WorkoutSession.objects.create(
-            # workout_template=workout_template,
+        workout_session = WorkoutSession(
             name=workout_name,
             total_exercises=len(exercises),
-            # TODO: Move the total_set and total_weight volume to a signal
-            total_sets=0,
-            total_weight_volume=0,
             created_by=request.user.profile,
-
         )
-        if not workout_session:
-            raise ValueError("Failed to create WorkoutSession!")
-        workout_session.save()
-        exercise_sessions = create_exercise_sessions_for_workout(request, workout_session, exercises)
-        workout_session.exercises.add(*exercise_sessions)
+        workout_session.total_sets, workout_session.total_weight_volume = builder.add(workout_session, exercises)
         return workout_session
 
     def update_session_exercises(self, request, exercises):
-        from server.workouts.utils import create_exercise_sessions_for_workout, update_workout_session_exercises
-        a = 5
-        update_workout_session_exercises(request, self, exercises)
-        return self
+        from server.workouts.reconcile import reconcile_workout_exercises
+
+        return reconcile_workout_exercises(request, self, exercises)
 
 
 class BaseExerciseItemForWorkout(models.Model):
@@ -156,8 +193,15 @@ class WorkoutPlan(models.Model):
         auto_now_add=True,
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_by', 'created_at', 'id'], name='workoutplan_keyset_idx'),
+        ]
+
     @staticmethod
     def create_routine(request, routine_data):
+        from server.workouts.bulk import ExerciseTreeBuilder
+
         try:
             with transaction.atomic():
                 name = routine_data['name']
@@ -174,14 +218,17 @@ class WorkoutPlan(models.Model):
                     created_by=request.user.profile
                 )
 
-                for workout_data in routine_data['workouts']:
-                    workout_name = workout_data['name']
-                    exercises_data = workout_data['exercises']
-                    # Creating the instance
-                    workout_session = WorkoutSession.create_session(request=request, workout_name=workout_name,
-                                                                    exercises=exercises_data)
-                    # adding the instance to the workout plan instance
-                    workout_plan.workouts.add(workout_session)
+                builder = ExerciseTreeBuilder(request.user.profile, user=request.user)
+                workout_sessions = [
+                    WorkoutSession.prepare_session(request, workout_data['name'], workout_data['exercises'], builder)
+                    for workout_data in routine_data['workouts']
+                ]
+                builder.validate()
+                for workout_session in workout_sessions:
+                    workout_session.save()
+                builder.save()
+                # adding the instances to the workout plan instance
+                workout_plan.workouts.add(*workout_sessions)
 
                 workout_plan.save()
 
@@ -199,32 +246,48 @@ class Routine(models.Model):
 
     @staticmethod
     def create_routine(request, routine_name: str, workouts: list[dict]):
+        from server.workouts.bulk import ExerciseTreeBuilder
+
         with transaction.atomic():
-            # Create the routine
-            routine = Routine.objects.create(name=routine_name)
+            builder = ExerciseTreeBuilder(request.user.profile, user=request.user)
+            existing_workouts = {
+                str(workout_id): workout_instance
+                for workout_id, workout_instance in WorkoutTemplate.objects.in_bulk([
+                    workout_data["workout"]["id"] for workout_data in workouts if workout_data["workout"].get("id")
+                ]).items()
+            }
+            prepared_templates = []
+            routine_workouts = []
 
             for workout_data in workouts:
                 day = workout_data["day"]
                 workout_info = workout_data["workout"]
 
                 # Check if workout already exists
-                workout_id = workout_info.get("id")
-                if workout_id:
-                    try:
-                        workout_instance = WorkoutTemplate.objects.get(id=workout_id)
-                    except WorkoutTemplate.DoesNotExist:
-                        workout_instance = None
-                else:
-                    workout_instance = None
+                workout_instance = existing_workouts.get(str(workout_info.get("id")))
 
                 # Create workout if not found
                 if not workout_instance:
                     workout_name = workout_info["name"]
                     exercises = workout_info["exercises"]
-                    workout_instance = WorkoutTemplate.create_workout_template(request, workout_name, exercises)
+                    workout_instance = WorkoutTemplate.prepare_workout_template(request, workout_name, exercises,
+                                                                                builder)
+                    prepared_templates.append(workout_instance)
+
+                routine_workouts.append((workout_instance, day))
 
-                # Link workout to routine with the correct day
-                RoutineWorkout.objects.create(routine=routine, workout=workout_instance, day_of_week=day)
+            # all the new workouts are validated before anything is written
+            builder.validate()
+
+            # Create the routine
+            routine = Routine.objects.create(name=routine_name)
+            WorkoutTemplate.save_prepared_templates(prepared_templates, builder)
+
+            # Link workouts to routine with the correct day
+            RoutineWorkout.objects.bulk_create([
+                RoutineWorkout(routine=routine, workout=workout_instance, day_of_week=day)
+                for workout_instance, day in routine_workouts
+            ])
 
             return routine  # Return the created routine
 
@@ -266,18 +329,3 @@ class TemplateWorkoutSession(models.Model):
     workout_session = models.ForeignKey(WorkoutSession, on_delete=models.CASCADE)
     created_by = models.ForeignKey(Profile, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
-
-    @staticmethod
-    def create(request, template_id, workout_data):
-        try:
-            template = WorkoutTemplate.objects.get(pk=template_id)
-        except WorkoutTemplate.DoesNotExist:
-            raise WorkoutTemplate.DoesNotExist()
-        workout_session = WorkoutSession.create_session(request, template.name, workout_data, workout_template=template)
-        template_instance = TemplateWorkoutSession.objects.create(
-            template=template,
-            workout_session=workout_session,
-            created_by=request.user.profile
-        )
-        template_instance.save()
-        return template_instance
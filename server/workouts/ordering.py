@@ -0,0 +1,97 @@
+from django.db import connection, transaction
+from django.db.models import F
+
+# The items of an exercise session are ordered with gaps between them, so an item can be
+# moved between two others by writing only its own order (the midpoint of its neighbours).
+# The session keeps the last order it handed out in `next_item_order`, which is incremented
+# atomically - concurrent inserts never get the same position and no aggregate is needed.
+ORDER_GAP = 1024
+
+
+def get_item_order(index):
+    """Order of the item at `index` in a freshly created (or renumbered) session."""
+    return (index + 1) * ORDER_GAP
+
+
+def allocate_item_orders(exercise_session, count=1):
+    """
+    Reserves `count` positions at the end of the session with a single atomic increment.
+    Returns the first reserved order, the next ones follow every ORDER_GAP.
+    """
+    from server.workouts.models import ExerciseSession
+
+    step = count * ORDER_GAP
+    if connection.vendor in ('postgresql', 'sqlite') and connection.features.can_return_columns_from_insert:
+        quote_name = connection.ops.quote_name
+        column = quote_name(ExerciseSession._meta.get_field('next_item_order').column)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {quote_name(ExerciseSession._meta.db_table)} SET {column} = {column} + %s '
+                f'WHERE {quote_name(ExerciseSession._meta.pk.column)} = %s RETURNING {column}',
+                [step, exercise_session.pk],
+            )
+            last_order = cursor.fetchone()[0]
+    else:
+        # the row stays locked by the UPDATE until the end of the transaction
+        with transaction.atomic():
+            ExerciseSession.objects.filter(pk=exercise_session.pk).update(
+                next_item_order=F('next_item_order') + step
+            )
+            last_order = ExerciseSession.objects.values_list('next_item_order', flat=True).get(pk=exercise_session.pk)
+
+    exercise_session.next_item_order = last_order
+    return last_order - step + ORDER_GAP
+
+
+def renumber_session_items(exercise_session_id):
+    """Spreads the items of the session evenly again. Only needed once the gaps are used up."""
+    from server.workouts.models import ExerciseSession, ExerciseSessionItem
+
+    session_items = list(ExerciseSessionItem.objects.filter(
+        exercise_session_id=exercise_session_id
+    ).order_by('order', 'pk').only('pk', 'order'))
+    for index, session_item in enumerate(session_items):
+        session_item.order = get_item_order(index)
+    ExerciseSessionItem.objects.bulk_update(session_items, ['order'])
+    ExerciseSession.objects.filter(pk=exercise_session_id).update(next_item_order=get_item_order(len(session_items) - 1))
+    return {session_item.pk: session_item.order for session_item in session_items}
+
+
+def move_session_item(session_item, after_item=None):
+    """
+    Moves the item right after `after_item`, or to the top of the session when it is None.
+    Writes only the moved item, unless there is no gap left between its new neighbours.
+    """
+    from server.sync.changes import record_exercise_sessions_changes
+    from server.workouts.models import ExerciseSession, ExerciseSessionItem
+
+    exercise_session_id = session_item.exercise_session_id
+    if after_item is not None and after_item.exercise_session_id != exercise_session_id:
+        raise ValueError("Items can only be moved within their exercise session")
+
+    with transaction.atomic():
+        # moves within the same session are serialized, so two of them never pick the same midpoint
+        exercise_session = ExerciseSession.objects.select_for_update().only('pk').get(pk=exercise_session_id)
+        other_items = ExerciseSessionItem.objects.filter(exercise_session_id=exercise_session_id).exclude(
+            pk=session_item.pk
+        )
+        lower_order = 0 if after_item is None else after_item.order
+        upper_order = other_items.filter(order__gt=lower_order).order_by('order').values_list(
+            'order', flat=True
+        ).first()
+
+        if upper_order is None:
+            new_order = allocate_item_orders(exercise_session)
+        elif upper_order - lower_order > 1:
+            new_order = (lower_order + upper_order) // 2
+        else:
+            orders = renumber_session_items(exercise_session_id)
+            if after_item is not None:
+                after_item.order = orders[after_item.pk]
+            session_item.order = orders[session_item.pk]
+            return move_session_item(session_item, after_item)
+
+        ExerciseSessionItem.objects.filter(pk=session_item.pk).update(order=new_order)
+        session_item.order = new_order
+        record_exercise_sessions_changes([exercise_session_id])
+        return session_item
@@ -0,0 +1,137 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import prefetch_related_objects, F, Window
+from django.db.models.functions import RowNumber
+
+LAST_HISTORY_ATTR = 'last_history'
+
+
+def get_content_type_model(instance):
+    """
+    Returns the model name of a generic relation (e.g. 'exercisesession', 'set')
+    without hitting the database - content types are served from Django's cache.
+    """
+    return ContentType.objects.get_for_id(instance.content_type_id).model
+
+
+def prefetch_exercise_sessions(exercise_sessions, with_last_history=True):
+    """
+    Loads the exercise, the session items and the items' targets (Set, Rest, Interval)
+    for all the given exercise sessions at once - one query per relation/content type.
+    """
+    exercise_sessions = list(exercise_sessions)
+    if not exercise_sessions:
+        return exercise_sessions
+    prefetch_related_objects(
+        exercise_sessions,
+        'exercise__targeted_muscle_groups',
+        'exercisesessionitem_set__item',
+    )
+    if not with_last_history:
+        return exercise_sessions
+    prefetch_last_set_history(
+        session_item.item
+        for exercise_session in exercise_sessions
+        for session_item in exercise_session.exercisesessionitem_set.all()
+        if get_content_type_model(session_item) == 'set' and session_item.item is not None
+    )
+    return exercise_sessions
+
+
+def prefetch_last_set_history(sets):
+    """
+    Attaches to every set the historical row that `set.history.last()` would return,
+    fetched for all the sets with a single window query.
+    """
+    from server.workouts.models import Set
+
+    sets = [set_instance for set_instance in sets if not hasattr(set_instance, LAST_HISTORY_ATTR)]
+    if not sets:
+        return sets
+    # the history is ordered by ('-history_date', '-history_id'), so .last() is the first row of each set
+    history_rows = Set.history.filter(id__in={set_instance.pk for set_instance in sets}).annotate(
+        row_number=Window(
+            expression=RowNumber(),
+            partition_by=[F('id')],
+            order_by=[F('history_date').asc(), F('history_id').asc()],
+        )
+    ).filter(row_number=1)
+    last_history_by_set_id = {history_row.id: history_row for history_row in history_rows}
+    for set_instance in sets:
+        setattr(set_instance, LAST_HISTORY_ATTR, last_history_by_set_id.get(set_instance.pk))
+    return sets
+
+
+def get_last_set_history(set_instance):
+    """Returns the prefetched `set.history.last()` row, querying only when it was not prefetched."""
+    if not hasattr(set_instance, LAST_HISTORY_ATTR):
+        prefetch_last_set_history([set_instance])
+    return getattr(set_instance, LAST_HISTORY_ATTR)
+
+
+def prefetch_exercise_items(exercise_items, with_last_history=True):
+    """
+    Resolves the generic content objects of WorkoutExerciseSession/WorkoutTemplateExerciseItem
+    rows in bulk, including the exercise sessions nested in supersets.
+    """
+    exercise_items = list(exercise_items)
+    if not exercise_items:
+        return exercise_items
+    prefetch_related_objects(exercise_items, 'content_object')
+
+    exercise_sessions = []
+    superset_sessions = []
+    for exercise_item in exercise_items:
+        content_object = exercise_item.content_object
+        if content_object is None:
+            continue
+        if get_content_type_model(exercise_item) == 'supersetsession':
+            superset_sessions.append(content_object)
+        else:
+            exercise_sessions.append(content_object)
+
+    if superset_sessions:
+        prefetch_related_objects(superset_sessions, 'exercises')
+        for superset_session in superset_sessions:
+            exercise_sessions.extend(superset_session.exercises.all())
+
+    prefetch_exercise_sessions(exercise_sessions, with_last_history)
+    return exercise_items
+
+
+def prefetch_workout_exercises(workouts, with_last_history=True):
+    """
+    Loads the whole exercise tree of workout sessions or workout templates
+    with a constant number of queries, no matter how big the workouts are.
+    """
+    workouts = list(workouts)
+    if not workouts:
+        return workouts
+    prefetch_related_objects(workouts, 'exercises')
+    prefetch_exercise_items(
+        (exercise_item for workout in workouts for exercise_item in workout.exercises.all()), with_last_history
+    )
+    return workouts
+
+
+def prefetch_workout_plans(workout_plans, fieldsets=None):
+    """
+    Loads the authors and the workouts of the plans together with the snapshots of their exercise trees,
+    leaving out the branches the fieldsets do not render, see server.workouts.fieldsets.
+    """
+    from server.workouts.fieldsets import Fieldsets
+    from server.workouts.snapshots import prefetch_workout_snapshots
+
+    workout_plans = list(workout_plans)
+    if not workout_plans:
+        return workout_plans
+    fieldsets = fieldsets or Fieldsets()
+    if fieldsets.includes('created_by'):
+        prefetch_related_objects(workout_plans, 'created_by__user')
+    if not fieldsets.expands('workouts'):
+        return workout_plans
+    prefetch_related_objects(workout_plans, 'workouts')
+    if fieldsets.child('workouts').expands('exercises'):
+        prefetch_workout_snapshots(
+            workout for workout_plan in workout_plans for workout in workout_plan.workouts.all()
+        )
+    return workout_plans
@@ -0,0 +1,226 @@
+from datetime import datetime, time, timedelta
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from server.utils import get_upsert_options, iterate_in_chunks
+from server.workouts.totals import get_set_volume
+
+# The progress rollups are recomputed from the sets of the touched (profile, exercise, day)s
+# once per transaction, when it commits, so a workout edit costs a few queries however many sets it touches.
+PROGRESS_CHUNK_SIZE = 500
+PROGRESS_RESOLUTIONS = ('day', 'week', 'month')
+PROGRESS_FIELDS = ('sets_count', 'total_reps', 'total_volume', 'top_set_weight', 'top_set_reps',
+                   'estimated_one_rep_max')
+
+
+def estimate_one_rep_max(weight, reps):
+    """Epley's formula, a single rep is the lifted weight itself."""
+    if not weight or not reps:
+        return None
+    if reps == 1:
+        return float(weight)
+    return round(weight * (1 + reps / 30), 2)
+
+
+def get_day(created_at):
+    return timezone.localdate(created_at)
+
+
+def get_day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def get_pending_progress():
+    connection = transaction.get_connection()
+    if not hasattr(connection, 'pending_exercise_progress'):
+        connection.pending_exercise_progress = {'sessions': set(), 'days': set(), 'registered_in': None}
+    return connection.pending_exercise_progress
+
+
+def schedule_progress_update(exercise_session_ids=(), days=()):
+    """
+    Marks exercise sessions or (profile_id, exercise_id, day)s for a progress update when the
+    transaction commits (right away outside of a transaction).
+    """
+    connection = transaction.get_connection()
+    pending = get_pending_progress()
+    pending['sessions'].update(exercise_session_ids)
+    pending['days'].update(days)
+    # The flush is registered once per transaction. The queue of on_commit callbacks it was added to
+    # is replaced when the transaction commits or rolls back (or rolls back a savepoint), then the next
+    # update registers it again. Whatever is left behind by a rollback is recomputed with the next commit.
+    if not connection.in_atomic_block or pending['registered_in'] is not connection.run_on_commit:
+        transaction.on_commit(flush_progress_updates)
+        pending['registered_in'] = connection.run_on_commit if connection.in_atomic_block else None
+
+
+def flush_progress_updates():
+    pending = get_pending_progress()
+    pending['registered_in'] = None
+    if not pending['sessions'] and not pending['days']:
+        return
+    exercise_session_ids, days = pending['sessions'], pending['days']
+    pending['sessions'], pending['days'] = set(), set()
+    update_progress_days(days | get_sessions_days(exercise_session_ids))
+
+
+def get_sessions_days(exercise_session_ids):
+    from server.workouts.models import ExerciseSession
+
+    days = set()
+    for chunk in iterate_in_chunks(exercise_session_ids, PROGRESS_CHUNK_SIZE):
+        for profile_id, exercise_id, created_at in ExerciseSession.objects.filter(pk__in=chunk).values_list(
+                'profile_id', 'exercise_id', 'created_at'):
+            days.add((profile_id, exercise_id, get_day(created_at)))
+    return days
+
+
+def get_workout_exercise_sessions_filter(prefix=''):
+    """
+    Matches the exercise sessions logged in a workout session, directly or through a superset.
+    The template exercise sessions are plans, not progress.
+    """
+    from server.workouts.models import ExerciseSession, SupersetSession, WorkoutExerciseSession
+
+    exercise_content_type = ContentType.objects.get_for_model(ExerciseSession)
+    superset_content_type = ContentType.objects.get_for_model(SupersetSession)
+    superset_ids = WorkoutExerciseSession.objects.filter(content_type=superset_content_type).values('object_id')
+    return (
+        Q(**{f'{prefix}pk__in': WorkoutExerciseSession.objects.filter(
+            content_type=exercise_content_type
+        ).values('object_id')}) |
+        Q(**{f'{prefix}pk__in': SupersetSession.exercises.through.objects.filter(
+            supersetsession_id__in=superset_ids
+        ).values('exercisesession_id')})
+    )
+
+
+def calculate_progress_days(days):
+    """Returns {(profile_id, exercise_id, day): fields} of the days with sets, from one query."""
+    from server.workouts.models import Set
+
+    if not days:
+        return {}
+    sets = Set.objects.filter(
+        session_items__exercise_session__profile_id__in={profile_id for profile_id, _, _ in days},
+        session_items__exercise_session__exercise_id__in={exercise_id for _, exercise_id, _ in days},
+        session_items__exercise_session__created_at__gte=get_day_start(min(day for _, _, day in days)),
+        session_items__exercise_session__created_at__lt=get_day_start(
+            max(day for _, _, day in days) + timedelta(days=1)
+        ),
+    ).filter(get_workout_exercise_sessions_filter('session_items__exercise_session__')).values_list(
+        'session_items__exercise_session__profile_id', 'session_items__exercise_session__exercise_id',
+        'session_items__exercise_session__created_at', 'weight', 'reps',
+    )
+
+    progress_days = {}
+    for profile_id, exercise_id, created_at, weight, reps in sets:
+        key = (profile_id, exercise_id, get_day(created_at))
+        if key not in days:
+            continue
+        fields = progress_days.setdefault(key, {
+            'sets_count': 0, 'total_reps': 0, 'total_volume': 0,
+            'top_set_weight': None, 'top_set_reps': None, 'estimated_one_rep_max': None,
+        })
+        add_set_to_progress(fields, weight, reps)
+    return progress_days
+
+
+def add_set_to_progress(fields, weight, reps):
+    fields['sets_count'] += 1
+    fields['total_reps'] += reps or 0
+    fields['total_volume'] += get_set_volume(weight, reps)
+    if fields['top_set_weight'] is None or (weight or 0, reps or 0) > (fields['top_set_weight'] or 0,
+                                                                      fields['top_set_reps'] or 0):
+        fields['top_set_weight'], fields['top_set_reps'] = weight, reps
+    one_rep_max = estimate_one_rep_max(weight, reps)
+    if one_rep_max is not None and (fields['estimated_one_rep_max'] or 0) < one_rep_max:
+        fields['estimated_one_rep_max'] = one_rep_max
+
+
+def update_progress_days(days):
+    """Recomputes the rollups of the (profile_id, exercise_id, day)s, removing the ones left without sets."""
+    from server.workouts.models import ExerciseProgressDay
+
+    days = set(days)
+    if not days:
+        return
+    progress_days = calculate_progress_days(days)
+    with transaction.atomic():
+        stored_days = ExerciseProgressDay.objects.filter(
+            profile_id__in={profile_id for profile_id, _, _ in days},
+            exercise_id__in={exercise_id for _, exercise_id, _ in days},
+            day__range=(min(day for _, _, day in days), max(day for _, _, day in days)),
+        ).values_list('pk', 'profile_id', 'exercise_id', 'day')
+        emptied_ids = [pk for pk, *key in stored_days if tuple(key) in days and tuple(key) not in progress_days]
+        if emptied_ids:
+            ExerciseProgressDay.objects.filter(pk__in=emptied_ids).delete()
+        ExerciseProgressDay.objects.bulk_create(
+            [
+                ExerciseProgressDay(profile_id=profile_id, exercise_id=exercise_id, day=day, **fields)
+                for (profile_id, exercise_id, day), fields in progress_days.items()
+            ],
+            batch_size=PROGRESS_CHUNK_SIZE,
+            **get_upsert_options(['profile', 'exercise', 'day'], PROGRESS_FIELDS),
+        )
+
+
+def rebuild_progress(profile_ids, stdout=None):
+    """Recomputes every rollup of the profiles, e.g. for the workouts logged before the rollups existed."""
+    from server.workouts.models import ExerciseSession, ExerciseProgressDay
+
+    for profile_id in profile_ids:
+        days = {
+            (profile_id, exercise_id, get_day(created_at))
+            for exercise_id, created_at in ExerciseSession.objects.filter(profile_id=profile_id).filter(
+                get_workout_exercise_sessions_filter()
+            ).values_list('exercise_id', 'created_at').iterator()
+        }
+        with transaction.atomic():
+            ExerciseProgressDay.objects.filter(profile_id=profile_id).delete()
+            for exercise_id in {exercise_id for _, exercise_id, _ in days}:
+                update_progress_days(key for key in days if key[1] == exercise_id)
+        if stdout is not None:
+            stdout.write(f"Rebuilt {len(days)} progress days of profile {profile_id}")
+
+
+def get_period_start(day, resolution):
+    if resolution == 'week':
+        return day - timedelta(days=day.weekday())
+    if resolution == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def get_progress_series(profile, exercise_id, resolution='day', start=None, end=None):
+    """
+    The rollups of an exercise read with a single range query over the unique index,
+    merged per week or month when asked to.
+    """
+    from server.workouts.models import ExerciseProgressDay
+
+    progress_days = ExerciseProgressDay.objects.filter(profile=profile, exercise_id=exercise_id)
+    if start is not None:
+        progress_days = progress_days.filter(day__gte=start)
+    if end is not None:
+        progress_days = progress_days.filter(day__lte=end)
+
+    series = {}
+    for values in progress_days.order_by('day').values('day', *PROGRESS_FIELDS).iterator():
+        period_start = get_period_start(values['day'], resolution)
+        if period_start not in series:
+            series[period_start] = {'date': period_start, **{field: values[field] for field in PROGRESS_FIELDS}}
+            continue
+        point = series[period_start]
+        point['sets_count'] += values['sets_count']
+        point['total_reps'] += values['total_reps']
+        point['total_volume'] += values['total_volume']
+        if (values['top_set_weight'] or 0, values['top_set_reps'] or 0) > (point['top_set_weight'] or 0,
+                                                                          point['top_set_reps'] or 0):
+            point['top_set_weight'], point['top_set_reps'] = values['top_set_weight'], values['top_set_reps']
+        if (values['estimated_one_rep_max'] or 0) > (point['estimated_one_rep_max'] or 0):
+            point['estimated_one_rep_max'] = values['estimated_one_rep_max']
+    return list(series.values())
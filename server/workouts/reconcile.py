@@ -0,0 +1,178 @@
+from collections import defaultdict
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import PermissionDenied
+from django.db import transaction
+from simple_history.utils import bulk_update_with_history
+
+# Finishing a workout sends its whole exercise tree. The payload is matched against the stored
+# tree with dicts keyed by id, so the removed, kept and new exercises are found in one pass,
+# and the changes are written with a bulk statement per table however big the workout is.
+
+
+def get_payload_id(data):
+    """The id of a stored session, the new ones come without one (or with a temporary client id)."""
+    session_id = data.get('id')
+    return session_id if isinstance(session_id, int) else None
+
+
+def split_session_items(session_data):
+    """Splits an exercise session payload into the patches of its stored items and its new items."""
+    patches = []
+    new_items = []
+    for item in session_data or []:
+        if 'id' not in item:
+            new_items.append(item)
+        elif item.get('data'):
+            patches.append({'type': item.get('type'), 'id': item['id'], 'data': item['data']})
+    return patches, new_items
+
+
+def delete_exercise_sessions(exercise_session_ids, user=None):
+    """Deletes the exercise sessions with their sets, rests and intervals, with a statement per table."""
+    from server.workouts.bulk import bulk_delete_with_history
+    from server.workouts.models import ExerciseSession, ExerciseSessionItem, Set, Rest, Interval
+
+    session_items = ExerciseSessionItem.objects.filter(exercise_session_id__in=exercise_session_ids)
+    item_ids = defaultdict(list)
+    for model_name, object_id in session_items.values_list('content_type__model', 'object_id'):
+        item_ids[model_name].append(object_id)
+    session_items.delete()
+    if item_ids['set']:
+        bulk_delete_with_history(Set.objects.filter(pk__in=item_ids['set']), user=user)
+    if item_ids['rest']:
+        Rest.objects.filter(pk__in=item_ids['rest']).delete()
+    if item_ids['interval']:
+        Interval.objects.filter(pk__in=item_ids['interval']).delete()
+    # the deleted sessions schedule the update of their progress days
+    ExerciseSession.objects.filter(pk__in=exercise_session_ids).delete()
+
+
+def reconcile_workout_exercises(request, workout_session, exercises):
+    """
+    Brings the exercises of the workout session in line with the payload of its finished version:
+    the exercises and superset members left out of it are removed, the notes and the items of the
+    kept ones are updated and the new ones are created. Returns the workout session.
+    """
+    from server.workouts.batch_edit import edit_session_items
+    from server.workouts.bulk import ExerciseTreeBuilder
+    from server.workouts.models import ExerciseSession, SupersetSession, WorkoutExerciseSession
+    from server.workouts.totals import calculate_workout_totals, suspend_totals_tracking
+
+    profile = request.user.profile
+    if workout_session.created_by_id != profile.pk:
+        raise PermissionDenied("You can only finish your own workouts!")
+
+    content_type_ids = {
+        'exercise': ContentType.objects.get_for_model(ExerciseSession).pk,
+        'superset': ContentType.objects.get_for_model(SupersetSession).pk,
+    }
+    stored_exercise_items = {
+        (content_type_id, object_id): pk
+        for pk, content_type_id, object_id in WorkoutExerciseSession.objects.filter(
+            workout_session=workout_session
+        ).values_list('pk', 'content_type_id', 'object_id')
+    }
+
+    kept_exercise_items = {}
+    new_exercises = []
+    for data in exercises:
+        session_type = data.get('session_type')
+        if session_type not in content_type_ids:
+            continue
+        key = (content_type_ids[session_type], get_payload_id(data))
+        if key in stored_exercise_items:
+            kept_exercise_items[key] = data
+        else:
+            new_exercises.append(data)
+    removed_exercise_items = [key for key in stored_exercise_items if key not in kept_exercise_items]
+    removed_exercise_item_ids = [stored_exercise_items[key] for key in removed_exercise_items]
+    removed_superset_ids = [
+        object_id for content_type_id, object_id in removed_exercise_items
+        if content_type_id == content_type_ids['superset']
+    ]
+    removed_session_ids = {
+        object_id for content_type_id, object_id in removed_exercise_items
+        if content_type_id == content_type_ids['exercise']
+    }
+    if removed_superset_ids:
+        removed_session_ids.update(SupersetSession.exercises.through.objects.filter(
+            supersetsession_id__in=removed_superset_ids
+        ).values_list('exercisesession_id', flat=True))
+
+    session_payloads = {
+        object_id: data for (content_type_id, object_id), data in kept_exercise_items.items()
+        if content_type_id == content_type_ids['exercise']
+    }
+    superset_payloads = {
+        object_id: data for (content_type_id, object_id), data in kept_exercise_items.items()
+        if content_type_id == content_type_ids['superset']
+    }
+    stored_members = defaultdict(set)
+    if superset_payloads:
+        for superset_id, exercise_session_id in SupersetSession.exercises.through.objects.filter(
+                supersetsession_id__in=superset_payloads).values_list('supersetsession_id', 'exercisesession_id'):
+            stored_members[superset_id].add(exercise_session_id)
+
+    builder = ExerciseTreeBuilder(profile, user=request.user)
+    removed_members = {}
+    for superset_id, data in superset_payloads.items():
+        new_members = []
+        for member in data.get('exercises') or []:
+            member_id = get_payload_id(member)
+            if member_id in stored_members[superset_id]:
+                session_payloads[member_id] = member
+            else:
+                new_members.append(member)
+        builder.add_to_superset(superset_id, new_members)
+        removed_members[superset_id] = stored_members[superset_id] - session_payloads.keys()
+
+    exercise_sessions = ExerciseSession.objects.in_bulk(list(session_payloads))
+    patches = []
+    edited_sessions = []
+    for exercise_session_id, data in session_payloads.items():
+        exercise_session = exercise_sessions[exercise_session_id]
+        session_patches, new_items = split_session_items(data.get('session_data'))
+        patches += session_patches
+        builder.add_items(exercise_session, new_items)
+        if 'notes' in data and data['notes'] != exercise_session.notes:
+            exercise_session.notes = data['notes']
+            edited_sessions.append(exercise_session)
+    edited_supersets = [
+        superset for superset in SupersetSession.objects.filter(pk__in=list(superset_payloads))
+        if superset_payloads[superset.pk].get('notes') != superset.notes
+    ] if superset_payloads else []
+    for superset in edited_supersets:
+        superset.notes = superset_payloads[superset.pk].get('notes')
+
+    if new_exercises:
+        builder.add(workout_session, new_exercises)
+    builder.validate()
+
+    # the totals are recomputed once at the end instead of applying a delta per removed row
+    with transaction.atomic(), suspend_totals_tracking():
+        if removed_exercise_item_ids:
+            WorkoutExerciseSession.objects.filter(pk__in=removed_exercise_item_ids).delete()
+        for exercise_session_ids in removed_members.values():
+            removed_session_ids.update(exercise_session_ids)
+        # the superset links of the removed sessions go with them
+        if removed_session_ids:
+            delete_exercise_sessions(removed_session_ids, user=request.user)
+        if removed_superset_ids:
+            SupersetSession.objects.filter(pk__in=removed_superset_ids).delete()
+
+        if edited_sessions:
+            bulk_update_with_history(edited_sessions, ExerciseSession, ['notes'], default_user=request.user)
+        if edited_supersets:
+            SupersetSession.objects.bulk_update(edited_supersets, ['notes'])
+        if patches:
+            edit_session_items(profile, patches, workout_id=workout_session.pk, user=request.user)
+        builder.save()
+
+        workout_session.total_sets, workout_session.total_weight_volume = calculate_workout_totals(
+            [workout_session.pk]
+        )[workout_session.pk]
+        workout_session.total_exercises = len(kept_exercise_items) + len(new_exercises)
+        # saving the workout also syncs it with its whole tree
+        workout_session.save(update_fields=['total_sets', 'total_weight_volume', 'total_exercises'])
+    return workout_session
@@ -0,0 +1,246 @@
+import re
+import unicodedata
+
+from django.db import connection, transaction
+from django.db.models import Count, Q
+
+from server.workouts.bulk import bulk_create_instances
+
+# Candidates are fetched from the token/trigram indexes with a LIMIT and only those are ranked,
+# so the cost of a keystroke does not depend on the size of the indexed tables.
+CANDIDATES_LIMIT = 200
+# the share of the query trigrams a name needs to be a typo candidate (pg_trgm defaults to 0.3 too)
+MIN_TRIGRAM_SIMILARITY = 0.3
+
+NON_WORD_CHARACTERS = re.compile(r'[^a-z0-9]+')
+
+
+def normalize(text):
+    """Lowercase ascii words, accents and punctuation are dropped."""
+    text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode('ascii').lower()
+    return ' '.join(NON_WORD_CHARACTERS.sub(' ', text).split())
+
+
+def get_trigrams(token):
+    # padded like pg_trgm, so the start of a word weighs more than its middle
+    padded = f'  {token} '
+    return {padded[index:index + 3] for index in range(len(padded) - 2)}
+
+
+def get_trigram_similarity(first_token, second_token):
+    first_trigrams = get_trigrams(first_token)
+    second_trigrams = get_trigrams(second_token)
+    return len(first_trigrams & second_trigrams) / len(first_trigrams | second_trigrams)
+
+
+def uses_postgres_trigrams():
+    return connection.vendor == 'postgresql'
+
+
+def get_search_models():
+    from server.workouts.models import Exercise, CustomExercise, WorkoutSession, WorkoutTemplate, SearchDocument
+
+    return {
+        SearchDocument.KIND_EXERCISE: Exercise,
+        SearchDocument.KIND_CUSTOM_EXERCISE: CustomExercise,
+        SearchDocument.KIND_WORKOUT: WorkoutSession,
+        SearchDocument.KIND_TEMPLATE: WorkoutTemplate,
+    }
+
+
+def get_document_visibility(kind, instance):
+    """Returns the (owner_id, is_public) of the document of an instance."""
+    from server.workouts.models import SearchDocument
+
+    if kind == SearchDocument.KIND_EXERCISE:
+        return None, True
+    if kind == SearchDocument.KIND_TEMPLATE:
+        return instance.created_by_id, instance.is_published
+    return instance.created_by_id, False
+
+
+def index_objects(kind, instances):
+    """(Re)indexes the instances of one kind with a bulk insert per table."""
+    from server.workouts.models import SearchDocument, SearchToken, SearchTrigram
+
+    instances = list(instances)
+    if not instances:
+        return []
+    with transaction.atomic():
+        SearchDocument.objects.filter(kind=kind, object_id__in=[instance.pk for instance in instances]).delete()
+        documents = []
+        for instance in instances:
+            owner_id, is_public = get_document_visibility(kind, instance)
+            documents.append(SearchDocument(
+                kind=kind,
+                object_id=instance.pk,
+                owner_id=owner_id,
+                is_public=is_public,
+                name=instance.name[:SearchDocument.MAX_LEN_NAME],
+                normalized_name=normalize(instance.name)[:SearchDocument.MAX_LEN_NAME],
+            ))
+        bulk_create_instances(SearchDocument, documents)
+
+        tokens = []
+        trigrams = []
+        for document in documents:
+            document_tokens = set(document.normalized_name.split())
+            tokens.extend(SearchToken(document=document, kind=kind, token=token) for token in document_tokens)
+            if not uses_postgres_trigrams():
+                trigrams.extend(
+                    SearchTrigram(document=document, kind=kind, trigram=trigram)
+                    for trigram in {trigram for token in document_tokens for trigram in get_trigrams(token)}
+                )
+        SearchToken.objects.bulk_create(tokens)
+        SearchTrigram.objects.bulk_create(trigrams)
+    return documents
+
+
+def index_object(kind, instance):
+    """Indexes a single instance, skipping the writes when its document is already up to date."""
+    from server.workouts.models import SearchDocument
+
+    owner_id, is_public = get_document_visibility(kind, instance)
+    indexed = SearchDocument.objects.filter(kind=kind, object_id=instance.pk).values_list(
+        'name', 'owner_id', 'is_public'
+    ).first()
+    if indexed == (instance.name[:SearchDocument.MAX_LEN_NAME], owner_id, is_public):
+        return
+    index_objects(kind, [instance])
+
+
+def remove_objects(kind, object_ids):
+    from server.workouts.models import SearchDocument
+
+    SearchDocument.objects.filter(kind=kind, object_id__in=object_ids).delete()
+
+
+def get_candidate_ids(query, kinds, scope):
+    from server.workouts.models import SearchDocument, SearchToken, SearchTrigram
+
+    query_tokens = query.split()
+    prefix_filter = Q()
+    for token in query_tokens:
+        prefix_filter |= Q(token__startswith=token)
+    # past the limit the names matching the query words exactly are kept first, then the newest ones
+    candidate_ids = set(SearchToken.objects.filter(kind__in=kinds).filter(prefix_filter).filter(
+        **{f'document__{key}': value for key, value in scope.items()}
+    ).values('document_id').annotate(
+        exact=Count('id', filter=Q(token__in=query_tokens)),
+        matched=Count('id'),
+    ).order_by('-exact', '-matched', '-document_id').values_list('document_id', flat=True)[:CANDIDATES_LIMIT])
+    if len(candidate_ids) >= CANDIDATES_LIMIT:
+        return candidate_ids
+
+    # typo tolerance - names sharing enough trigrams with the query
+    if uses_postgres_trigrams():
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        candidate_ids.update(SearchDocument.objects.filter(kind__in=kinds, **scope).filter(
+            normalized_name__trigram_similar=query
+        ).annotate(
+            similarity=TrigramSimilarity('normalized_name', query)
+        ).order_by('-similarity').values_list('pk', flat=True)[:CANDIDATES_LIMIT])
+    else:
+        query_trigrams = {trigram for token in query_tokens for trigram in get_trigrams(token)}
+        candidate_ids.update(SearchTrigram.objects.filter(
+            kind__in=kinds, trigram__in=query_trigrams
+        ).filter(
+            **{f'document__{key}': value for key, value in scope.items()}
+        ).values('document_id').annotate(
+            shared=Count('id')
+        ).filter(
+            shared__gte=max(1, int(len(query_trigrams) * MIN_TRIGRAM_SIMILARITY))
+        ).order_by('-shared').values_list('document_id', flat=True)[:CANDIDATES_LIMIT])
+    return candidate_ids
+
+
+def score_document(query, query_tokens, normalized_name):
+    """
+    Every query word scores 1 for an exact word of the name, 0.8 for a word it is the prefix of
+    and up to 0.7 for a similar word (a typo). Names starting with the whole query rank first.
+    """
+    name_tokens = normalized_name.split()
+    score = 0
+    for query_token in query_tokens:
+        best_score = 0
+        for name_token in name_tokens:
+            if name_token == query_token:
+                best_score = 1
+                break
+            if name_token.startswith(query_token):
+                best_score = max(best_score, 0.8)
+                continue
+            similarity = get_trigram_similarity(query_token, name_token)
+            if similarity >= MIN_TRIGRAM_SIMILARITY:
+                best_score = max(best_score, 0.7 * similarity)
+        score += best_score
+    score /= len(query_tokens)
+    if score and normalized_name.startswith(query):
+        score += 0.5
+    return score
+
+
+def get_search_page(request, default_page_size=20, max_page_size=50):
+    """Reads the `page` and `page_size` query params of the search endpoints."""
+    try:
+        page = max(int(request.query_params.get('page', 1)), 1)
+        page_size = min(max(int(request.query_params.get('page_size', default_page_size)), 1), max_page_size)
+    except ValueError:
+        return 1, default_page_size
+    return page, page_size
+
+
+def search_documents(text, kinds, scope, page=1, page_size=20):
+    """
+    Returns the page of ranked documents matching the text and whether there is a next page.
+    `scope` filters the documents, e.g. {'is_public': True} or {'owner': profile}.
+    """
+    from server.workouts.models import SearchDocument
+
+    query = normalize(text)
+    if not query:
+        return [], False
+    query_tokens = query.split()
+
+    documents = SearchDocument.objects.filter(pk__in=get_candidate_ids(query, kinds, scope)).only(
+        'pk', 'kind', 'object_id', 'name', 'normalized_name'
+    )
+    ranked = []
+    for document in documents:
+        score = score_document(query, query_tokens, document.normalized_name)
+        if score > 0:
+            ranked.append((-score, len(document.normalized_name), document.normalized_name, document.pk, document))
+    ranked.sort(key=lambda row: row[:4])
+
+    start = (page - 1) * page_size
+    return [row[-1] for row in ranked[start:start + page_size]], len(ranked) > start + page_size
+
+
+def load_documents_objects(documents, queryset=None):
+    """Returns the indexed instances of the documents (of a single kind) in the ranked order."""
+    if not documents:
+        return []
+    if queryset is None:
+        queryset = get_search_models()[documents[0].kind].objects.all()
+    instances = queryset.in_bulk([document.object_id for document in documents])
+    return [instances[document.object_id] for document in documents if document.object_id in instances]
+
+
+def rebuild_search_index(chunk_size=1000, stdout=None):
+    """Reindexes every searchable model, chunk by chunk."""
+    from server.workouts.models import SearchDocument
+
+    for kind, model in get_search_models().items():
+        SearchDocument.objects.filter(kind=kind).delete()
+        indexed = 0
+        last_pk = 0
+        while True:
+            chunk = list(model.objects.filter(pk__gt=last_pk).order_by('pk')[:chunk_size])
+            if not chunk:
+                break
+            index_objects(kind, chunk)
+            indexed += len(chunk)
+            last_pk = chunk[-1].pk
+        if stdout is not None:
+            stdout.write(f'Indexed {indexed} {kind} documents')
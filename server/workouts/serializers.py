@@ -2,18 +2,19 @@ from rest_framework import serializers
 
 from server.profiles.serializers import BaseProfileSerializer
 from server.utils import transform_timestamp
-from server.workouts.exercise_serializers import ExerciseSessionSerializerNameOnly, ExerciseSessionDetailsSerializer, \
-    BaseSupersetSessionSerializer
+from server.workouts.compiled import serialize_exercise_items
+from server.workouts.fieldsets import FieldsetsSerializerMixin
 from server.workouts.models import WorkoutPlan, WorkoutSession, MuscleGroup, CustomExercise, WorkoutTemplate
-from server.workouts.utils import get_serialized_exercises, serializer_exericses_for_session_or_template
+from server.workouts.utils import get_serialized_exercises
 
 
-class BaseWorkoutSessionSerializer(serializers.ModelSerializer):
+class BaseWorkoutSessionSerializer(FieldsetsSerializerMixin, serializers.ModelSerializer):
     created_at = serializers.SerializerMethodField()
 
     class Meta:
         model = WorkoutSession
         fields = ('name', 'id', 'total_exercises', 'total_sets', 'total_weight_volume', 'created_at',)
+        expandable_fields = ('exercises',)
 
     @staticmethod
     def get_created_at(obj):
@@ -37,18 +38,19 @@ class WorkoutListSerializer(BaseWorkoutSessionSerializer):
         fields = BaseWorkoutSessionSerializer.Meta.fields + ('exercises',)
 
     def get_exercises(self, obj):
-        return get_serialized_exercises(obj)
+        return self.select_fields('exercises', get_serialized_exercises(obj))
 
 
-class WorkoutTemplateListSerializer(serializers.ModelSerializer):
+class WorkoutTemplateListSerializer(FieldsetsSerializerMixin, serializers.ModelSerializer):
     exercises = serializers.SerializerMethodField()
 
     class Meta:
         fields = "__all__"
         model = WorkoutTemplate
+        expandable_fields = ('exercises',)
 
     def get_exercises(self, obj):
-        return get_serialized_exercises(obj)
+        return self.select_fields('exercises', get_serialized_exercises(obj))
 
 
 # old was BaseWorkoutSerializer
@@ -59,47 +61,40 @@ class WorkoutDetailsSerializer(BaseWorkoutSessionSerializer):
         fields = (*BaseWorkoutSessionSerializer.Meta.fields, 'exercises')
 
     def get_exercises(self, obj):
-        return get_serialized_exercises(obj)
+        return self.select_fields('exercises', get_serialized_exercises(obj))
 
 
 class WorkoutSessionDetailsSerializer(BaseWorkoutSessionSerializer):
     exercises = serializers.SerializerMethodField()
-    exercise_serializer = ExerciseSessionDetailsSerializer
-    superset_serializer = BaseSupersetSessionSerializer
 
     class Meta(BaseWorkoutSessionSerializer.Meta):
         fields = BaseWorkoutSessionSerializer.Meta.fields + ('exercises',)
 
     def get_exercises(self, obj):
-        exercises_for_fn = obj.exercises.all()
-        return serializer_exericses_for_session_or_template(exercises_for_fn,
-                                                            exercise_serializer=self.exercise_serializer,
-                                                            superset_serializer=self.superset_serializer)
+        # compiled from ExerciseSessionDetailsSerializer and BaseSupersetSessionSerializer
+        return self.select_fields('exercises', serialize_exercise_items(obj.exercises.all()))
 
 
-class WorkoutTemplateSerializer(serializers.ModelSerializer):
+class WorkoutTemplateSerializer(FieldsetsSerializerMixin, serializers.ModelSerializer):
     exercises = serializers.SerializerMethodField()
-    exercise_serializer = ExerciseSessionDetailsSerializer
-    superset_serializer = BaseSupersetSessionSerializer
 
     class Meta:
         model = WorkoutTemplate
         fields = "__all__"
+        expandable_fields = ('exercises',)
 
     def get_exercises(self, obj):
-        exercises_for_fn = obj.exercises.all()
-        return serializer_exericses_for_session_or_template(exercises_for_fn,
-                                                            exercise_serializer=self.exercise_serializer,
-                                                            superset_serializer=self.superset_serializer)
+        return self.select_fields('exercises', serialize_exercise_items(obj.exercises.all()))
 
 
-class BaseRoutineSerializer(serializers.ModelSerializer):
+class BaseRoutineSerializer(FieldsetsSerializerMixin, serializers.ModelSerializer):
     created_by = BaseProfileSerializer()
     created_at = serializers.SerializerMethodField()
 
     class Meta:
         model = WorkoutPlan
         fields = ("name", "id", "total_workouts", "workouts", "created_by", 'created_at')
+        expandable_fields = ('workouts',)
 
     @staticmethod
     def get_created_at(obj):
@@ -126,10 +121,13 @@ class RoutinesListSerializer(BaseRoutineSerializer):
         fields = BaseRoutineSerializer.Meta.fields + ('is_active',)
 
     def get_is_active(self, obj):
-        request = self.context.get('request')
-        profile = request.user.profile
-        profile_active_routine = profile.activeroutine_set.first()
-        return obj == profile_active_routine
+        # the active routine is looked up once for the whole list
+        if 'active_workout_plan_id' not in self.context:
+            request = self.context.get('request')
+            profile_active_routine = request.user.profile.activeroutine_set.first()
+            self.context['active_workout_plan_id'] = profile_active_routine.workout_plan_id \
+                if profile_active_routine else None
+        return obj.pk == self.context['active_workout_plan_id']
 
 
 class WorkoutPlanDetailsSerializer(BaseRoutineSerializer):
@@ -1,7 +1,9 @@
+from django.core.exceptions import ValidationError, PermissionDenied
 from rest_framework import generics as rest_generic_views, status, views
 from rest_framework.response import Response
 
 from server.map_data import empty_set
+from server.workouts.batch_edit import edit_session_items
 from server.workouts.models import ExerciseSession, Set
 from server.workouts.set_serializers import SetDetailsSerializer, EditSetSerializer
 from server.workouts.utils import convert_str_to_float
@@ -62,8 +64,32 @@ class EditSet(views.APIView):
             serializer = self.serializer_class(data=set_obj)
             serializer.is_valid(raise_exception=True)
 
-            updated_instance = Set.edit_data(request, set_instance, set_obj)
-            updated_instance.save()
+            Set.edit_data(request, set_instance, set_obj)
             return Response(status=status.HTTP_204_NO_CONTENT)
         except Set.DoesNotExist:
             return Response('There was an error updating the set!', status=status.HTTP_400_BAD_REQUEST)
+        except PermissionDenied as e:
+            return Response(str(e), status=status.HTTP_403_FORBIDDEN)
+
+
+class EditSessionItems(views.APIView):
+    """
+    Edits a batch of sets, rests and intervals of an exercise session (`session_id`)
+    or of a whole workout session (`workout_id`) in one transaction.
+    Expects {"items": [{"type": "set", "id": 1, "data": {"weight": 60, "reps": 10}}, ...]}.
+    """
+
+    def patch(self, request, *args, **kwargs):
+        try:
+            updated = edit_session_items(
+                request.user.profile,
+                request.data.get('items'),
+                exercise_session_id=kwargs.get('session_id'),
+                workout_id=kwargs.get('workout_id'),
+                user=request.user,
+            )
+        except ValidationError as e:
+            return Response(' '.join(e.messages), status=status.HTTP_400_BAD_REQUEST)
+        except PermissionDenied as e:
+            return Response(str(e), status=status.HTTP_403_FORBIDDEN)
+        return Response({'updated': updated}, status=status.HTTP_200_OK)
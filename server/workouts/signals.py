@@ -1,41 +1,225 @@
-from django.db.models.signals import post_save
-from django.dispatch import receiver, Signal
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, post_init, m2m_changed, pre_delete
+from django.dispatch import receiver
 
-from server.workouts.models import WorkoutPlan, WorkoutSession
-from server.workouts.utils import calculate_superset_session_total_volume, calculate_exercise_total_volume, \
-    calculate_superset_total_sets, calculate_exercise_total_sets
+from server.workouts.catalog import bump_catalog_version
+from server.workouts.models import Set, ExerciseSessionItem, WorkoutExerciseSession, SupersetSession, WorkoutSession, \
+    Exercise, MuscleGroup, CustomExercise, WorkoutTemplate, SearchDocument, ExerciseSession
+from server.workouts.search import index_object, index_objects, remove_objects
+from server.workouts.prefetch import get_content_type_model
+from server.workouts.progress import schedule_progress_update, get_day
+from server.workouts.totals import is_tracking_totals, get_set_volume, apply_totals_delta, \
+    get_workout_ids_for_sessions, get_workout_ids_for_supersets, calculate_exercise_item_totals, \
+    calculate_sessions_totals, sum_totals, recompute_workout_totals
 
+# The workout totals (total_sets, total_weight_volume) are kept up to date incrementally:
+# every change to a set, a session item or the workout structure applies its delta
+# with a single UPDATE, instead of walking the whole workout on every WorkoutSession.save().
 
+
+def get_session_item_volume(session_item):
+    if get_content_type_model(session_item) != 'set':
+        return 0
+    set_instance = session_item.item
+    if set_instance is None:
+        return 0
+    return get_set_volume(set_instance.weight, set_instance.reps)
+
+
+@receiver(post_init, sender=Set)
+def remember_loaded_set_volume(sender, instance, **kwargs):
+    # reading the attributes of a deferred set would cost a query per instance
+    if 'weight' in instance.__dict__ and 'reps' in instance.__dict__:
+        instance._loaded_volume = get_set_volume(instance.weight, instance.reps)
+    else:
+        instance._loaded_volume = None
+
+
+@receiver(post_save, sender=Set)
+def apply_set_volume_change(sender, instance, created, raw=False, **kwargs):
+    loaded_volume = instance._loaded_volume
+    new_volume = get_set_volume(instance.weight, instance.reps)
+    instance._loaded_volume = new_volume
+    # a new set counts towards the totals once it is added to a session
+    if created or raw or loaded_volume == new_volume or not is_tracking_totals():
+        return
+    exercise_session_ids = ExerciseSessionItem.objects.filter(
+        content_type=ContentType.objects.get_for_model(Set), object_id=instance.pk
+    ).values('exercise_session_id')
+    workout_ids = get_workout_ids_for_sessions(exercise_session_ids)
+    if loaded_volume is None:
+        recompute_workout_totals(WorkoutSession.objects.filter(pk__in=workout_ids))
+        return
+    apply_totals_delta(workout_ids, volume=new_volume - loaded_volume)
+
+
+@receiver(post_save, sender=ExerciseSessionItem)
+def add_session_item_to_totals(sender, instance, created, raw=False, **kwargs):
+    if not created or raw or not is_tracking_totals():
+        return
+    apply_totals_delta(get_workout_ids_for_sessions([instance.exercise_session_id]),
+                       sets=1, volume=get_session_item_volume(instance))
+
+
+@receiver(pre_delete, sender=ExerciseSessionItem)
+def remember_session_item_volume(sender, instance, **kwargs):
+    # when a set is deleted its session items may be deleted after it, so the volume is read beforehand
+    if is_tracking_totals():
+        instance._deleted_volume = get_session_item_volume(instance)
+
+
+@receiver(post_delete, sender=ExerciseSessionItem)
+def remove_session_item_from_totals(sender, instance, **kwargs):
+    if not is_tracking_totals():
+        return
+    apply_totals_delta(get_workout_ids_for_sessions([instance.exercise_session_id]),
+                       sets=-1, volume=-getattr(instance, '_deleted_volume', 0))
+
+
+@receiver(post_save, sender=WorkoutExerciseSession)
+def add_exercise_item_to_totals(sender, instance, created, raw=False, **kwargs):
+    if not created or raw or not is_tracking_totals():
+        return
+    sets, volume = calculate_exercise_item_totals(instance)
+    apply_totals_delta([instance.workout_session_id], sets=sets, volume=volume)
+
+
+@receiver(post_delete, sender=WorkoutExerciseSession)
+def remove_exercise_item_from_totals(sender, instance, **kwargs):
+    if not is_tracking_totals():
+        return
+    sets, volume = calculate_exercise_item_totals(instance)
+    apply_totals_delta([instance.workout_session_id], sets=-sets, volume=-volume)
+
+
+@receiver(m2m_changed, sender=SupersetSession.exercises.through)
+def apply_superset_exercises_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse or not is_tracking_totals():
+        return
+    if action == 'pre_clear':
+        pk_set = set(instance.exercises.values_list('pk', flat=True))
+    elif action not in ('post_add', 'post_remove') or not pk_set:
+        return
+    sets, volume = sum_totals(calculate_sessions_totals(list(pk_set)).values())
+    sign = 1 if action == 'post_add' else -1
+    apply_totals_delta(get_workout_ids_for_supersets([instance.pk]), sets=sign * sets, volume=sign * volume)
+
+
+# Any change to the exercises or the muscle groups invalidates the cached exercise catalog.
+# The version is bumped after the commit, so the catalog is never rebuilt from uncommitted data.
+# The custom exercises are not in the catalog.
+@receiver(post_save, sender=Exercise)
+@receiver(post_delete, sender=Exercise)
+@receiver(post_save, sender=MuscleGroup)
+@receiver(post_delete, sender=MuscleGroup)
+@receiver(m2m_changed, sender=Exercise.targeted_muscle_groups.through)
+def invalidate_exercise_catalog(sender, raw=False, action=None, **kwargs):
+    if raw or (action and action.startswith('pre_')):
+        return
+    transaction.on_commit(bump_catalog_version)
+
+
+# The search index follows the searchable names.
+SEARCH_KINDS = {
+    Exercise: SearchDocument.KIND_EXERCISE,
+    CustomExercise: SearchDocument.KIND_CUSTOM_EXERCISE,
+    WorkoutSession: SearchDocument.KIND_WORKOUT,
+    WorkoutTemplate: SearchDocument.KIND_TEMPLATE,
+}
+
+
+def get_search_fields(instance):
+    return instance.__dict__.get('name'), instance.__dict__.get('is_published')
+
+
+@receiver(post_init, sender=Exercise)
+@receiver(post_init, sender=CustomExercise)
+@receiver(post_init, sender=WorkoutSession)
+@receiver(post_init, sender=WorkoutTemplate)
+def remember_search_fields(sender, instance, **kwargs):
+    instance._search_fields = get_search_fields(instance)
+
+
+@receiver(post_save, sender=Exercise)
+@receiver(post_save, sender=CustomExercise)
 @receiver(post_save, sender=WorkoutSession)
-def calculate_routine_additions(sender, instance, created, **kwargs):
-    # NOTE: this is a workaround, the signal should not be triggered when the instance is created,
-    # because the workout does not have a data yet
+@receiver(post_save, sender=WorkoutTemplate)
+def index_search_document(sender, instance, created, raw=False, **kwargs):
+    search_fields = get_search_fields(instance)
+    # saving an object without renaming it does not touch the index
+    if raw or (not created and search_fields == instance._search_fields and search_fields[0] is not None):
+        return
+    instance._search_fields = search_fields
     if created:
+        index_objects(SEARCH_KINDS[sender], [instance])
+    else:
+        index_object(SEARCH_KINDS[sender], instance)
+
+
+@receiver(post_delete, sender=Exercise)
+@receiver(post_delete, sender=CustomExercise)
+@receiver(post_delete, sender=WorkoutSession)
+@receiver(post_delete, sender=WorkoutTemplate)
+def remove_search_document(sender, instance, **kwargs):
+    remove_objects(SEARCH_KINDS[sender], [instance.pk])
+
+
+# The exercise progress rollups follow the sets logged in workout sessions.
+# The touched sessions are collected and their days recomputed once, when the transaction commits.
+def get_exercise_item_session_ids(exercise_item):
+    if get_content_type_model(exercise_item) == 'supersetsession':
+        return list(SupersetSession.exercises.through.objects.filter(
+            supersetsession_id=exercise_item.object_id
+        ).values_list('exercisesession_id', flat=True))
+    return [exercise_item.object_id]
+
+
+@receiver(post_init, sender=Set)
+def remember_loaded_set_progress(sender, instance, **kwargs):
+    instance._loaded_progress = (instance.__dict__.get('weight'), instance.__dict__.get('reps'))
+
+
+@receiver(post_save, sender=Set)
+def schedule_set_progress_update(sender, instance, created, raw=False, **kwargs):
+    loaded_progress = instance._loaded_progress
+    instance._loaded_progress = (instance.weight, instance.reps)
+    # a new set counts once it is added to a session
+    if created or raw or loaded_progress == instance._loaded_progress:
+        return
+    schedule_progress_update(exercise_session_ids=ExerciseSessionItem.objects.filter(
+        content_type=ContentType.objects.get_for_model(Set), object_id=instance.pk
+    ).values_list('exercise_session_id', flat=True))
+
+
+@receiver(post_save, sender=ExerciseSessionItem)
+@receiver(post_delete, sender=ExerciseSessionItem)
+def schedule_session_item_progress_update(sender, instance, created=False, raw=False, **kwargs):
+    if raw or get_content_type_model(instance) != 'set' or kwargs['signal'] is post_save and not created:
+        return
+    schedule_progress_update(exercise_session_ids=[instance.exercise_session_id])
+
+
+@receiver(post_delete, sender=ExerciseSession)
+def schedule_deleted_session_progress_update(sender, instance, **kwargs):
+    schedule_progress_update(days=[(instance.profile_id, instance.exercise_id, get_day(instance.created_at))])
+
+
+@receiver(post_save, sender=WorkoutExerciseSession)
+@receiver(pre_delete, sender=WorkoutExerciseSession)
+def schedule_exercise_item_progress_update(sender, instance, created=False, raw=False, **kwargs):
+    # the sessions of a removed superset are read before its rows are gone
+    if raw or kwargs['signal'] is post_save and not created:
         return
+    schedule_progress_update(exercise_session_ids=get_exercise_item_session_ids(instance))
 
-    workout_total_weight_volume = 0
-    workout_total_sets = 0
-    exercise_sessions = instance.exercises.all()
-    for session in exercise_sessions:
-        session_type = session.content_type.model
-        session_instance = session.content_object
-
-        if session_type == 'supersetsession':
-            workout_total_weight_volume += calculate_superset_session_total_volume(session_instance)
-            workout_total_sets += calculate_superset_total_sets(session_instance)
-            continue
-        is_exercise_cardio = False
-        exercise_session_items = session_instance.exercisesessionitem_set.all()
-        if len(exercise_session_items) > 0:
-            is_exercise_cardio = exercise_session_items.first().content_type.model == 'interval'
-        workout_total_weight_volume += calculate_exercise_total_volume(session_instance, is_exercise_cardio)
-        workout_total_sets += calculate_exercise_total_sets(session_instance)
-
-    instance.total_weight_volume = workout_total_weight_volume
-    instance.total_sets = workout_total_sets
-    # disconnecting the signal, so i can save the instance without triggering the signal again and entering a recursion
-    Signal.disconnect(post_save, receiver=calculate_routine_additions, sender=WorkoutSession)
-
-    instance.save()
-    # reconnecting the signal
-    Signal.connect(post_save, receiver=calculate_routine_additions, sender=WorkoutSession)
+
+@receiver(m2m_changed, sender=SupersetSession.exercises.through)
+def schedule_superset_progress_update(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        return
+    if action == 'pre_clear':
+        pk_set = set(instance.exercises.values_list('pk', flat=True))
+    elif action not in ('post_add', 'post_remove') or not pk_set:
+        return
+    schedule_progress_update(exercise_session_ids=pk_set)
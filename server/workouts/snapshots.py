@@ -0,0 +1,136 @@
+from django.utils import timezone
+
+from server.utils import get_upsert_options
+
+# The details response and the list card summary of every workout session and template are kept
+# as a JSON snapshot, so rendering a workout reads one row instead of walking its generic relations.
+# The sync log flush invalidates the snapshots of the changed trees when a transaction commits
+# and the next read rebuilds them. The exercises are embedded, so a change of an exercise or of its
+# muscle groups invalidates the trees using it (see server.sync.signals). A snapshot is also stale
+# once SNAPSHOT_SCHEMA_VERSION was bumped.
+SNAPSHOT_SCHEMA_VERSION = 2
+SNAPSHOT_ATTR = 'snapshot_document'
+SNAPSHOT_BATCH_SIZE = 500
+
+
+def get_snapshot_models():
+    from server.workouts.models import WorkoutSession, WorkoutTemplate, WorkoutSnapshot
+
+    return {WorkoutSnapshot.KIND_WORKOUT: WorkoutSession, WorkoutSnapshot.KIND_TEMPLATE: WorkoutTemplate}
+
+
+def get_snapshot_kind(obj):
+    from server.workouts.models import WorkoutTemplate, WorkoutSnapshot
+
+    return WorkoutSnapshot.KIND_TEMPLATE if isinstance(obj, WorkoutTemplate) else WorkoutSnapshot.KIND_WORKOUT
+
+
+def is_fresh_snapshot(snapshot):
+    return snapshot is not None and snapshot.document is not None and \
+        snapshot.schema_version == SNAPSHOT_SCHEMA_VERSION
+
+
+def build_documents(kind, objects):
+    """Serializes the workouts or templates of a kind with their trees prefetched in bulk."""
+    from server.workouts.models import WorkoutSnapshot
+    from server.workouts.prefetch import prefetch_workout_exercises
+    from server.workouts.serializers import WorkoutSessionDetailsSerializer, WorkoutTemplateSerializer
+    from server.workouts.utils import get_serialized_exercises
+
+    details_serializer = WorkoutTemplateSerializer if kind == WorkoutSnapshot.KIND_TEMPLATE \
+        else WorkoutSessionDetailsSerializer
+    return {
+        obj.pk: {
+            'details': details_serializer(obj).data,
+            'summary': get_serialized_exercises(obj),
+        }
+        for obj in prefetch_workout_exercises(objects)
+    }
+
+
+def store_documents(kind, documents, snapshots):
+    """
+    Saves the rebuilt documents, unless their tree changed while they were built: the invalidation
+    then created the row or moved its invalidated_at, so the write below matches nothing.
+    """
+    from server.workouts.models import WorkoutSnapshot
+
+    WorkoutSnapshot.objects.bulk_create([
+        WorkoutSnapshot(kind=kind, object_id=object_id, schema_version=SNAPSHOT_SCHEMA_VERSION, document=document)
+        for object_id, document in documents.items() if object_id not in snapshots
+    ], batch_size=SNAPSHOT_BATCH_SIZE, ignore_conflicts=True)
+    for object_id, document in documents.items():
+        snapshot = snapshots.get(object_id)
+        if snapshot is not None:
+            WorkoutSnapshot.objects.filter(pk=snapshot.pk, invalidated_at=snapshot.invalidated_at).update(
+                schema_version=SNAPSHOT_SCHEMA_VERSION, document=document
+            )
+
+
+def get_snapshot_document(kind, object_id):
+    """The snapshot of one workout or template, rebuilt if stale. None when the object does not exist."""
+    from server.workouts.models import WorkoutSnapshot
+
+    snapshot = WorkoutSnapshot.objects.filter(kind=kind, object_id=object_id).first()
+    if is_fresh_snapshot(snapshot):
+        return snapshot.document
+    obj = get_snapshot_models()[kind].objects.filter(pk=object_id).first()
+    if obj is None:
+        return None
+    documents = build_documents(kind, [obj])
+    store_documents(kind, documents, {object_id: snapshot} if snapshot is not None else {})
+    return documents[object_id]
+
+
+def prefetch_workout_snapshots(objects):
+    """
+    Attaches their snapshots to workouts and templates with a query per kind, rebuilding the stale ones
+    in bulk. get_serialized_exercises then serves the list summaries from them.
+    """
+    from server.workouts.models import WorkoutSnapshot
+
+    objects = list(objects)
+    if not objects:
+        return objects
+    objects_by_kind = {}
+    for obj in objects:
+        objects_by_kind.setdefault(get_snapshot_kind(obj), {})[obj.pk] = obj
+
+    for kind, kind_objects in objects_by_kind.items():
+        snapshots = {
+            snapshot.object_id: snapshot
+            for snapshot in WorkoutSnapshot.objects.filter(kind=kind, object_id__in=list(kind_objects))
+        }
+        documents = {
+            object_id: snapshot.document for object_id, snapshot in snapshots.items()
+            if is_fresh_snapshot(snapshot)
+        }
+        stale_objects = [obj for object_id, obj in kind_objects.items() if object_id not in documents]
+        if stale_objects:
+            rebuilt_documents = build_documents(kind, stale_objects)
+            store_documents(kind, rebuilt_documents, snapshots)
+            documents.update(rebuilt_documents)
+        for object_id, obj in kind_objects.items():
+            setattr(obj, SNAPSHOT_ATTR, documents[object_id])
+    return objects
+
+
+def invalidate_snapshots(kind, object_ids):
+    """Marks the snapshots of the objects as stale with a single upsert."""
+    from server.workouts.models import WorkoutSnapshot
+
+    if not object_ids:
+        return
+    invalidated_at = timezone.now()
+    WorkoutSnapshot.objects.bulk_create(
+        [WorkoutSnapshot(kind=kind, object_id=object_id, invalidated_at=invalidated_at) for object_id in object_ids],
+        batch_size=SNAPSHOT_BATCH_SIZE,
+        **get_upsert_options(['kind', 'object_id'], ['document', 'invalidated_at']),
+    )
+
+
+def remove_snapshots(kind, object_ids):
+    from server.workouts.models import WorkoutSnapshot
+
+    if object_ids:
+        WorkoutSnapshot.objects.filter(kind=kind, object_id__in=object_ids).delete()
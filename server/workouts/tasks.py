@@ -1,16 +1,38 @@
+import io
+
 from celery import shared_task
 
-from server.cloudinary import upload_to_cloudinary
+from server.media import get_spool_storage, remove_spooled_file, upload_spooled_file
 from server.workouts.models import Exercise
-import base64
-from django.core.files.base import ContentFile
 
 
-@shared_task
-def upload_exercise_video_to_cloudinary(encoded_video, exercise_id):
+@shared_task(bind=True)
+def upload_exercise_video_to_cloudinary(self, spooled_name, exercise_id):
     exercise = Exercise.objects.get(pk=exercise_id)
-    video_data = base64.b64decode(encoded_video)
-    video_file = ContentFile(video_data, name='exercise_video_tutorial.mp4')
-    uploaded_video = upload_to_cloudinary(video_file)
-    exercise.video_tutorial = uploaded_video
+    exercise.video_tutorial = upload_spooled_file(self, spooled_name, resource_type='video')
     exercise.save()
+
+
+@shared_task(bind=True)
+def import_workout_history(self, profile_id, spooled_name, import_format):
+    """Imports a spooled history file, streamed from the spool storage and removed once imported."""
+    from server.profiles.models import Profile
+    from server.workouts.history_import import import_history
+
+    try:
+        profile = Profile.objects.select_related('user').get(pk=profile_id)
+        with get_spool_storage().open(spooled_name, 'rb') as spooled_file:
+            return import_history(
+                profile, io.TextIOWrapper(spooled_file, encoding='utf-8-sig', newline=''), import_format,
+                user=profile.user,
+                progress_callback=lambda progress: self.update_state(state='PROGRESS', meta=progress),
+            )
+    finally:
+        remove_spooled_file(spooled_name)
+
+
+@shared_task
+def remove_expired_idempotency_keys():
+    from server.workouts.idempotency import remove_expired_idempotency_records
+
+    return remove_expired_idempotency_records()
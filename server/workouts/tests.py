@@ -1,3 +1,1472 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.http import StreamingHttpResponse
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+
+from server.media import get_spool_storage, spool_upload
+from server.profiles.models import Profile
+from server.workouts.models import Exercise, MuscleGroup, CustomExercise, SearchDocument, WorkoutSession, Set, ExerciseSession, WorkoutTemplate, \
+    TemplateWorkoutSession, ExerciseSessionItem, ExerciseProgressDay, Rest, SupersetSession, WorkoutExerciseSession, \
+    WorkoutSnapshot, WorkoutPlan, IdempotencyRecord
+from server.workouts.batch_edit import ITEM_FIELD_PARSERS, get_scope_filter
+from server.workouts.compiled import serialize_exercise_items
+from server.workouts.exercise_serializers import ExerciseSessionDetailsSerializer, BaseSupersetSessionSerializer, \
+    ExerciseSessionSerializerNameOnly, SupersetSessionSerializerNameOnly
+from server.workouts.history_import import import_history
+from server.workouts.ordering import ORDER_GAP
+from server.workouts.progress import estimate_one_rep_max, flush_progress_updates, schedule_progress_update
+from server.workouts.serializers import WorkoutSessionDetailsSerializer
+from server.workouts.tasks import import_workout_history, remove_expired_idempotency_keys
+from server.workouts.snapshots import build_documents, invalidate_snapshots, store_documents
+from server.workouts.totals import calculate_workout_totals
+from server.workouts.utils import serializer_exericses_for_session_or_template
+
+UserModel = get_user_model()
+SPOOL_STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    'media_spool': {'BACKEND': 'django.core.files.storage.FileSystemStorage',
+                    'OPTIONS': {'location': tempfile.mkdtemp()}},
+}
+
+
+def build_exercise_payload(exercise, sets_count, order=0, with_sets=True):
+    session_data = []
+    for index in range(sets_count):
+        if with_sets:
+            session_data.append({'type': 'set', 'data': {
+                'weight': 60 + index, 'reps': 10, 'min_reps': 8, 'max_reps': 12,
+                'to_failure': False, 'bodyweight': False,
+            }})
+        session_data.append({'type': 'rest', 'data': {'minutes': 1, 'seconds': 30}})
+    return {
+        'session_type': 'exercise',
+        'order': order,
+        'exercise': {'id': exercise.id, 'name': exercise.name},
+        'session_data': session_data,
+    }
+
+
+def build_superset_payload(exercises, sets_count, order=0, with_sets=True):
+    return {
+        'session_type': 'superset',
+        'order': order,
+        'exercises': [build_exercise_payload(exercise, sets_count, with_sets=with_sets) for exercise in exercises],
+    }
+
+
+class WorkoutApiTestCase(APITestCase):
+    def setUp(self):
+        self.user = UserModel.objects.create_user(email='test@example.com', username='test_user',
+                                                  password='test_password')
+        self.profile = Profile.objects.create_profile(user=self.user)
+        self.client.force_authenticate(user=self.user)
+        self.exercises = [Exercise.objects.create(name=f'Exercise {index}') for index in range(12)]
+
+    def build_workout_payload(self, exercises_count, sets_count, with_superset=True, with_sets=True):
+        exercises = [build_exercise_payload(exercise, sets_count, order=index, with_sets=with_sets)
+                     for index, exercise in enumerate(self.exercises[:exercises_count])]
+        if with_superset:
+            exercises.append(build_superset_payload(self.exercises[-2:], sets_count, order=exercises_count,
+                                                    with_sets=with_sets))
+        return {'name': 'Push day', 'exercises': exercises}
+
+    def create_workout(self, exercises_count, sets_count, with_superset=True, with_sets=True):
+        response = self.client.post('/fitness/workout/create/',
+                                    self.build_workout_payload(exercises_count, sets_count, with_superset, with_sets),
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        return WorkoutSession.objects.get(pk=response.data['id'])
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(context.captured_queries), response
+
+
+class WorkoutSessionDetailsViewTests(WorkoutApiTestCase):
+    def test_details_return_the_whole_workout_tree(self):
+        workout = self.create_workout(exercises_count=2, sets_count=2)
+        response = self.client.get(f'/fitness/workout/session/{workout.id}/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        exercises = response.data['exercises']
+        self.assertEqual(len(exercises), 3)
+        self.assertEqual(exercises[0]['session_type'], 'exercise')
+        self.assertEqual([item['type'] for item in exercises[0]['session_data']], ['set', 'rest', 'set', 'rest'])
+        self.assertEqual(exercises[0]['session_data'][0]['data']['weight'], 60)
+        self.assertEqual(exercises[2]['session_type'], 'superset')
+        self.assertEqual(len(exercises[2]['exercises']), 2)
+
+    def test_details_query_count_does_not_grow_with_the_workout(self):
+        small_workout = self.create_workout(exercises_count=1, sets_count=1)
+        big_workout = self.create_workout(exercises_count=10, sets_count=5)
+
+        small_workout_queries, _ = self.count_queries(f'/fitness/workout/session/{small_workout.id}/')
+        big_workout_queries, _ = self.count_queries(f'/fitness/workout/session/{big_workout.id}/')
+
+        self.assertEqual(small_workout_queries, big_workout_queries)
+
+    def test_details_last_value_is_the_first_historical_row_of_the_set(self):
+        workout = self.create_workout(exercises_count=1, sets_count=1, with_superset=False)
+        set_instance = Set.objects.get()
+        set_instance.weight = 100
+        set_instance.save()
+
+        response = self.client.get(f'/fitness/workout/session/{workout.id}/')
+
+        set_item = response.data['exercises'][0]['session_data'][0]
+        self.assertEqual(set_item['data']['weight'], 100)
+        self.assertEqual(set_item['last']['weight'], set_instance.history.last().weight)
+        self.assertEqual(set_item['last']['weight'], 60)
+
+
+class WorkoutTotalsTests(WorkoutApiTestCase):
+    def test_created_workout_has_totals(self):
+        workout = self.create_workout(exercises_count=1, sets_count=2)
+
+        # 2 sets and 2 rests for the exercise, and the same for both superset exercises
+        self.assertEqual(workout.total_sets, 12)
+        self.assertEqual(workout.total_weight_volume, 3 * (60 * 10 + 61 * 10))
+
+    def test_editing_a_set_applies_the_volume_delta(self):
+        workout = self.create_workout(exercises_count=1, sets_count=2, with_superset=False)
+        set_instance = Set.objects.order_by('pk').first()
+
+        response = self.client.put(f'/fitness/exercise/session/update-set/{set_instance.id}/', {'data': {
+            'weight': '100', 'reps': 5, 'min_reps': 8, 'max_reps': 12,
+        }}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        workout.refresh_from_db()
+        self.assertEqual(workout.total_sets, 4)
+        self.assertEqual(workout.total_weight_volume, 100 * 5 + 61 * 10)
+
+    def test_deleting_a_set_removes_it_from_the_totals(self):
+        workout = self.create_workout(exercises_count=1, sets_count=2, with_superset=False)
+        set_instance = Set.objects.order_by('pk').first()
+
+        response = self.client.delete(f'/fitness/exercise/session/delete-set/{set_instance.id}/')
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        workout.refresh_from_db()
+        self.assertEqual(workout.total_sets, 3)
+        self.assertEqual(workout.total_weight_volume, 61 * 10)
+
+    def test_saving_a_workout_does_not_walk_its_exercises(self):
+        workout = self.create_workout(exercises_count=10, sets_count=3)
+
+        with CaptureQueriesContext(connection) as context:
+            workout.save()
+
+        self.assertEqual(len(context.captured_queries), 1)
+
+    def test_recompute_command_repairs_the_totals(self):
+        workout = self.create_workout(exercises_count=2, sets_count=2)
+        expected_totals = (workout.total_sets, workout.total_weight_volume)
+        WorkoutSession.objects.filter(pk=workout.pk).update(total_sets=0, total_weight_volume=0)
+
+        call_command('recompute_workout_totals', stdout=StringIO())
+
+        workout.refresh_from_db()
+        self.assertEqual((workout.total_sets, workout.total_weight_volume), expected_totals)
+
+
+class WorkoutBulkCreateTests(WorkoutApiTestCase):
+    def count_create_queries(self, url, payload):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(url, payload, format='json')
+        self.assertIn(response.status_code, (status.HTTP_200_OK, status.HTTP_201_CREATED), response.data)
+        return len(context.captured_queries)
+
+    def test_create_query_count_does_not_grow_with_the_workout(self):
+        # warms up the content types cache
+        self.create_workout(exercises_count=1, sets_count=1)
+        small_workout_queries = self.count_create_queries('/fitness/workout/create/',
+                                                          self.build_workout_payload(1, 1))
+        big_workout_queries = self.count_create_queries('/fitness/workout/create/',
+                                                        self.build_workout_payload(10, 5))
+
+        self.assertEqual(small_workout_queries, big_workout_queries)
+
+    def test_ids_are_allocated_when_the_backend_cannot_return_them(self):
+        self.create_workout(exercises_count=1, sets_count=1)
+        with mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False):
+            small_workout_queries = self.count_create_queries('/fitness/workout/create/',
+                                                              self.build_workout_payload(1, 1))
+            big_workout_queries = self.count_create_queries('/fitness/workout/create/',
+                                                            self.build_workout_payload(10, 5))
+
+        self.assertEqual(small_workout_queries, big_workout_queries)
+        workout = WorkoutSession.objects.order_by('-pk').first()
+        response = self.client.get(f'/fitness/workout/session/{workout.pk}/')
+        self.assertEqual(len(response.data['exercises']), 11)
+        self.assertEqual(workout.total_sets, 120)
+        self.assertEqual(Set.objects.count(), Set.history.count())
+
+    def test_created_sets_have_history(self):
+        self.create_workout(exercises_count=2, sets_count=3, with_superset=False)
+
+        self.assertEqual(Set.history.count(), 6)
+        self.assertEqual(ExerciseSession.history.count(), 2)
+
+    def test_template_is_created_with_its_supersets(self):
+        response = self.client.post('/fitness/workout/template/create/', self.build_workout_payload(1, 2),
+                                    format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        template = WorkoutTemplate.objects.get()
+        self.assertEqual(template.exercises.count(), 2)
+        self.assertEqual(template.total_sets, 12)
+        # the workout sessions are created when the template is started
+        self.assertFalse(WorkoutSession.objects.exists())
+
+    def test_invalid_exercise_is_rejected_before_anything_is_written(self):
+        payload = self.build_workout_payload(2, 2)
+        payload['exercises'][1]['exercise']['name'] = 'Unknown'
+
+        response = self.client.post('/fitness/workout/create/', payload, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(WorkoutSession.objects.exists())
+        self.assertFalse(ExerciseSession.objects.exists())
+        self.assertFalse(Set.objects.exists())
+
+
+class ExerciseSessionItemOrderingTests(WorkoutApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.workout = self.create_workout(exercises_count=1, sets_count=2, with_superset=False)
+        self.exercise_session = ExerciseSession.objects.get()
+
+    def get_item_ids(self):
+        return list(ExerciseSessionItem.objects.filter(exercise_session=self.exercise_session).order_by(
+            'order').values_list('pk', flat=True))
+
+    def test_created_items_are_spread_with_gaps(self):
+        orders = list(ExerciseSessionItem.objects.order_by('order').values_list('order', flat=True))
+
+        self.assertEqual(orders, [ORDER_GAP, 2 * ORDER_GAP, 3 * ORDER_GAP, 4 * ORDER_GAP])
+        self.assertEqual(self.exercise_session.next_item_order, 4 * ORDER_GAP)
+
+    def test_adding_sets_allocates_new_orders_without_aggregates(self):
+        with CaptureQueriesContext(connection) as context:
+            first_response = self.client.post(f'/fitness/exercise/session/add-set/{self.exercise_session.id}/')
+            second_response = self.client.post(f'/fitness/exercise/session/add-set/{self.exercise_session.id}/')
+
+        self.assertEqual(first_response.status_code, status.HTTP_200_OK)
+        self.assertEqual(second_response.status_code, status.HTTP_200_OK)
+        sql = ' '.join(query['sql'] for query in context.captured_queries).upper()
+        self.assertNotIn('COUNT(', sql)
+        self.assertNotIn('MAX(', sql)
+        orders = list(ExerciseSessionItem.objects.order_by('order').values_list('order', flat=True))
+        self.assertEqual(orders[-2:], [5 * ORDER_GAP, 6 * ORDER_GAP])
+        self.workout.refresh_from_db()
+        self.assertEqual(self.workout.total_sets, 6)
+
+    def test_moving_an_item_writes_only_that_item(self):
+        first, second, third, fourth = self.get_item_ids()
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.put(f'/fitness/exercise/session/move-item/{fourth}/', {'after': first},
+                                       format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.get_item_ids(), [first, fourth, second, third])
+        updates = [query for query in context.captured_queries
+                   if query['sql'].startswith('UPDATE') and 'exercisesessionitem' in query['sql']]
+        self.assertEqual(len(updates), 1)
+
+    def test_moving_an_item_to_the_top(self):
+        first, second, third, fourth = self.get_item_ids()
+
+        response = self.client.put(f'/fitness/exercise/session/move-item/{third}/', {'after': None}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.get_item_ids(), [third, first, second, fourth])
+
+    def test_moving_renumbers_the_session_when_there_is_no_gap_left(self):
+        first, second, third, fourth = self.get_item_ids()
+        for order, item_id in enumerate([first, second, third, fourth], start=1):
+            ExerciseSessionItem.objects.filter(pk=item_id).update(order=order)
+
+        response = self.client.put(f'/fitness/exercise/session/move-item/{fourth}/', {'after': first},
+                                   format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.get_item_ids(), [first, fourth, second, third])
+
+    def test_items_cannot_be_moved_to_another_session(self):
+        self.create_workout(exercises_count=1, sets_count=1, with_superset=False)
+        item_id = self.get_item_ids()[0]
+        other_item_id = ExerciseSessionItem.objects.exclude(exercise_session=self.exercise_session).first().pk
+
+        response = self.client.put(f'/fitness/exercise/session/move-item/{item_id}/', {'after': other_item_id},
+                                   format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class KeysetPaginationTests(WorkoutApiTestCase):
+    def create_workouts(self, count):
+        return [self.create_workout(exercises_count=1, sets_count=1, with_superset=False) for _ in range(count)]
+
+    def test_list_without_pagination_params_returns_every_workout(self):
+        self.create_workouts(3)
+
+        response = self.client.get('/fitness/workout/list/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 3)
+
+    def test_pages_follow_the_cursor_newest_first(self):
+        workouts = self.create_workouts(5)
+        # rows created at the same time are told apart by their id
+        WorkoutSession.objects.filter(pk__in=[workout.pk for workout in workouts[1:4]]).update(
+            created_at=workouts[1].created_at
+        )
+
+        ids = []
+        url = '/fitness/workout/list/?page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data['results']), 2)
+            ids.extend(workout['id'] for workout in response.data['results'])
+            url = response.data['next']
+
+        self.assertEqual(ids, [workout.pk for workout in reversed(workouts)])
+
+    def test_first_page_query_count_does_not_grow_with_the_history(self):
+        self.create_workouts(2)
+        short_history_queries, _ = self.count_queries('/fitness/workout/list/?page_size=2')
+        self.create_workouts(6)
+        long_history_queries, response = self.count_queries('/fitness/workout/list/?page_size=2')
+
+        self.assertEqual(short_history_queries, long_history_queries)
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get('/fitness/workout/list/?cursor=not-a-cursor')
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_templates_are_paginated(self):
+        for _ in range(3):
+            self.client.post('/fitness/workout/template/create/', self.build_workout_payload(1, 1), format='json')
+
+        first_page = self.client.get('/fitness/workout/template/list/?page_size=2')
+        second_page = self.client.get(first_page.data['next'])
+
+        self.assertEqual(len(first_page.data['results']), 2)
+        self.assertEqual(len(second_page.data['results']), 1)
+        self.assertIsNone(second_page.data['next'])
+
+
+class ExerciseCatalogTests(WorkoutApiTestCase):
+    url = '/fitness/muscle-group/list-exercises/'
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.chest = MuscleGroup.objects.create(name='Chest')
+        self.back = MuscleGroup.objects.create(name='Back')
+        self.exercises[0].targeted_muscle_groups.add(self.chest)
+        self.exercises[1].targeted_muscle_groups.add(self.chest, self.back)
+        self.exercises[2].is_cardio = True
+        self.exercises[2].save()
+
+    def test_catalog_groups_the_exercises(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([group['name'] for group in response.data], ['Chest', 'Back', 'Cardio'])
+        self.assertEqual([exercise['name'] for exercise in response.data[0]['exercises']],
+                         ['Exercise 0', 'Exercise 1'])
+        self.assertEqual(response.data[1]['exercises'][0]['targeted_muscle_groups'], ['Chest', 'Back'])
+        self.assertEqual([exercise['name'] for exercise in response.data[2]['exercises']], ['Exercise 2'])
+
+    def test_catalog_is_built_with_a_fixed_number_of_queries(self):
+        small_catalog_queries, _ = self.count_queries(self.url)
+        cache.clear()
+        for index in range(10):
+            MuscleGroup.objects.create(name=f'Group {index}')
+        for exercise in self.exercises:
+            exercise.targeted_muscle_groups.add(self.back)
+
+        big_catalog_queries, _ = self.count_queries(self.url)
+
+        self.assertEqual(small_catalog_queries, big_catalog_queries)
+
+    def test_cached_catalog_is_served_without_queries(self):
+        self.client.get(self.url)
+
+        cached_queries, _ = self.count_queries(self.url)
+
+        self.assertEqual(cached_queries, 0)
+
+    def test_unchanged_catalog_returns_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_exercise_changes_invalidate_the_catalog(self):
+        etag = self.client.get(self.url)['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Exercise.objects.create(name='Rowing', is_cardio=True)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('Rowing', [exercise['name'] for exercise in response.data[-1]['exercises']])
+
+    def test_custom_exercises_keep_the_catalog(self):
+        etag = self.client.get(self.url)['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CustomExercise.objects.create(name='Cable fly', created_by=self.profile)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+
+class SearchTests(WorkoutApiTestCase):
+    exercises_url = '/fitness/exercise/search/'
+    workouts_url = '/fitness/workout/search/'
+
+    def setUp(self):
+        super().setUp()
+        for name in ['Incline Bench Press', 'Bench Press', 'Back Squat']:
+            Exercise.objects.create(name=name)
+        other_user = UserModel.objects.create_user(email='other@example.com', username='other_user',
+                                                   password='test_password')
+        self.other_profile = Profile.objects.create_profile(user=other_user)
+
+    def search_names(self, url, name, key, **params):
+        response = self.client.get(url, {'name': name, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [result['name'] for result in response.data[key]], response
+
+    def test_prefix_search_ranks_the_names_starting_with_the_query_first(self):
+        names, _ = self.search_names(self.exercises_url, 'ben', 'exercises')
+
+        self.assertEqual(names, ['Bench Press', 'Incline Bench Press'])
+
+    def test_exact_matches_are_kept_past_the_candidates_limit(self):
+        for index in range(5):
+            Exercise.objects.create(name=f'Benchmark {index}')
+
+        with mock.patch('server.workouts.search.CANDIDATES_LIMIT', 3):
+            names, _ = self.search_names(self.exercises_url, 'bench', 'exercises')
+
+        self.assertEqual(sorted(names), ['Bench Press', 'Benchmark 4', 'Incline Bench Press'])
+
+    def test_search_tolerates_typos(self):
+        names, _ = self.search_names(self.exercises_url, 'squatt', 'exercises')
+
+        self.assertEqual(names, ['Back Squat'])
+
+    def test_custom_exercises_are_scoped_to_their_creator(self):
+        CustomExercise.objects.create(name='Bench Dips', created_by=self.profile)
+        CustomExercise.objects.create(name='Bench Jumps', created_by=self.other_profile)
+
+        names, _ = self.search_names(self.exercises_url, 'bench', 'exercises_by_user')
+
+        self.assertEqual(names, ['Bench Dips'])
+
+    def test_search_results_are_paginated(self):
+        first_page, response = self.search_names(self.exercises_url, 'bench', 'exercises', page_size=1)
+        self.assertEqual(response.data['next_page'], 2)
+        second_page, response = self.search_names(self.exercises_url, 'bench', 'exercises', page_size=1, page=2)
+
+        self.assertEqual(first_page + second_page, ['Bench Press', 'Incline Bench Press'])
+        self.assertIsNone(response.data['next_page'])
+
+    def test_workout_search_returns_own_workouts_and_published_templates(self):
+        self.create_workout(exercises_count=1, sets_count=1, with_superset=False)
+        WorkoutSession.objects.create(name='Push day', total_exercises=0, total_sets=0, total_weight_volume=0,
+                                      created_by=self.other_profile)
+        WorkoutTemplate.objects.create(name='Push day template', total_exercises=0, total_sets=0,
+                                       created_by=self.other_profile)
+
+        own_workouts, response = self.search_names(self.workouts_url, 'push', 'workouts_by_user')
+
+        self.assertEqual(own_workouts, ['Push day'])
+        self.assertEqual(response.data['workouts_by_user'][0]['created_at'] is not None, True)
+        self.assertEqual([workout['name'] for workout in response.data['workouts']], ['Push day template'])
+
+    def test_renamed_objects_are_reindexed(self):
+        exercise = Exercise.objects.get(name='Back Squat')
+        exercise.name = 'Front Squat'
+        exercise.save()
+
+        names, _ = self.search_names(self.exercises_url, 'front', 'exercises')
+
+        self.assertEqual(names, ['Front Squat'])
+        self.assertEqual(self.search_names(self.exercises_url, 'back', 'exercises')[0], [])
+
+    def test_rebuild_command_restores_the_index(self):
+        SearchDocument.objects.all().delete()
+
+        call_command('rebuild_search_index', stdout=StringIO())
+
+        names, _ = self.search_names(self.exercises_url, 'bench', 'exercises')
+        self.assertEqual(names, ['Bench Press', 'Incline Bench Press'])
+
+
+class WorkoutHistoryExportTests(WorkoutApiTestCase):
+    def get_export(self, export_format):
+        response = self.client.get(f'/fitness/workout/export/{export_format}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsInstance(response, StreamingHttpResponse)
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_ndjson_export_has_a_row_per_session_item(self):
+        workout = self.create_workout(exercises_count=1, sets_count=2)
+
+        rows = [json.loads(line) for line in self.get_export('ndjson').splitlines()]
+
+        # 2 sets and 2 rests for the exercise and for both superset exercises
+        self.assertEqual(len(rows), 12)
+        self.assertEqual(rows[0]['workout_id'], workout.id)
+        self.assertEqual(rows[0]['item_type'], 'set')
+        self.assertEqual(rows[0]['weight'], 60)
+        self.assertEqual(rows[1]['item_type'], 'rest')
+        self.assertIsNone(rows[0]['superset_id'])
+        self.assertIsNotNone(rows[-1]['superset_id'])
+
+    def test_csv_export_has_a_header(self):
+        self.create_workout(exercises_count=1, sets_count=1, with_superset=False)
+
+        rows = list(csv.DictReader(StringIO(self.get_export('csv'))))
+
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]['exercise_name'], 'Exercise 0')
+        self.assertEqual(rows[0]['reps'], '10')
+
+    def test_export_queries_grow_per_chunk_not_per_workout(self):
+        for _ in range(3):
+            self.create_workout(exercises_count=2, sets_count=2)
+        with CaptureQueriesContext(connection) as context:
+            few_workouts_export = self.get_export('ndjson')
+        few_workouts_queries = len(context.captured_queries)
+        for _ in range(6):
+            self.create_workout(exercises_count=2, sets_count=2)
+
+        with CaptureQueriesContext(connection) as context:
+            many_workouts_export = self.get_export('ndjson')
+
+        self.assertEqual(len(many_workouts_export.splitlines()), 3 * len(few_workouts_export.splitlines()))
+        self.assertEqual(len(context.captured_queries), few_workouts_queries)
+
+    def test_unknown_export_format_is_rejected(self):
+        response = self.client.get('/fitness/workout/export/xml/')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_command_writes_the_history(self):
+        self.create_workout(exercises_count=1, sets_count=1, with_superset=False)
+        stdout = StringIO()
+
+        call_command('export_training_history', self.profile.pk, '--export-format', 'csv', stdout=stdout)
+
+        self.assertEqual(len(stdout.getvalue().splitlines()), 3)
+
+
+class WorkoutHistoryImportTests(WorkoutApiTestCase):
+    def setUp(self):
+        super().setUp()
+        other_user = UserModel.objects.create_user(email='other@example.com', username='other_user',
+                                                   password='test_password')
+        self.other_profile = Profile.objects.create_profile(user=other_user)
+
+    def export_history(self, export_format):
+        response = self.client.get(f'/fitness/workout/export/{export_format}/')
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_exported_history_is_imported_with_the_same_workouts(self):
+        workout = self.create_workout(exercises_count=2, sets_count=2)
+        WorkoutSession.objects.filter(pk=workout.pk).update(created_at='2024-01-02T10:00:00Z')
+
+        for import_format in ('ndjson', 'csv'):
+            with self.subTest(import_format=import_format):
+                WorkoutSession.objects.filter(created_by=self.other_profile).delete()
+                report = import_history(self.other_profile, self.export_history(import_format), import_format)
+
+                self.assertEqual(report, {'workouts': 1, 'items': 16, 'skipped_rows': 0, 'errors': []})
+                imported = WorkoutSession.objects.get(created_by=self.other_profile)
+                self.assertEqual(imported.name, workout.name)
+                self.assertEqual(imported.created_at.isoformat(), '2024-01-02T10:00:00+00:00')
+                self.assertEqual(imported.total_sets, 16)
+                self.assertEqual(imported.total_weight_volume, workout.total_weight_volume)
+                self.assertEqual(imported.exercises.count(), 3)
+                self.assertEqual(
+                    ExerciseSession.objects.filter(profile=self.other_profile).values_list('created_at', flat=True)
+                    .distinct().get().isoformat(),
+                    '2024-01-02T10:00:00+00:00',
+                )
+
+    def test_rows_with_unknown_exercises_are_skipped(self):
+        rows = [
+            {'workout_id': 1, 'workout_name': 'Legs', 'exercise_name': 'exercise 0', 'item_type': 'set',
+             'weight': 100, 'reps': 5},
+            {'workout_id': 1, 'workout_name': 'Legs', 'exercise_name': 'Unknown', 'item_type': 'set',
+             'weight': 100, 'reps': 5},
+        ]
+
+        report = import_history(self.profile, json.dumps(rows), 'json')
+
+        self.assertEqual(report['workouts'], 1)
+        self.assertEqual(report['skipped_rows'], 1)
+        self.assertEqual(report['errors'], ['Row 2: Unknown exercise - Unknown'])
+        self.assertEqual(ExerciseSession.objects.get(profile=self.profile).exercise, self.exercises[0])
+        self.assertTrue(SearchDocument.objects.filter(kind=SearchDocument.KIND_WORKOUT, owner=self.profile).exists())
+
+    def test_import_queries_grow_per_chunk_not_per_workout(self):
+        for _ in range(2):
+            self.create_workout(exercises_count=2, sets_count=2)
+        few_workouts_history = self.export_history('ndjson')
+        for _ in range(4):
+            self.create_workout(exercises_count=2, sets_count=2)
+        many_workouts_history = self.export_history('ndjson')
+
+        with CaptureQueriesContext(connection) as context:
+            import_history(self.other_profile, few_workouts_history, 'ndjson')
+        few_workouts_queries = len(context.captured_queries)
+        with CaptureQueriesContext(connection) as context:
+            report = import_history(self.other_profile, many_workouts_history, 'ndjson')
+
+        self.assertEqual(report['workouts'], 6)
+        self.assertEqual(len(context.captured_queries), few_workouts_queries)
+
+    def test_rows_with_invalid_exercise_orders_are_skipped(self):
+        rows = [
+            {'workout_id': 1, 'workout_name': 'Legs', 'exercise_name': 'exercise 0', 'item_type': 'set',
+             'exercise_order': 0, 'weight': 100, 'reps': 5},
+            {'workout_id': 1, 'workout_name': 'Legs', 'exercise_name': 'exercise 1', 'item_type': 'set',
+             'exercise_order': 'second', 'weight': 100, 'reps': 5},
+            {'workout_id': 1, 'workout_name': 'Legs', 'exercise_name': 'exercise 1', 'item_type': 'set',
+             'exercise_order': [1], 'weight': 100, 'reps': 5},
+            {'workout_id': [1], 'workout_name': 'Legs', 'exercise_name': 'exercise 1', 'item_type': 'set'},
+        ]
+
+        report = import_history(self.profile, json.dumps(rows), 'json')
+
+        self.assertEqual(report['workouts'], 1)
+        self.assertEqual(report['skipped_rows'], 3)
+        self.assertEqual(report['errors'], [
+            'Row 2: Invalid exercise order - second', 'Row 3: Invalid exercise order - [1]', 'Row 4: Invalid workout id',
+        ])
+
+    def test_malformed_ndjson_lines_are_skipped(self):
+        row = {'workout_id': 1, 'workout_name': 'Legs', 'exercise_name': 'exercise 0', 'item_type': 'set',
+               'weight': 100, 'reps': 5}
+        history = '\n'.join([json.dumps(row), '{"workout_id": 1, "exercise_name"', '', json.dumps(row)])
+
+        report = import_history(self.profile, history, 'ndjson')
+
+        self.assertEqual(report['workouts'], 1)
+        self.assertEqual(report['items'], 2)
+        self.assertEqual(report['skipped_rows'], 1)
+        self.assertEqual(len(report['errors']), 1)
+        self.assertTrue(report['errors'][0].startswith('Row 2: Invalid JSON - '), report['errors'])
+
+    @override_settings(STORAGES=SPOOL_STORAGES)
+    def test_import_endpoint_spools_the_file_and_queues_its_name(self):
+        self.create_workout(exercises_count=1, sets_count=1, with_superset=False)
+        history = self.export_history('ndjson').encode('utf-8')
+        history_file = SimpleUploadedFile('history.ndjson', history)
+
+        with mock.patch.object(import_workout_history, 'delay') as delay:
+            delay.return_value.id = 'task-id'
+            response = self.client.post('/fitness/workout/import/', {'file': history_file, 'import_format': 'ndjson'})
+        profile_id, spooled_name, import_format = delay.call_args.args
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data, {'task_id': 'task-id'})
+        self.assertEqual((profile_id, import_format), (self.profile.pk, 'ndjson'))
+        self.assertTrue(spooled_name.startswith('history_imports/'))
+        with get_spool_storage().open(spooled_name) as spooled_file:
+            self.assertEqual(spooled_file.read(), history)
+
+    @override_settings(STORAGES=SPOOL_STORAGES)
+    def test_import_task_streams_the_spooled_file_and_removes_it(self):
+        self.create_workout(exercises_count=1, sets_count=1, with_superset=False)
+        spooled_name = spool_upload(SimpleUploadedFile('history.csv', self.export_history('csv').encode('utf-8-sig')),
+                                    'history_imports')
+
+        result = import_workout_history.apply(args=[self.other_profile.pk, spooled_name, 'csv'])
+
+        self.assertEqual(result.get(), {'workouts': 1, 'items': 2, 'skipped_rows': 0, 'errors': []})
+        self.assertEqual(WorkoutSession.objects.filter(created_by=self.other_profile).count(), 1)
+        self.assertFalse(get_spool_storage().exists(spooled_name))
+
+    def test_import_endpoint_rejects_unknown_formats(self):
+        history_file = SimpleUploadedFile('history.xml', b'<history/>')
+
+        response = self.client.post('/fitness/workout/import/', {'file': history_file, 'import_format': 'xml'})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_import_command_imports_the_file(self):
+        self.create_workout(exercises_count=1, sets_count=1, with_superset=False)
+        history_path = f'{self.id()}.csv'
+        with open(history_path, 'w', encoding='utf-8', newline='') as history_file:
+            history_file.write(self.export_history('csv'))
+        self.addCleanup(os.remove, history_path)
+        stdout = StringIO()
+
+        call_command('import_training_history', self.other_profile.pk, history_path, '--import-format', 'csv',
+                     stdout=stdout, stderr=StringIO())
+
+        self.assertIn('Imported 1 workouts with 2 items', stdout.getvalue())
+        self.assertEqual(WorkoutSession.objects.filter(created_by=self.other_profile).count(), 1)
+
+
+class ExerciseProgressTests(WorkoutApiTestCase):
+    def create_workout(self, *args, **kwargs):
+        # the rollups are updated when the transaction commits
+        with self.captureOnCommitCallbacks(execute=True):
+            return super().create_workout(*args, **kwargs)
+
+    def get_progress_day(self, exercise):
+        return ExerciseProgressDay.objects.get(profile=self.profile, exercise=exercise)
+
+    def test_created_workout_is_rolled_up_per_exercise_and_day(self):
+        self.create_workout(exercises_count=1, sets_count=2)
+
+        progress_day = self.get_progress_day(self.exercises[0])
+        self.assertEqual(progress_day.day, timezone.localdate())
+        self.assertEqual(progress_day.sets_count, 2)
+        self.assertEqual(progress_day.total_reps, 20)
+        self.assertEqual(progress_day.total_volume, 60 * 10 + 61 * 10)
+        self.assertEqual((progress_day.top_set_weight, progress_day.top_set_reps), (61, 10))
+        self.assertEqual(progress_day.estimated_one_rep_max, estimate_one_rep_max(61, 10))
+        # the superset exercises are logged too
+        self.assertEqual(ExerciseProgressDay.objects.count(), 3)
+
+    def test_template_sessions_are_not_progress(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/fitness/workout/template/create/',
+                                        self.build_workout_payload(1, 2, with_superset=False), format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+
+        self.assertFalse(ExerciseProgressDay.objects.exists())
+
+    def test_started_template_is_progress(self):
+        # the requests commit separately, the flush is registered once per transaction
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/fitness/workout/template/create/',
+                             self.build_workout_payload(1, 2, with_superset=False), format='json')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/fitness/workout/template/start-workout/{WorkoutTemplate.objects.get().pk}/')
+
+        self.assertEqual(self.get_progress_day(self.exercises[0]).sets_count, 2)
+
+    def test_flush_is_registered_once_per_transaction(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            for exercise in self.exercises[:3]:
+                schedule_progress_update(days=[(self.profile.pk, exercise.pk, timezone.localdate())])
+
+        self.assertEqual(callbacks, [flush_progress_updates])
+
+    def test_edited_set_updates_the_rollup(self):
+        self.create_workout(exercises_count=1, sets_count=2, with_superset=False)
+        set_instance = Set.objects.order_by('pk').first()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            set_instance.weight = 100
+            set_instance.reps = 3
+            set_instance.save()
+
+        progress_day = self.get_progress_day(self.exercises[0])
+        self.assertEqual((progress_day.top_set_weight, progress_day.top_set_reps), (100, 3))
+        self.assertEqual(progress_day.total_volume, 300 + 61 * 10)
+
+    def test_deleted_workout_removes_the_rollup(self):
+        workout = self.create_workout(exercises_count=1, sets_count=1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f'/fitness/workout/session/delete/{workout.pk}/')
+        self.assertIn(response.status_code, (status.HTTP_200_OK, status.HTTP_204_NO_CONTENT))
+
+        self.assertFalse(ExerciseProgressDay.objects.exists())
+
+    def test_series_is_downsampled_with_a_single_range_query(self):
+        rows = [
+            {'workout_id': index, 'workout_name': 'Legs', 'workout_created_at': created_at,
+             'exercise_name': 'Exercise 0', 'item_type': 'set', 'weight': weight, 'reps': 5}
+            for index, (created_at, weight) in enumerate([
+                ('2024-01-01T10:00:00', 100), ('2024-01-03T10:00:00', 110), ('2024-02-05T10:00:00', 105),
+            ])
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            import_history(self.profile, json.dumps(rows), 'json')
+        url = f'/fitness/exercise/progress/{self.exercises[0].pk}/'
+
+        queries_count, response = self.count_queries(url)
+        self.assertEqual([point['top_set_weight'] for point in response.data], [100, 110, 105])
+
+        monthly_queries_count, response = self.count_queries(f'{url}?resolution=month')
+        self.assertEqual(monthly_queries_count, queries_count)
+        self.assertEqual([str(point['date']) for point in response.data], ['2024-01-01', '2024-02-01'])
+        self.assertEqual(response.data[0]['sets_count'], 2)
+        self.assertEqual(response.data[0]['total_volume'], 1050)
+        self.assertEqual(response.data[0]['top_set_weight'], 110)
+
+        _, response = self.count_queries(f'{url}?resolution=week&start=2024-01-02')
+        self.assertEqual([str(point['date']) for point in response.data], ['2024-01-01', '2024-02-05'])
+        self.assertEqual(response.data[0]['sets_count'], 1)
+
+    def test_series_rejects_unknown_resolutions(self):
+        response = self.client.get(f'/fitness/exercise/progress/{self.exercises[0].pk}/?resolution=year')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_rebuild_command_recomputes_the_rollups(self):
+        self.create_workout(exercises_count=2, sets_count=1)
+        ExerciseProgressDay.objects.all().delete()
+
+        call_command('rebuild_exercise_progress', self.profile.pk, stdout=StringIO())
+
+        self.assertEqual(ExerciseProgressDay.objects.count(), 4)
+        self.assertEqual(self.get_progress_day(self.exercises[1]).total_volume, 600)
+
+    def test_session_progress_returns_the_sets_weight_history(self):
+        self.create_workout(exercises_count=1, sets_count=2, with_superset=False)
+        set_instance = Set.objects.order_by('pk').first()
+        set_instance.weight = 70
+        set_instance.save()
+        exercise_session = ExerciseSession.objects.get()
+
+        response = self.client.get(f'/fitness/exercise/session/progress/{exercise_session.pk}/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([[entry['weight'] for entry in history] for history in response.data], [[60, 70], [61]])
+
+
+class EditSessionItemsTests(WorkoutApiTestCase):
+    def edit_items(self, url, items):
+        return self.client.patch(url, {'items': items}, format='json')
+
+    def test_workout_sets_and_rests_are_edited_in_one_request(self):
+        workout = self.create_workout(exercises_count=1, sets_count=2)
+        sets = list(Set.objects.order_by('pk'))
+        rest = Rest.objects.order_by('pk').first()
+
+        response = self.edit_items(f'/fitness/workout/session/edit-items/{workout.pk}/', [
+            {'type': 'set', 'id': sets[0].pk, 'data': {'weight': 100, 'reps': 5}},
+            {'type': 'set', 'id': sets[-1].pk, 'data': {'weight': '70.5'}},
+            {'type': 'rest', 'id': rest.pk, 'data': {'minutes': 3}},
+        ])
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(response.data, {'updated': 3})
+        sets[0].refresh_from_db()
+        rest.refresh_from_db()
+        self.assertEqual((sets[0].weight, sets[0].reps), (100, 5))
+        self.assertEqual(rest.minutes, 3)
+        self.assertEqual(sets[0].history.count(), 2)
+        self.assertEqual(sets[0].history.first().weight, 100)
+        workout.refresh_from_db()
+        self.assertEqual(workout.total_weight_volume, calculate_workout_totals([workout.pk])[workout.pk][1])
+        self.assertEqual(workout.total_weight_volume, 100 * 5 + 70.5 * 10 + 2 * (60 * 10 + 61 * 10))
+
+    def test_query_count_does_not_grow_with_the_batch(self):
+        workout = self.create_workout(exercises_count=1, sets_count=1)
+        big_workout = self.create_workout(exercises_count=4, sets_count=5)
+
+        def count_edit_queries(workout):
+            sets = Set.objects.filter(session_items__in=ExerciseSessionItem.objects.filter(
+                get_scope_filter(workout_id=workout.pk)
+            ))
+            items = [{'type': 'set', 'id': set_instance.pk, 'data': {'weight': 90, 'reps': 3}} for set_instance in sets]
+            with CaptureQueriesContext(connection) as context:
+                response = self.edit_items(f'/fitness/workout/session/edit-items/{workout.pk}/', items)
+            self.assertEqual(response.data, {'updated': len(items)})
+            return len(context.captured_queries)
+
+        self.assertEqual(count_edit_queries(workout), count_edit_queries(big_workout))
+
+    def test_items_of_other_sessions_are_rejected_without_writes(self):
+        self.create_workout(exercises_count=2, sets_count=1, with_superset=False)
+        first_session, second_session = ExerciseSession.objects.order_by('pk')
+        first_set = Set.objects.get(session_items__exercise_session=first_session)
+        second_set = Set.objects.get(session_items__exercise_session=second_session)
+
+        response = self.edit_items(f'/fitness/exercise/session/edit-items/{first_session.pk}/', [
+            {'type': 'set', 'id': first_set.pk, 'data': {'weight': 100}},
+            {'type': 'set', 'id': second_set.pk, 'data': {'weight': 100}},
+        ])
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        first_set.refresh_from_db()
+        self.assertEqual(first_set.weight, 60)
+
+    def test_items_of_other_profiles_are_forbidden(self):
+        self.create_workout(exercises_count=1, sets_count=1, with_superset=False)
+        exercise_session = ExerciseSession.objects.get()
+        set_instance = Set.objects.get()
+        other_user = UserModel.objects.create_user(email='other@example.com', username='other_user',
+                                                   password='test_password')
+        Profile.objects.create_profile(user=other_user)
+        self.client.force_authenticate(user=other_user)
+
+        response = self.edit_items(f'/fitness/exercise/session/edit-items/{exercise_session.pk}/', [
+            {'type': 'set', 'id': set_instance.pk, 'data': {'weight': 100}},
+        ])
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_single_set_of_another_profile_is_forbidden(self):
+        self.create_workout(exercises_count=1, sets_count=1, with_superset=False)
+        set_instance = Set.objects.get()
+        other_user = UserModel.objects.create_user(email='other@example.com', username='other_user',
+                                                   password='test_password')
+        Profile.objects.create_profile(user=other_user)
+        self.client.force_authenticate(user=other_user)
+
+        response = self.client.put(f'/fitness/exercise/session/update-set/{set_instance.pk}/', {'data': {
+            'weight': 100, 'reps': 5, 'min_reps': 5, 'max_reps': 8, 'to_failure': False, 'bodyweight': False,
+        }}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        set_instance.refresh_from_db()
+        self.assertEqual((set_instance.weight, set_instance.reps), (60, 10))
+
+    def test_unchanged_items_are_not_written(self):
+        self.create_workout(exercises_count=1, sets_count=1, with_superset=False)
+        exercise_session = ExerciseSession.objects.get()
+        set_instance = Set.objects.get()
+
+        response = self.edit_items(f'/fitness/exercise/session/edit-items/{exercise_session.pk}/', [
+            {'type': 'set', 'id': set_instance.pk, 'data': {'weight': 60, 'reps': 10}},
+        ])
+
+        self.assertEqual(response.data, {'updated': 0})
+        self.assertEqual(set_instance.history.count(), 1)
+
+
+class WorkoutSessionFinishTests(WorkoutApiTestCase):
+    def build_session_payload(self, exercise_session):
+        session_items = ExerciseSessionItem.objects.filter(exercise_session=exercise_session).order_by('order')
+        return {
+            'id': exercise_session.pk,
+            'session_type': 'exercise',
+            'notes': exercise_session.notes,
+            'exercise': {'id': exercise_session.exercise_id, 'name': exercise_session.exercise.name},
+            'session_data': [
+                {'id': session_item.object_id, 'type': session_item.content_type.model, 'data': {
+                    field: getattr(session_item.item, field) for field in ITEM_FIELD_PARSERS[session_item.content_type.model]
+                }}
+                for session_item in session_items
+            ],
+        }
+
+    def build_finish_payload(self, workout):
+        exercises = []
+        for exercise_item in WorkoutExerciseSession.objects.filter(workout_session=workout).order_by('order'):
+            exercise_instance = exercise_item.content_object
+            if exercise_item.content_type.model == 'supersetsession':
+                exercises.append({
+                    'id': exercise_instance.pk,
+                    'session_type': 'superset',
+                    'notes': exercise_instance.notes,
+                    'exercises': [self.build_session_payload(exercise_session)
+                                  for exercise_session in exercise_instance.exercises.order_by('pk')],
+                })
+            else:
+                exercises.append(self.build_session_payload(exercise_instance))
+        return exercises
+
+    def finish(self, workout, exercises):
+        return self.client.post(f'/fitness/workout/session/finish/{workout.pk}/', {'exercises': exercises},
+                                format='json')
+
+    def test_the_stored_tree_follows_the_payload(self):
+        workout = self.create_workout(exercises_count=2, sets_count=2)
+        first_exercise, removed_exercise, superset = self.build_finish_payload(workout)
+        first_exercise['notes'] = 'Slow negatives'
+        first_exercise['session_data'][0]['data']['weight'] = 100
+        first_exercise['session_data'].append({'type': 'set', 'data': {'weight': 80, 'reps': 5}})
+        removed_member = superset['exercises'].pop()
+        superset['exercises'].append(build_exercise_payload(self.exercises[5], sets_count=1))
+        new_exercise = build_exercise_payload(self.exercises[6], sets_count=1, order=3)
+
+        response = self.finish(workout, [first_exercise, superset, new_exercise])
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT, response.data)
+        exercise_items = WorkoutExerciseSession.objects.filter(workout_session=workout)
+        self.assertEqual(
+            sorted(exercise_item.content_object.pk for exercise_item in exercise_items
+                   if exercise_item.content_type.model == 'exercisesession'),
+            sorted([first_exercise['id'], ExerciseSession.objects.get(exercise=self.exercises[6]).pk]),
+        )
+        self.assertFalse(WorkoutExerciseSession.objects.filter(object_id=removed_exercise['id'],
+                                                               content_type__model='exercisesession').exists())
+        self.assertEqual(
+            set(SupersetSession.objects.get(pk=superset['id']).exercises.values_list('exercise_id', flat=True)),
+            {self.exercises[-2].pk, self.exercises[5].pk},
+        )
+        self.assertNotIn(removed_member['id'], SupersetSession.objects.get(pk=superset['id']).exercises.values_list(
+            'pk', flat=True))
+        removed_set_ids = [item['id'] for session in (removed_exercise, removed_member)
+                           for item in session['session_data'] if item['type'] == 'set']
+        self.assertFalse(ExerciseSession.objects.filter(pk__in=[removed_exercise['id'], removed_member['id']]).exists())
+        self.assertFalse(ExerciseSessionItem.objects.filter(
+            exercise_session_id__in=[removed_exercise['id'], removed_member['id']]).exists())
+        self.assertFalse(Set.objects.filter(pk__in=removed_set_ids).exists())
+        self.assertFalse(Rest.objects.filter(pk__in=[item['id'] for item in removed_exercise['session_data']
+                                                     if item['type'] == 'rest']).exists())
+        self.assertEqual(Set.history.filter(id__in=removed_set_ids, history_type='-').count(), len(removed_set_ids))
+
+        exercise_session = ExerciseSession.objects.get(pk=first_exercise['id'])
+        self.assertEqual(exercise_session.notes, 'Slow negatives')
+        self.assertEqual(
+            [(session_item.item.weight, session_item.item.reps) for session_item in
+             ExerciseSessionItem.objects.filter(exercise_session=exercise_session, content_type__model='set')],
+            [(100, 10), (61, 10), (80, 5)],
+        )
+        workout.refresh_from_db()
+        self.assertEqual(workout.total_exercises, 3)
+        self.assertEqual((workout.total_sets, workout.total_weight_volume),
+                         calculate_workout_totals([workout.pk])[workout.pk])
+
+    def test_removed_superset_is_deleted_with_its_sessions(self):
+        workout = self.create_workout(exercises_count=1, sets_count=2)
+        first_exercise, superset = self.build_finish_payload(workout)
+        member_ids = [member['id'] for member in superset['exercises']]
+
+        response = self.finish(workout, [first_exercise])
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT, response.data)
+        self.assertFalse(SupersetSession.objects.filter(pk=superset['id']).exists())
+        self.assertFalse(ExerciseSession.objects.filter(pk__in=member_ids).exists())
+        self.assertEqual(Set.objects.count(), 2)
+        self.assertEqual(Rest.objects.count(), 2)
+
+    def test_query_count_does_not_grow_with_the_workout(self):
+        def count_finish_queries(workout):
+            exercises = self.build_finish_payload(workout)
+            exercises.pop(0)
+            for exercise in exercises[:-1]:
+                exercise['notes'] = 'Edited'
+                for session_item in exercise['session_data']:
+                    if session_item['type'] == 'set':
+                        session_item['data']['weight'] += 5
+            exercises.append(build_exercise_payload(self.exercises[6], sets_count=2))
+            with CaptureQueriesContext(connection) as context:
+                response = self.finish(workout, exercises)
+            self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT, response.data)
+            return len(context.captured_queries)
+
+        self.assertEqual(count_finish_queries(self.create_workout(exercises_count=2, sets_count=1)),
+                         count_finish_queries(self.create_workout(exercises_count=5, sets_count=4)))
+
+    def test_invalid_payload_changes_nothing(self):
+        workout = self.create_workout(exercises_count=2, sets_count=1)
+        exercises = self.build_finish_payload(workout)
+        exercises[0]['session_data'][0]['data']['weight'] = 'heavy'
+
+        response = self.finish(workout, exercises[1:] + exercises[:1])
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(WorkoutExerciseSession.objects.filter(workout_session=workout).count(), 3)
+
+    def test_only_the_owner_can_finish_the_workout(self):
+        workout = self.create_workout(exercises_count=1, sets_count=1)
+        exercises = self.build_finish_payload(workout)
+        other_user = UserModel.objects.create_user(email='other@example.com', username='other_user',
+                                                   password='test_password')
+        Profile.objects.create_profile(user=other_user)
+        self.client.force_authenticate(user=other_user)
+
+        response = self.finish(workout, exercises[:1])
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(WorkoutExerciseSession.objects.filter(workout_session=workout).count(), 2)
+
+
+class IdempotencyTests(WorkoutApiTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def create_workout_with_key(self, payload, key):
+        return self.client.post('/fitness/workout/create/', payload, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retried_request_replays_the_stored_response(self):
+        payload = self.build_workout_payload(exercises_count=2, sets_count=2)
+        response = self.create_workout_with_key(payload, 'create-1')
+
+        with CaptureQueriesContext(connection) as context:
+            retried_response = self.create_workout_with_key(payload, 'create-1')
+
+        self.assertEqual(retried_response.status_code, status.HTTP_200_OK)
+        self.assertEqual(retried_response.data, response.data)
+        self.assertEqual(retried_response['Idempotent-Replayed'], 'true')
+        self.assertEqual(WorkoutSession.objects.count(), 1)
+        self.assertFalse([query for query in context.captured_queries
+                          if 'workouts_' in query['sql'] and 'workouts_idempotencyrecord' not in query['sql']])
+
+    def test_responses_are_stored_in_the_database_without_a_shared_cache(self):
+        payload = self.build_workout_payload(exercises_count=1, sets_count=1)
+        self.create_workout_with_key(payload, 'create-1')
+        # another worker, with an empty locmem cache
+        cache.clear()
+
+        response = self.create_workout_with_key(payload, 'create-1')
+
+        self.assertEqual(response['Idempotent-Replayed'], 'true')
+        self.assertEqual(IdempotencyRecord.objects.count(), 1)
+        self.assertEqual(WorkoutSession.objects.count(), 1)
+
+    def test_responses_are_stored_in_the_shared_cache(self):
+        payload = self.build_workout_payload(exercises_count=1, sets_count=1)
+        with mock.patch('server.workouts.idempotency.has_shared_cache', return_value=True):
+            self.create_workout_with_key(payload, 'create-1')
+            response = self.create_workout_with_key(payload, 'create-1')
+
+        self.assertEqual(response['Idempotent-Replayed'], 'true')
+        self.assertFalse(IdempotencyRecord.objects.exists())
+        self.assertEqual(WorkoutSession.objects.count(), 1)
+
+    def test_unexpected_error_is_not_stored(self):
+        payload = self.build_workout_payload(exercises_count=1, sets_count=1)
+        self.client.raise_request_exception = False
+        with mock.patch.object(WorkoutSession, 'create_session', side_effect=RuntimeError('boom')):
+            response = self.create_workout_with_key(payload, 'create-1')
+
+        self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertFalse(IdempotencyRecord.objects.exists())
+        response = self.create_workout_with_key(payload, 'create-1')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(WorkoutSession.objects.count(), 1)
+
+    def test_expired_records_are_removed(self):
+        self.create_workout_with_key(self.build_workout_payload(exercises_count=1, sets_count=1), 'create-1')
+        IdempotencyRecord.objects.update(expires_at=timezone.now())
+
+        self.assertEqual(remove_expired_idempotency_keys(), 1)
+        self.assertFalse(IdempotencyRecord.objects.exists())
+
+    def test_requests_without_a_key_are_not_deduplicated(self):
+        payload = self.build_workout_payload(exercises_count=1, sets_count=1)
+        self.client.post('/fitness/workout/create/', payload, format='json')
+        self.client.post('/fitness/workout/create/', payload, format='json')
+
+        self.assertEqual(WorkoutSession.objects.count(), 2)
+
+    def test_key_reused_for_another_request_is_rejected(self):
+        self.create_workout_with_key(self.build_workout_payload(exercises_count=1, sets_count=1), 'create-1')
+
+        response = self.create_workout_with_key(self.build_workout_payload(exercises_count=2, sets_count=1),
+                                                'create-1')
+
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(WorkoutSession.objects.count(), 1)
+
+    def test_keys_are_scoped_to_the_profile(self):
+        payload = self.build_workout_payload(exercises_count=1, sets_count=1)
+        self.create_workout_with_key(payload, 'create-1')
+        other_user = UserModel.objects.create_user(email='other@example.com', username='other_user',
+                                                   password='test_password')
+        Profile.objects.create_profile(user=other_user)
+        self.client.force_authenticate(user=other_user)
+
+        response = self.create_workout_with_key(payload, 'create-1')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(WorkoutSession.objects.count(), 2)
+
+
+class WorkoutSnapshotTests(WorkoutApiTestCase):
+    def test_details_are_served_from_the_snapshot(self):
+        workout = self.create_workout(exercises_count=3, sets_count=2)
+        expected_data = WorkoutSessionDetailsSerializer(workout).data
+        first_response = self.client.get(f'/fitness/workout/session/{workout.pk}/')
+
+        queries_count, response = self.count_queries(f'/fitness/workout/session/{workout.pk}/')
+
+        self.assertEqual(queries_count, 1)
+        self.assertEqual(response.data, first_response.data)
+        self.assertEqual(json.loads(json.dumps(response.data)), json.loads(json.dumps(expected_data)))
+
+    def test_changed_tree_is_rebuilt_on_the_next_read(self):
+        workout = self.create_workout(exercises_count=1, sets_count=1, with_superset=False)
+        self.client.get(f'/fitness/workout/session/{workout.pk}/')
+        set_instance = Set.objects.get()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/fitness/workout/session/edit-items/{workout.pk}/', {'items': [
+                {'type': 'set', 'id': set_instance.pk, 'data': {'weight': 100}},
+            ]}, format='json')
+        response = self.client.get(f'/fitness/workout/session/{workout.pk}/')
+
+        self.assertEqual(response.data['exercises'][0]['session_data'][0]['data']['weight'], 100)
+        self.assertEqual(response.data['total_weight_volume'], 100 * 10)
+
+    def test_list_summaries_are_served_from_the_snapshots(self):
+        for _ in range(3):
+            self.create_workout(exercises_count=2, sets_count=2)
+        first_count, first_response = self.count_queries('/fitness/workout/list/')
+
+        queries_count, response = self.count_queries('/fitness/workout/list/')
+
+        self.assertLess(queries_count, first_count)
+        self.assertEqual(queries_count, 2)
+        self.assertEqual(response.data, first_response.data)
+
+    def test_renamed_exercise_rebuilds_the_trees_using_it(self):
+        workout = self.create_workout(exercises_count=1, sets_count=1, with_superset=False)
+        self.client.get(f'/fitness/workout/session/{workout.pk}/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.exercises[0].name = 'Renamed exercise'
+            self.exercises[0].save()
+        response = self.client.get(f'/fitness/workout/session/{workout.pk}/')
+
+        self.assertEqual(response.data['exercises'][0]['exercise']['name'], 'Renamed exercise')
+
+    def test_snapshot_invalidated_while_rebuilding_is_not_stored(self):
+        workout = self.create_workout(exercises_count=1, sets_count=1)
+        invalidate_snapshots(WorkoutSnapshot.KIND_WORKOUT, [workout.pk])
+        snapshot = WorkoutSnapshot.objects.get(kind=WorkoutSnapshot.KIND_WORKOUT, object_id=workout.pk)
+        documents = build_documents(WorkoutSnapshot.KIND_WORKOUT, [workout])
+
+        invalidate_snapshots(WorkoutSnapshot.KIND_WORKOUT, [workout.pk])
+        store_documents(WorkoutSnapshot.KIND_WORKOUT, documents, {workout.pk: snapshot})
+
+        self.assertIsNone(WorkoutSnapshot.objects.get(pk=snapshot.pk).document)
+
+    def test_deleted_workout_loses_its_snapshot(self):
+        workout = self.create_workout(exercises_count=1, sets_count=1)
+        self.client.get(f'/fitness/workout/session/{workout.pk}/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/fitness/workout/session/delete/{workout.pk}/')
+        response = self.client.get(f'/fitness/workout/session/{workout.pk}/')
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(WorkoutSnapshot.objects.exists())
+
+
+class TemplateStartWorkoutTests(WorkoutApiTestCase):
+    def create_template(self, exercises_count, sets_count):
+        response = self.client.post('/fitness/workout/template/create/',
+                                    self.build_workout_payload(exercises_count, sets_count), format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        return WorkoutTemplate.objects.order_by('-pk').first()
+
+    def start_workout(self, template):
+        response = self.client.post(f'/fitness/workout/template/start-workout/{template.pk}/')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        return response
+
+    def test_every_start_copies_the_template_tree(self):
+        template = self.create_template(exercises_count=2, sets_count=2)
+        template_session_ids = set(ExerciseSession.objects.values_list('pk', flat=True))
+        template_set_ids = set(Set.objects.values_list('pk', flat=True))
+
+        first_response = self.start_workout(template)
+        second_response = self.start_workout(template)
+
+        self.assertNotEqual(first_response.data['id'], second_response.data['id'])
+        self.assertEqual(TemplateWorkoutSession.objects.filter(template=template).count(), 2)
+        for response in (first_response, second_response):
+            workout = WorkoutSession.objects.get(pk=response.data['id'])
+            self.assertEqual(workout.name, template.name)
+            self.assertEqual((workout.total_exercises, workout.total_sets), (3, template.total_sets))
+            self.assertEqual((workout.total_sets, workout.total_weight_volume),
+                             calculate_workout_totals([workout.pk])[workout.pk])
+            exercises = response.data['exercises']
+            self.assertEqual([exercise['session_type'] for exercise in exercises], ['exercise', 'exercise', 'superset'])
+            self.assertEqual(len(exercises[2]['exercises']), 2)
+            self.assertEqual([item['data']['weight'] for item in exercises[0]['session_data'] if item['type'] == 'set'],
+                             [60, 61])
+            self.assertFalse({exercises[0]['id'], exercises[1]['id']} & template_session_ids)
+            self.assertFalse({item['id'] for item in exercises[0]['session_data'] if item['type'] == 'set'}
+                             & template_set_ids)
+        self.assertEqual(template.exercises.count(), 3)
+
+    def test_start_query_count_does_not_grow_with_the_template(self):
+        def count_start_queries(template):
+            with CaptureQueriesContext(connection) as context:
+                self.start_workout(template)
+            return len(context.captured_queries)
+
+        small_template = self.create_template(exercises_count=1, sets_count=1)
+        big_template = self.create_template(exercises_count=10, sets_count=4)
+
+        self.assertEqual(count_start_queries(small_template), count_start_queries(big_template))
+
+    def test_missing_template_is_not_found(self):
+        response = self.client.post('/fitness/workout/template/start-workout/1/')
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_workouts_are_started_with_a_post_only(self):
+        template = self.create_template(exercises_count=1, sets_count=1)
+
+        response = self.client.get(f'/fitness/workout/template/start-workout/{template.pk}/')
+
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+        self.assertFalse(WorkoutSession.objects.exists())
+
+    def test_unpublished_templates_of_other_users_are_not_found(self):
+        template = self.create_template(exercises_count=1, sets_count=1)
+        WorkoutTemplate.objects.filter(pk=template.pk).update(is_published=False)
+        other_user = UserModel.objects.create_user(email='other@example.com', username='other_user',
+                                                   password='test_password')
+        Profile.objects.create_profile(user=other_user)
+        self.client.force_authenticate(user=other_user)
+
+        response = self.client.post(f'/fitness/workout/template/start-workout/{template.pk}/')
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        WorkoutTemplate.objects.filter(pk=template.pk).update(is_published=True)
+        self.start_workout(template)
+
+
+class CompiledSerializerTests(WorkoutApiTestCase):
+    def create_mixed_workout(self):
+        payload = self.build_workout_payload(exercises_count=2, sets_count=3)
+        payload['exercises'][0]['notes'] = 'Slow eccentric'
+        payload['exercises'][0]['session_data'].append(
+            {'type': 'interval', 'data': {'time': '0:12:30', 'distance': 2000, 'level': 5, 'pace': 6}}
+        )
+        response = self.client.post('/fitness/workout/create/', payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        # an edited set has a "last" version different from its data
+        set_instance = Set.objects.order_by('pk').first()
+        set_instance.weight = 100
+        set_instance.save()
+        return WorkoutSession.objects.get(pk=response.data['id'])
+
+    def test_details_match_the_drf_serializers(self):
+        workout = self.create_mixed_workout()
+
+        expected = serializer_exericses_for_session_or_template(
+            workout.exercises.all(), ExerciseSessionDetailsSerializer, BaseSupersetSessionSerializer
+        )
+        compiled = serialize_exercise_items(workout.exercises.all())
+
+        self.assertEqual(JSONRenderer().render(compiled), JSONRenderer().render(expected))
+        self.assertEqual({item['type'] for item in compiled[0]['session_data']}, {'set', 'rest', 'interval'})
+
+    def test_summaries_match_the_drf_serializers(self):
+        workout = self.create_mixed_workout()
+
+        expected = []
+        for exercise_item in workout.exercises.all():
+            if isinstance(exercise_item.content_object, ExerciseSession):
+                expected.append({'id': exercise_item.id, 'type': 'exercise',
+                                 'data': ExerciseSessionSerializerNameOnly(exercise_item.content_object).data})
+            else:
+                expected.append({'id': exercise_item.id, 'type': 'superset',
+                                 'data': SupersetSessionSerializerNameOnly(exercise_item.content_object).data})
+
+        self.assertEqual(JSONRenderer().render(serialize_exercise_items(workout.exercises.all(), summary=True)),
+                         JSONRenderer().render(expected))
+
+
+class FieldsetsTests(WorkoutApiTestCase):
+    def create_routine(self, workouts):
+        routine = WorkoutPlan.objects.create(name='Split', total_workouts=len(workouts), created_by=self.profile)
+        routine.workouts.set(workouts)
+        return routine
+
+    def test_list_without_the_exercises_skips_the_snapshots(self):
+        for _ in range(3):
+            self.create_workout(exercises_count=2, sets_count=2)
+        self.client.get('/fitness/workout/list/')
+
+        queries_count, response = self.count_queries('/fitness/workout/list/?fields=id,name')
+
+        self.assertEqual(queries_count, 1)
+        self.assertEqual([set(workout) for workout in response.data], [{'id', 'name'}] * 3)
+
+    def test_nested_fields_of_the_exercises(self):
+        self.create_workout(exercises_count=1, sets_count=2)
+
+        response = self.client.get('/fitness/workout/list/?fields=name,exercises.type')
+
+        self.assertEqual(response.data[0], {
+            'name': 'Push day', 'exercises': [{'type': 'exercise'}, {'type': 'superset'}],
+        })
+
+    def test_expand_leaves_out_the_exercises_of_the_templates(self):
+        self.client.post('/fitness/workout/template/create/', self.build_workout_payload(1, 1), format='json')
+
+        response = self.client.get('/fitness/workout/template/list/?expand=')
+        expanded_response = self.client.get('/fitness/workout/template/list/')
+
+        self.assertNotIn('exercises', response.data[0])
+        self.assertEqual(response.data[0]['name'], 'Push day')
+        self.assertEqual(len(expanded_response.data[0]['exercises']), 2)
+
+    def test_details_without_the_exercises_skip_the_snapshot(self):
+        workout = self.create_workout(exercises_count=2, sets_count=2)
+
+        queries_count, response = self.count_queries(f'/fitness/workout/session/{workout.pk}/?expand=')
+        self.assertFalse(WorkoutSnapshot.objects.exclude(document=None).exists())
+        exercises_response = self.client.get(
+            f'/fitness/workout/session/{workout.pk}/?fields=id,exercises.session_type'
+        )
+
+        self.assertEqual(queries_count, 1)
+        self.assertNotIn('exercises', response.data)
+        self.assertEqual(response.data['total_sets'], workout.total_sets)
+        self.assertEqual(exercises_response.data, {'id': workout.pk, 'exercises': [
+            {'session_type': 'exercise'}, {'session_type': 'exercise'}, {'session_type': 'superset'},
+        ]})
+
+    def test_routines_load_only_the_asked_branches(self):
+        self.create_routine([self.create_workout(exercises_count=1, sets_count=1) for _ in range(2)])
+        full_queries, full_response = self.count_queries('/fitness/routine/list/')
+
+        queries_count, response = self.count_queries('/fitness/routine/list/?fields=name,workouts.name')
+        names_queries, names_response = self.count_queries('/fitness/routine/list/?fields=name')
+
+        self.assertEqual(len(full_response.data[0]['workouts'][0]['exercises']), 2)
+        self.assertEqual(response.data, [{'name': 'Split', 'workouts': [{'name': 'Push day'}] * 2}])
+        self.assertEqual(names_response.data, [{'name': 'Split'}])
+        self.assertLess(queries_count, full_queries)
+        self.assertEqual(names_queries, 1)
+
+    def test_exercise_search_fields(self):
+        response = self.client.get('/fitness/exercise/search/?name=Exercise&fields=exercises.name')
+
+        self.assertNotIn('exercises_by_user', response.data)
+        self.assertTrue(response.data['exercises'])
+        self.assertTrue(all(set(exercise) == {'name'} for exercise in response.data['exercises']))
+
+    def test_unknown_fields_are_rejected(self):
+        workout = self.create_workout(exercises_count=1, sets_count=1)
+        self.create_routine([workout])
+
+        for url in ('/fitness/workout/list/?fields=name,weight', f'/fitness/workout/session/{workout.pk}/?fields=weight',
+                    '/fitness/routine/list/?expand=exercises', '/fitness/workout/list/?fields=name..id'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, url)
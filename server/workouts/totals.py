@@ -0,0 +1,172 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import F, Q
+
+_tracking_suspended = ContextVar('workout_totals_tracking_suspended', default=False)
+
+
+@contextmanager
+def suspend_totals_tracking():
+    """
+    Disables the incremental totals signals for the current thread/greenlet.
+    Used by the bulk write paths, which set the totals themselves.
+    """
+    token = _tracking_suspended.set(True)
+    try:
+        yield
+    finally:
+        _tracking_suspended.reset(token)
+
+
+def is_tracking_totals():
+    return not _tracking_suspended.get()
+
+
+def get_set_volume(weight, reps):
+    return round(float(weight or 0) * float(reps or 0))
+
+
+def get_workout_ids_for_sessions(exercise_session_ids):
+    """
+    Subquery with the ids of the workout sessions containing the given exercise sessions,
+    either directly or through a superset.
+    """
+    from server.workouts.models import ExerciseSession, SupersetSession, WorkoutExerciseSession
+
+    superset_ids = SupersetSession.exercises.through.objects.filter(
+        exercisesession_id__in=exercise_session_ids
+    ).values('supersetsession_id')
+    return WorkoutExerciseSession.objects.filter(
+        Q(content_type=ContentType.objects.get_for_model(ExerciseSession), object_id__in=exercise_session_ids) |
+        Q(content_type=ContentType.objects.get_for_model(SupersetSession), object_id__in=superset_ids)
+    ).values('workout_session_id')
+
+
+def get_workout_ids_for_supersets(superset_ids):
+    from server.workouts.models import SupersetSession, WorkoutExerciseSession
+
+    return WorkoutExerciseSession.objects.filter(
+        content_type=ContentType.objects.get_for_model(SupersetSession), object_id__in=superset_ids
+    ).values('workout_session_id')
+
+
+def apply_totals_delta(workout_ids, sets=0, volume=0):
+    """Applies the deltas to all the matched workouts with a single UPDATE statement."""
+    from server.workouts.models import WorkoutSession
+
+    if not sets and not volume:
+        return 0
+    return WorkoutSession.objects.filter(pk__in=workout_ids).update(
+        total_sets=F('total_sets') + sets,
+        total_weight_volume=F('total_weight_volume') + volume,
+    )
+
+
+def calculate_sessions_totals(exercise_session_ids):
+    """
+    Returns {exercise_session_id: (total_sets, total_weight_volume)}.
+    Every session item counts as a set, only Set items carry volume.
+    """
+    from server.workouts.models import ExerciseSessionItem, Set
+
+    set_content_type_id = ContentType.objects.get_for_model(Set).id
+    session_items = ExerciseSessionItem.objects.filter(
+        exercise_session_id__in=exercise_session_ids
+    ).values_list('exercise_session_id', 'content_type_id', 'object_id')
+
+    sets_count = defaultdict(int)
+    session_id_by_set_id = {}
+    for exercise_session_id, content_type_id, object_id in session_items:
+        sets_count[exercise_session_id] += 1
+        if content_type_id == set_content_type_id:
+            session_id_by_set_id[object_id] = exercise_session_id
+
+    volume = defaultdict(int)
+    if session_id_by_set_id:
+        for set_id, weight, reps in Set.objects.filter(pk__in=session_id_by_set_id).values_list('pk', 'weight',
+                                                                                                'reps'):
+            volume[session_id_by_set_id[set_id]] += get_set_volume(weight, reps)
+
+    return {
+        exercise_session_id: (sets_count[exercise_session_id], volume[exercise_session_id])
+        for exercise_session_id in set(exercise_session_ids)
+    }
+
+
+def sum_totals(totals):
+    totals = list(totals)
+    return sum(total[0] for total in totals), sum(total[1] for total in totals)
+
+
+def calculate_superset_totals(superset_id):
+    from server.workouts.models import SupersetSession
+
+    exercise_session_ids = list(SupersetSession.exercises.through.objects.filter(
+        supersetsession_id=superset_id
+    ).values_list('exercisesession_id', flat=True))
+    return sum_totals(calculate_sessions_totals(exercise_session_ids).values())
+
+
+def calculate_exercise_item_totals(exercise_item):
+    """Totals of the session or superset a WorkoutExerciseSession row points to."""
+    from server.workouts.prefetch import get_content_type_model
+
+    if get_content_type_model(exercise_item) == 'supersetsession':
+        return calculate_superset_totals(exercise_item.object_id)
+    return calculate_sessions_totals([exercise_item.object_id]).get(exercise_item.object_id, (0, 0))
+
+
+def calculate_workout_totals(workout_ids):
+    """
+    Recomputes {workout_id: (total_sets, total_weight_volume)} from the stored trees
+    with a fixed number of queries for the whole batch of workouts.
+    """
+    from server.workouts.models import SupersetSession, WorkoutExerciseSession
+
+    superset_content_type_id = ContentType.objects.get_for_model(SupersetSession).id
+    exercise_items = WorkoutExerciseSession.objects.filter(
+        workout_session_id__in=workout_ids
+    ).values_list('workout_session_id', 'content_type_id', 'object_id')
+
+    session_ids_by_workout = defaultdict(list)
+    superset_ids_by_workout = defaultdict(list)
+    for workout_id, content_type_id, object_id in exercise_items:
+        if content_type_id == superset_content_type_id:
+            superset_ids_by_workout[workout_id].append(object_id)
+        else:
+            session_ids_by_workout[workout_id].append(object_id)
+
+    superset_ids = {superset_id for ids in superset_ids_by_workout.values() for superset_id in ids}
+    session_ids_by_superset = defaultdict(list)
+    for superset_id, exercise_session_id in SupersetSession.exercises.through.objects.filter(
+            supersetsession_id__in=superset_ids).values_list('supersetsession_id', 'exercisesession_id'):
+        session_ids_by_superset[superset_id].append(exercise_session_id)
+
+    for workout_id, workout_superset_ids in superset_ids_by_workout.items():
+        for superset_id in workout_superset_ids:
+            session_ids_by_workout[workout_id].extend(session_ids_by_superset[superset_id])
+
+    sessions_totals = calculate_sessions_totals(
+        [session_id for ids in session_ids_by_workout.values() for session_id in ids]
+    )
+    return {
+        workout_id: sum_totals(
+            sessions_totals[session_id] for session_id in session_ids_by_workout.get(workout_id, [])
+        )
+        for workout_id in workout_ids
+    }
+
+
+def recompute_workout_totals(workouts):
+    """Full recompute used for repairs and after bulk operations that bypass the signals."""
+    from server.workouts.models import WorkoutSession
+
+    workouts = list(workouts)
+    totals = calculate_workout_totals([workout.pk for workout in workouts])
+    for workout in workouts:
+        workout.total_sets, workout.total_weight_volume = totals[workout.pk]
+    WorkoutSession.objects.bulk_update(workouts, ['total_sets', 'total_weight_volume'])
+    return workouts
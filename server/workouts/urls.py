@@ -1,13 +1,16 @@
 from django.urls import path, include
 
 from server.workouts.exercise_views import CreateCustomExerciseView, ExerciseDetailsView, SearchExerciseView, \
-    GetExerciseProgress, EditExerciseSessionView, ExercisesByMuscleGroup, EditExerciseSessionNotesView
-from server.workouts.set_views import AddSetToExerciseSession, RemoveSetFromExerciseSession, EditSet
+    GetExerciseProgress, EditExerciseSessionView, ExercisesByMuscleGroup, EditExerciseSessionNotesView, \
+    MoveExerciseSessionItemView, ExerciseProgressSeriesView
+from server.workouts.set_views import AddSetToExerciseSession, RemoveSetFromExerciseSession, EditSet, \
+    EditSessionItems
 from server.workouts.views import CreateRoutineView, RoutinesListView, \
     WorkoutPlanDetailsView, publish_workout, WorkoutSessionDetailsView, CreateWorkoutView, \
     MuscleGroupsListView, WorkoutSearchView, WorkoutSessionEditView, DeleteWorkoutPlanView, WorkoutSessionDeleteView, \
     AddWorkoutToRoutineView, WorkoutsListView, CreateWorkoutTemplateView, WorkoutTemplateListView, \
-    WorkoutTemplateDetailsView, WorkoutTemplateStartWorkout, WorkoutSessionFinishView, GetScheduledWorkoutForToday
+    WorkoutTemplateDetailsView, WorkoutTemplateStartWorkout, WorkoutSessionFinishView, GetScheduledWorkoutForToday, \
+    WorkoutHistoryExportView, WorkoutHistoryImportView
 
 urlpatterns = [
     path('routine/', include([
@@ -23,6 +26,7 @@ urlpatterns = [
         path('create/', CreateCustomExerciseView.as_view(), name='create exercise view'),
         path('details/<int:pk>/', ExerciseDetailsView.as_view(), name='exercise details view'),
         path('search/', SearchExerciseView.as_view(), name='search exercise'),
+        path('progress/<int:exercise_id>/', ExerciseProgressSeriesView.as_view(), name='exercise progress series'),
         path('session/', include([
             path('edit/<int:session_id>/', EditExerciseSessionView.as_view(), name='edit exercise session'),
             path('notes/<int:session_id>/', EditExerciseSessionNotesView.as_view(), name='edit exercise session notes'),
@@ -31,6 +35,9 @@ urlpatterns = [
             path('delete-set/<int:set_id>/', RemoveSetFromExerciseSession.as_view(),
                  name='delete set from exercise session'),
             path('update-set/<int:set_id>/', EditSet.as_view(), name='edit set data'),
+            path('edit-items/<int:session_id>/', EditSessionItems.as_view(), name='edit exercise session items'),
+            path('move-item/<int:item_id>/', MoveExerciseSessionItemView.as_view(),
+                 name='move exercise session item'),
         ])),
 
     ])),
@@ -40,12 +47,15 @@ urlpatterns = [
         path('session/finish/<int:id>/', WorkoutSessionFinishView.as_view(), name='workout session finish'),
         path('session/edit/<int:pk>/', WorkoutSessionEditView.as_view(), name='workout session edit '),
         path('session/delete/<int:pk>/', WorkoutSessionDeleteView.as_view(), name='workout session delete'),
+        path('session/edit-items/<int:workout_id>/', EditSessionItems.as_view(), name='edit workout session items'),
         path('create/', CreateWorkoutView.as_view(), name='create workout'),
         path('template/create/', CreateWorkoutTemplateView.as_view(), name='create workout template'),
         path('template/list/', WorkoutTemplateListView.as_view(), name='workout template list view'),
         path('template/<int:pk>/', WorkoutTemplateDetailsView.as_view(), name='workout template details view'),
         path('template/start-workout/<int:pk>/', WorkoutTemplateStartWorkout.as_view(), name='workout template start workout'),
         path('search/', WorkoutSearchView.as_view(), name='search workout'),
+        path('export/<str:export_format>/', WorkoutHistoryExportView.as_view(), name='export workout history'),
+        path('import/', WorkoutHistoryImportView.as_view(), name='import workout history'),
         # path('publish/<int:id>', publish_workout, name='publish workout')
     ])),
     path('muscle-group/', include([
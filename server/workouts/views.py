@@ -1,38 +1,67 @@
 import time
 from datetime import datetime
 
-from django.core.exceptions import ValidationError
+from django.core.exceptions import ValidationError, PermissionDenied
+from django.db import IntegrityError
+from django.db.models import Q
+from django.http import StreamingHttpResponse
 from rest_framework import generics as rest_generic_views, status, views
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 
+from server.media import spool_upload
 from server.workouts.models import WorkoutPlan, Exercise, WorkoutSession, MuscleGroup, WorkoutTemplate, \
-    TemplateWorkoutSession, Routine, RoutineWorkout
+    Routine, RoutineWorkout, SearchDocument, WorkoutSnapshot
 from server.workouts.serializers import \
     WorkoutPlanCreationSerializer, WorkoutSessionDetailsSerializer, \
     BaseMuscleGroupSerializer, RoutinesListSerializer, \
     RoutineDetailsSerializer, BaseWorkoutSessionSerializer, WorkoutListSerializer, CreateWorkoutTemplateSerializer, \
     WorkoutDetailsSerializer, WorkoutTemplateSerializer, WorkoutTemplateListSerializer
+from server.workouts.pagination import KeysetPagination
+from server.workouts.export import EXPORT_FORMATS, export_history
+from server.workouts.fieldsets import get_fieldsets, select_document_fields
+from server.workouts.history_import import IMPORT_FORMATS, HISTORY_IMPORT_SPOOL_FOLDER
+from server.workouts.idempotency import idempotent
+from server.workouts.tasks import import_workout_history
+from server.workouts.prefetch import prefetch_workout_plans
+from server.workouts.search import search_documents, load_documents_objects, get_search_page
+from server.workouts.snapshots import SNAPSHOT_ATTR, prefetch_workout_snapshots, get_snapshot_document
 
 
 # Workouts
 class RoutinesListView(rest_generic_views.ListAPIView):
     queryset = WorkoutPlan.objects.all()
     serializer_class = RoutinesListSerializer
+    pagination_class = KeysetPagination
 
     def get(self, request, *args, **kwargs):
-        query = self.queryset.filter(created_by_id=request.user.profile.id).order_by('-created_at')
-        serialized_query = self.serializer_class(query, many=True, context={'request': request})
+        fieldsets = get_fieldsets(request)
+        query = self.queryset.filter(created_by_id=request.user.profile.id).order_by('-created_at', '-id')
+        page = self.paginate_queryset(query)
+        workout_plans = prefetch_workout_plans(page if page is not None else query, fieldsets)
+        serialized_query = self.serializer_class(workout_plans, many=True,
+                                                 context={'request': request, 'fieldsets': fieldsets})
+        if page is not None:
+            return self.get_paginated_response(serialized_query.data)
         return Response(serialized_query.data, status=status.HTTP_200_OK)
 
 
 class WorkoutsListView(rest_generic_views.ListAPIView):
     queryset = WorkoutSession.objects.all()
     serializer_class = WorkoutListSerializer
+    pagination_class = KeysetPagination
 
     def get(self, request, *args, **kwargs):
-        query = self.queryset.filter(created_by_id=request.user.profile.id).order_by('-created_at')
-        serialized_query = self.serializer_class(query, many=True, context={'request': request})
+        fieldsets = get_fieldsets(request)
+        query = self.queryset.filter(created_by_id=request.user.profile.id).order_by('-created_at', '-id')
+        page = self.paginate_queryset(query)
+        workouts = page if page is not None else query
+        if fieldsets.expands('exercises'):
+            workouts = prefetch_workout_snapshots(workouts)
+        serialized_query = self.serializer_class(workouts, many=True,
+                                                 context={'request': request, 'fieldsets': fieldsets})
+        if page is not None:
+            return self.get_paginated_response(serialized_query.data)
         return Response(serialized_query.data, status=status.HTTP_200_OK)
 
 
@@ -40,6 +69,7 @@ class CreateWorkoutTemplateView(rest_generic_views.CreateAPIView):
     serializer_class = CreateWorkoutTemplateSerializer
     details_serializer = WorkoutDetailsSerializer
 
+    @idempotent
     def post(self, request, *args, **kwargs):
         workout_name = request.data.get('name')
         exercises = request.data.get('exercises')
@@ -49,14 +79,12 @@ class CreateWorkoutTemplateView(rest_generic_views.CreateAPIView):
             return Response({"exercises": "The workout must contain exercises!"}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            workout_template = WorkoutTemplate.create_workout_template(request, workout_name, exercises)
-            # return Response(self.details_serializer(workout_template).data, status=status.HTTP_200_OK)
+            WorkoutTemplate.create_workout_template(request, workout_name, exercises)
             return Response(status=status.HTTP_201_CREATED)
         except ValidationError as e:
-            workout_template.delete()
             return Response({"generic": str(e.message)}, status=status.HTTP_400_BAD_REQUEST)
-        except Exception as e:
-            workout_template.delete()
+        # the unexpected errors are server errors, which are not stored for the retries
+        except IntegrityError as e:
             return Response({"generic": 'There was a problem creating the workout: ' + str(e)},
                             status=status.HTTP_400_BAD_REQUEST)
 
@@ -65,56 +93,80 @@ class WorkoutTemplateListView(rest_generic_views.ListAPIView):
     serializer_class = WorkoutTemplateListSerializer
     queryset = WorkoutTemplate.objects.all()
 
+    pagination_class = KeysetPagination
+
     def get(self, request, *args, **kwargs):
-        workout_templates = self.get_queryset().filter(created_by=request.user.profile)
-        serialized_workout_templates = self.serializer_class(workout_templates, many=True, context={'request': request})
+        fieldsets = get_fieldsets(request)
+        workout_templates = self.get_queryset().filter(created_by=request.user.profile).order_by('-created_at', '-id')
+        page = self.paginate_queryset(workout_templates)
+        if page is not None:
+            workout_templates = page
+        if fieldsets.expands('exercises'):
+            workout_templates = prefetch_workout_snapshots(workout_templates)
+        serialized_workout_templates = self.serializer_class(workout_templates, many=True,
+                                                             context={'request': request, 'fieldsets': fieldsets})
+        if page is not None:
+            return self.get_paginated_response(serialized_workout_templates.data)
         return Response(serialized_workout_templates.data, status=status.HTTP_200_OK)
 
 
 class WorkoutTemplateDetailsView(rest_generic_views.RetrieveAPIView):
     queryset = WorkoutTemplate.objects.all()
     serializer_class = WorkoutTemplateSerializer
-    #
-    # def get(self, request, *args, **kwargs):
-    #     serializer = self.serializer_class
-    #     queryset = self.get_queryset()
-    #     return Response(serializer(queryset, many=True).data, status=status.HTTP_200_OK)
-
 
-class WorkoutTemplateStartWorkout(rest_generic_views.RetrieveAPIView):
+    def get(self, request, *args, **kwargs):
+        fieldsets = get_fieldsets(request)
+        if not fieldsets.expands('exercises'):
+            # the snapshot is only needed for the exercises
+            template = self.get_queryset().filter(pk=kwargs['pk']).first()
+            if template is None:
+                return Response("Workout template does not exist.", status=status.HTTP_404_NOT_FOUND)
+            return Response(self.serializer_class(template, context={'request': request, 'fieldsets': fieldsets}).data,
+                            status=status.HTTP_200_OK)
+        snapshot_document = get_snapshot_document(WorkoutSnapshot.KIND_TEMPLATE, kwargs['pk'])
+        if snapshot_document is None:
+            return Response("Workout template does not exist.", status=status.HTTP_404_NOT_FOUND)
+        return Response(select_document_fields(snapshot_document['details'], fieldsets, ('exercises',)),
+                        status=status.HTTP_200_OK)
+
+
+class WorkoutTemplateStartWorkout(rest_generic_views.GenericAPIView):
     queryset = WorkoutTemplate.objects.all()
     serializer_class = WorkoutSessionDetailsSerializer
 
-    def get(self, request, *args, **kwargs):
-        template_id = kwargs.get('pk')
-        template = self.get_queryset().filter(id=template_id).get()
-        template_workout_session = TemplateWorkoutSession.objects.get(template=template)
-        workout_session = template_workout_session.workout_session
-        serialized_workout_session = self.serializer_class(workout_session)
-        return Response(serialized_workout_session.data, status=status.HTTP_200_OK)
+    def get_queryset(self):
+        # a workout is started from the user's own templates or the published ones
+        return super().get_queryset().filter(Q(created_by=self.request.user.profile) | Q(is_published=True))
+
+    @idempotent
+    def post(self, request, *args, **kwargs):
+        try:
+            template = self.get_queryset().get(id=kwargs.get('pk'))
+        except WorkoutTemplate.DoesNotExist:
+            return Response("Workout template does not exist.", status=status.HTTP_404_NOT_FOUND)
+        workout_session = WorkoutTemplate.start_workout(request, template)
+        return Response(self.serializer_class(workout_session).data, status=status.HTTP_201_CREATED)
 
 
 class CreateWorkoutView(rest_generic_views.CreateAPIView):
     serializer_class = BaseWorkoutSessionSerializer
     details_serializer = WorkoutSessionDetailsSerializer
 
+    @idempotent
     def post(self, request, *args, **kwargs):
         workout_name = request.data.get('name')
         exercises = request.data.get('exercises')
-        workout_template = None
-        if (request.data.get('workout_template')):
-            workout_template = WorkoutTemplate.objects.get(id=request.data.get('workout_template'))
         if not workout_name:
             return Response({'name': "Please provide a name for your workout!"}, status=status.HTTP_400_BAD_REQUEST)
         if not exercises:
             return Response({"exercises": "The workout must contain exercises!"}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            workout = WorkoutSession.create_session(request, workout_name, exercises, workout_template)
+            workout = WorkoutSession.create_session(request, workout_name, exercises)
             return Response(self.details_serializer(workout).data, status=status.HTTP_200_OK)
         except ValidationError as e:
             return Response({"generic": str(e)}, status=status.HTTP_400_BAD_REQUEST)
-        except Exception as e:
+        except IntegrityError as e:
             return Response({"generic": 'There was a problem creating the workout: ' + str(e)},
                             status=status.HTTP_400_BAD_REQUEST)
 
@@ -124,11 +176,20 @@ class WorkoutSessionDetailsView(rest_generic_views.RetrieveAPIView):
     serializer_class = WorkoutSessionDetailsSerializer
 
     def get(self, request, *args, **kwargs):
-        params_id = kwargs['id']
-        filtered_query = self.queryset.filter(id=params_id).get()
-        serialized_query = self.serializer_class(filtered_query)
-
-        return Response(serialized_query.data, status=status.HTTP_200_OK)
+        fieldsets = get_fieldsets(request)
+        if not fieldsets.expands('exercises'):
+            # the snapshot is only needed for the exercises
+            workout = self.get_queryset().filter(pk=kwargs['id']).first()
+            if workout is None:
+                return Response("Workout session does not exist.", status=status.HTTP_404_NOT_FOUND)
+            return Response(self.serializer_class(workout, context={'request': request, 'fieldsets': fieldsets}).data,
+                            status=status.HTTP_200_OK)
+        # served from the workout's snapshot, see server.workouts.snapshots
+        snapshot_document = get_snapshot_document(WorkoutSnapshot.KIND_WORKOUT, kwargs['id'])
+        if snapshot_document is None:
+            return Response("Workout session does not exist.", status=status.HTTP_404_NOT_FOUND)
+        return Response(select_document_fields(snapshot_document['details'], fieldsets, ('exercises',)),
+                        status=status.HTTP_200_OK)
 
 
 class WorkoutSessionEditView(rest_generic_views.UpdateAPIView):
@@ -161,6 +222,7 @@ class WorkoutSessionDeleteView(rest_generic_views.DestroyAPIView):
 
 
 class WorkoutSessionFinishView(views.APIView):
+    @idempotent
     def post(self, request, *args, **kwargs):
         workout_id = kwargs.get('id')
         exercises = request.data.get('exercises')
@@ -172,23 +234,85 @@ class WorkoutSessionFinishView(views.APIView):
             return Response(status=status.HTTP_204_NO_CONTENT)
         except WorkoutSession.DoesNotExist:
             return Response("Workout session does not exist.", status=status.HTTP_404_NOT_FOUND)
+        except PermissionDenied as e:
+            return Response(str(e), status=status.HTTP_401_UNAUTHORIZED)
+        except ValidationError as e:
+            return Response({"generic": ' '.join(e.messages)}, status=status.HTTP_400_BAD_REQUEST)
 
 
 class WorkoutSearchView(rest_generic_views.ListAPIView):
     queryset = WorkoutSession.objects.all()
     serializer_class = WorkoutSessionDetailsSerializer
+    template_serializer_class = WorkoutTemplateListSerializer
 
     def get(self, request, *args, **kwargs):
         profile = request.user.profile
-        searched_name = request.query_params.get('name')
-        all_workouts_by_name = self.queryset.filter(name__icontains=searched_name).all()
-        exercises_created_by_user = all_workouts_by_name.filter(created_by=profile).all()
-        exercises = all_workouts_by_name.filter(is_published=True)
+        searched_name = request.query_params.get('name', '')
+        page, page_size = get_search_page(request)
+        # the fields of both lists are selected with their names, e.g. ?fields=workouts.name
+        fieldsets = get_fieldsets(request)
+        fieldsets.validate(('workouts_by_user', 'workouts', 'next_page'), ('workouts_by_user', 'workouts'))
+        results = {}
+        has_next_own = has_next_published = False
+
+        if fieldsets.includes('workouts_by_user'):
+            own_documents, has_next_own = search_documents(
+                searched_name, [SearchDocument.KIND_WORKOUT], {'owner': profile}, page, page_size
+            )
+            workouts_created_by_user = prefetch_workout_snapshots(load_documents_objects(own_documents))
+            # the details of the own workouts are served from their snapshots instead of walking every tree
+            results['workouts_by_user'] = [
+                select_document_fields(getattr(workout, SNAPSHOT_ATTR)['details'],
+                                       fieldsets.child('workouts_by_user'), ('exercises',))
+                for workout in workouts_created_by_user
+            ]
+        if fieldsets.includes('workouts'):
+            published_documents, has_next_published = search_documents(
+                searched_name, [SearchDocument.KIND_TEMPLATE], {'is_public': True}, page, page_size
+            )
+            published_workouts = load_documents_objects(published_documents)
+            if fieldsets.child('workouts').expands('exercises'):
+                published_workouts = prefetch_workout_snapshots(published_workouts)
+            results['workouts'] = self.template_serializer_class(
+                published_workouts, many=True, context={'request': request, 'fieldsets': fieldsets.child('workouts')}
+            ).data
+
+        results['next_page'] = page + 1 if has_next_own or has_next_published else None
+        return Response(results, status=status.HTTP_200_OK)
+
+
+class WorkoutHistoryExportView(views.APIView):
+    """Streams every set, rest and interval of the user's workouts as NDJSON or CSV."""
 
-        return Response({
-            'workouts_by_user': self.serializer_class(exercises_created_by_user, many=True).data,
-            'workouts': self.serializer_class(exercises, many=True).data
-        }, status=status.HTTP_200_OK)
+    def get(self, request, *args, **kwargs):
+        export_format = kwargs.get('export_format')
+        if export_format not in EXPORT_FORMATS:
+            return Response(f"The export format must be one of: {', '.join(EXPORT_FORMATS)}",
+                            status=status.HTTP_400_BAD_REQUEST)
+        response = StreamingHttpResponse(export_history(request.user.profile, export_format),
+                                         content_type=EXPORT_FORMATS[export_format])
+        response['Content-Disposition'] = f'attachment; filename="training-history.{export_format}"'
+        return response
+
+
+class WorkoutHistoryImportView(views.APIView):
+    """
+    Queues the import of an exported history file (`file`, in the `import_format` format, UTF-8 encoded).
+    The workouts are written by a background task, its id is returned to poll for the report.
+    """
+
+    def post(self, request, *args, **kwargs):
+        history_file = request.FILES.get('file')
+        import_format = request.data.get('import_format')
+        if not history_file:
+            return Response("The history file is required", status=status.HTTP_400_BAD_REQUEST)
+        if import_format not in IMPORT_FORMATS:
+            return Response(f"The import format must be one of: {', '.join(IMPORT_FORMATS)}",
+                            status=status.HTTP_400_BAD_REQUEST)
+        # the file is handed to the worker through the spool storage, see server.media
+        spooled_name = spool_upload(history_file, HISTORY_IMPORT_SPOOL_FOLDER)
+        task = import_workout_history.delay(request.user.profile.pk, spooled_name, import_format)
+        return Response({'task_id': task.id}, status=status.HTTP_202_ACCEPTED)
 
 
 # Workout plans
@@ -199,8 +323,9 @@ class WorkoutPlanDetailsView(rest_generic_views.RetrieveAPIView):
 
     def get(self, request, *args, **kwargs):
         params_id = kwargs['id']
-        query = self.queryset.get(id=params_id)
-        serialized_query = self.serializer_class(query)
+        fieldsets = get_fieldsets(request)
+        query = prefetch_workout_plans([self.queryset.get(id=params_id)], fieldsets)[0]
+        serialized_query = self.serializer_class(query, context={'request': request, 'fieldsets': fieldsets})
         return Response(serialized_query.data, status=status.HTTP_200_OK)
 
 